@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""Benchmark building from .imscc packages: extract-then-build against reading the packages in place.
+
+Usage: PYTHONPATH=. python benchmarks/bench_archive.py --courses 4 --files 200 --file-kb 256
+"""
+import argparse
+import contextlib
+import os
+import shutil
+import tempfile
+import time
+import zipfile
+from pathlib import Path
+
+from benchmarks.synthetic import make_course
+from scripts.export_courses import build_site
+
+
+def tree_bytes(root):
+    return sum(p.stat().st_size for p in Path(root).rglob('*') if p.is_file())
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--courses', type=int, default=4)
+    ap.add_argument('--pages', type=int, default=100)
+    ap.add_argument('--files', type=int, default=200)
+    ap.add_argument('--file-kb', type=int, default=256, help='size of each web_resources file')
+    ap.add_argument('--workers', type=int, default=None, help='threads streaming members within a course')
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        src = Path(tmp) / 'src'
+        packages = Path(tmp) / 'packages'
+        packages.mkdir()
+        for i in range(args.courses):
+            course = make_course(src / f'course-{i:03d}', pages=args.pages, files=args.files, seed=i)
+            for f in (course / 'web_resources').iterdir():
+                # half random, half zeros: roughly what a mix of media and documents compresses to
+                f.write_bytes(os.urandom(args.file_kb * 512) + bytes(args.file_kb * 512))
+            with zipfile.ZipFile(packages / f'{course.name}.imscc', 'w', zipfile.ZIP_DEFLATED) as z:
+                for f in sorted(course.rglob('*')):
+                    if f.is_file():
+                        z.write(f, f.relative_to(course).as_posix())
+        print(f'{args.courses} packages, {tree_bytes(packages) / 1e6:.1f}MB compressed, '
+              f'{tree_bytes(src) / 1e6:.1f}MB extracted')
+
+        # what unzip_archives used to do: extract next to the package, then build from the folder
+        extracted = Path(tmp) / 'extracted'
+        out = Path(tmp) / 'public-extract'
+        t0 = time.perf_counter()
+        for pkg in sorted(packages.iterdir()):
+            with zipfile.ZipFile(pkg) as z:
+                z.extractall(extracted / pkg.stem)
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            build_site(extracted, out, copy_workers=args.workers)
+        elapsed = time.perf_counter() - t0
+        written = tree_bytes(extracted) + tree_bytes(out)
+        print(f'extract + build: {elapsed:6.2f}s  {written / 1e6:8.1f}MB written')
+        shutil.rmtree(extracted)
+
+        out = Path(tmp) / 'public-direct'
+        t0 = time.perf_counter()
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            build_site(packages, out, copy_workers=args.workers)
+        elapsed = time.perf_counter() - t0
+        print(f'   from package: {elapsed:6.2f}s  {tree_bytes(out) / 1e6:8.1f}MB written')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""Benchmark export time and disk usage of each copy strategy.
+
+Disk usage is measured as the drop in free space on the output filesystem, so
+blocks shared by hard links or reflinks are not counted.  Run it on the
+filesystem you deploy from (--dir); tmpfs, for instance, has no reflinks.
+
+Usage: PYTHONPATH=. python benchmarks/bench_copy.py --courses 4 --file-kb 512
+"""
+import argparse
+import contextlib
+import os
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks.synthetic import make_course
+from canvas_viewer.copying import COPY_STRATEGIES
+from scripts.export_courses import build_site
+
+
+def free_bytes(path):
+    st = os.statvfs(path)
+    return st.f_bavail * st.f_frsize
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--courses', type=int, default=4)
+    ap.add_argument('--pages', type=int, default=50)
+    ap.add_argument('--files', type=int, default=200)
+    ap.add_argument('--file-kb', type=int, default=256, help='size of each web_resources file')
+    ap.add_argument('--dir', default=None, help='directory to run in (default: system temp dir)')
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory(dir=args.dir) as tmp:
+        courses = Path(tmp) / 'courses'
+        for i in range(args.courses):
+            course = make_course(courses / f'course-{i:03d}', pages=args.pages, files=args.files, seed=i)
+            for f in (course / 'web_resources').iterdir():
+                f.write_bytes(os.urandom(args.file_kb * 1024))
+        os.sync()
+        print(f'{args.courses} courses x {args.files} files of {args.file_kb}KB')
+
+        for strategy in COPY_STRATEGIES:
+            out = Path(tmp) / f'public-{strategy}'
+            before = free_bytes(tmp)
+            t0 = time.perf_counter()
+            with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+                build_site(courses, out, copy_strategy=strategy)
+            os.sync()
+            elapsed = time.perf_counter() - t0
+            used = before - free_bytes(tmp)
+            print(f'{strategy:>9}: {elapsed:6.2f}s  disk used {used / 1e6:8.1f}MB')
+
+
+if __name__ == '__main__':
+    main()
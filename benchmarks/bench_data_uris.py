@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""Benchmark lifting pasted data: URI images out of pages: page bytes and /page time.
+
+Every page of a synthetic course carries one pasted image (--image-kb) as a
+base64 data: URI.  Each page is rendered through the viewer's pipeline with
+the images left inline and with them stored as /asset/<name> files, and the
+page bytes a browser downloads are compared; then the viewer's /page route
+is timed with a cold page cache, and the rendered pages parsed again to show
+what the smaller documents cost downstream.
+
+Usage: PYTHONPATH=. python benchmarks/bench_data_uris.py --pages 200 --image-kb 300
+"""
+import argparse
+import os
+import tempfile
+import time
+from pathlib import Path
+
+from lxml import html
+
+from benchmarks.synthetic import make_course
+from canvas_viewer.app import create_app
+from canvas_viewer.assets import AssetStore
+from canvas_viewer.rendering import rewrite_page, viewer_link
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--pages', type=int, default=200)
+    ap.add_argument('--words', type=int, default=400, help='words per page')
+    ap.add_argument('--image-kb', type=int, default=300, help='size of the image pasted into every page')
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        course = make_course(Path(tmp) / 'course', pages=args.pages, files=0, words_per_page=args.words,
+                             data_uri_kb=args.image_kb)
+        items = [(f'wiki_content/{p.name}', p.read_bytes()) for p in sorted((course / 'wiki_content').iterdir())]
+        size = sum(len(raw) for _, raw in items)
+        print(f'{len(items)} pages, {size / 1e6:.1f}MB, one {args.image_kb}KB image each')
+
+        outputs = {}
+        for label, assets in (('inline', None), ('extracted', AssetStore(Path(tmp) / 'assets'))):
+            t0 = time.perf_counter()
+            out = [rewrite_page(raw, rel, viewer_link, assets) for rel, raw in items]
+            elapsed = time.perf_counter() - t0
+            outputs[label] = out
+            total = sum(len(o.encode('utf-8')) for o in out)
+            print(f'{label:>10}: {total / 1e6:8.2f}MB of pages  {elapsed:6.2f}s  {len(items) / elapsed:7.0f} pages/s')
+        inline = sum(len(o.encode('utf-8')) for o in outputs['inline'])
+        extracted = sum(len(o.encode('utf-8')) for o in outputs['extracted'])
+        stored = sum(f.stat().st_size for f in (Path(tmp) / 'assets').iterdir())
+        print(f'page bytes reduced by {1 - extracted / inline:.1%} ({inline / max(1, extracted):.0f}x smaller); '
+              f'{len(os.listdir(Path(tmp) / "assets"))} assets, {stored / 1e6:.1f}MB, cached by browsers for good')
+
+        for label, out in outputs.items():
+            t0 = time.perf_counter()
+            for o in out:
+                html.fromstring(o)
+            print(f'{"re-parse " + label:>20}: {time.perf_counter() - t0:6.2f}s')
+
+        os.environ['CANVAS_CACHE_DIR'] = os.path.join(tmp, 'cache')
+        app = create_app(str(course))
+        client = app.test_client()
+        pages = app.extensions['canvas_caches']['pages']
+        for label in ('cold', 'cached'):
+            t0 = time.perf_counter()
+            for rel, _ in items:
+                client.get('/page/' + rel).get_data()
+            elapsed = time.perf_counter() - t0
+            print(f'{"/page " + label:>20}: {elapsed:6.2f}s  {len(items) / elapsed:7.0f} pages/s')
+        assert pages.misses == len(items)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""Benchmark static site build wall-clock time against the number of worker processes.
+
+Usage: PYTHONPATH=. python benchmarks/bench_export.py --courses 32 --pages 200
+"""
+import argparse
+import contextlib
+import os
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks.synthetic import make_course
+from scripts.export_courses import build_site
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--courses', type=int, default=16)
+    ap.add_argument('--pages', type=int, default=200)
+    ap.add_argument('--files', type=int, default=50)
+    ap.add_argument('--max-jobs', type=int, default=os.cpu_count() or 1)
+    args = ap.parse_args()
+
+    jobs_list = [1]
+    while jobs_list[-1] * 2 <= args.max_jobs:
+        jobs_list.append(jobs_list[-1] * 2)
+    if jobs_list[-1] != args.max_jobs:
+        jobs_list.append(args.max_jobs)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        courses = Path(tmp) / 'courses'
+        for i in range(args.courses):
+            make_course(courses / f'course-{i:03d}', pages=args.pages, files=args.files, seed=i)
+        print(f'{args.courses} courses x {args.pages} pages, {args.files} files; {os.cpu_count()} CPUs')
+
+        baseline = None
+        for jobs in jobs_list:
+            out = Path(tmp) / f'public-{jobs}'
+            t0 = time.perf_counter()
+            with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+                build_site(courses, out, jobs=jobs)
+            elapsed = time.perf_counter() - t0
+            baseline = baseline or elapsed
+            print(f'jobs={jobs:>3}: {elapsed:7.2f}s  speedup x{baseline / elapsed:.2f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""Benchmark CSS injection: the old copy-then-reparse pass against the fused single-read stage.
+
+The two-pass baseline copies every page, then parses each output with lxml and
+rewrites it pretty-printed, as build_course used to.  The fused stage reads
+each page once, runs inject_page_bytes on it and writes the result, as
+CourseBuild.render_pages does for pages lxml cannot lay out.
+
+Usage: PYTHONPATH=. python benchmarks/bench_inject.py --pages 2000 --workers 4
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+from pathlib import Path
+
+from lxml import html as lh
+
+from benchmarks.synthetic import make_course
+from scripts.export_courses import _map_threads, _write_atomic, inject_page_bytes
+
+
+def two_pass(pages, out, static_dst):
+    for src in pages:
+        shutil.copy2(src, out / src.name)
+    for src in pages:
+        html_file = out / src.name
+        doc = lh.parse(str(html_file))
+        head = doc.find('.//head')
+        css_href = os.path.relpath(static_dst, start=html_file.parent) + '/canvas_viewer.css'
+        head.insert(0, lh.Element('link', rel='stylesheet', href=css_href))
+        with open(html_file, 'wb') as fh:
+            fh.write(lh.tostring(doc, encoding='utf-8', pretty_print=True, doctype='<!DOCTYPE html>'))
+
+
+def fused(pages, out, workers):
+    def inject(src):
+        # the pages sit next to each other, one level below _static
+        _write_atomic(out / src.name, inject_page_bytes(src.read_bytes(), '_static/canvas_viewer.css', name=src.name))
+    _map_threads(inject, pages, workers)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--pages', type=int, default=1000)
+    ap.add_argument('--words', type=int, default=800, help='words per page')
+    ap.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    ap.add_argument('--repeat', type=int, default=3)
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        course = make_course(Path(tmp) / 'course', pages=args.pages, files=0, words_per_page=args.words)
+        pages = sorted((course / 'wiki_content').glob('*.html'))
+        total = sum(p.stat().st_size for p in pages)
+        print(f'{len(pages)} pages, {total / 1e6:.1f}MB')
+
+        runs = {
+            'two-pass': lambda out: two_pass(pages, out, out / '_static'),
+            'fused': lambda out: fused(pages, out, 1),
+            f'fused x{args.workers}': lambda out: fused(pages, out, args.workers),
+        }
+        for label, run in runs.items():
+            best = None
+            for i in range(args.repeat):
+                out = Path(tmp) / f'out-{i}'
+                shutil.rmtree(out, ignore_errors=True)
+                out.mkdir()
+                t0 = time.perf_counter()
+                run(out)
+                elapsed = time.perf_counter() - t0
+                best = elapsed if best is None else min(best, elapsed)
+            print(f'{label:>12}: {best * 1000:8.1f}ms  {len(pages) / best:8.0f} pages/s')
+
+
+if __name__ == '__main__':
+    main()
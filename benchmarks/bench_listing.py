@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""Measure time to first byte and peak memory of the /files listing.
+
+Compares the streamed listing against rendering the whole page with
+render_template over a fully built list.
+
+Usage: PYTHONPATH=. python benchmarks/bench_listing.py --files 50000
+"""
+import argparse
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+from flask import render_template
+
+from benchmarks.synthetic import make_course
+from canvas_viewer.app import create_app
+from canvas_viewer.parser import CanvasExport
+
+
+def measure(label, produce):
+    """produce() returns an iterable of str/bytes chunks; consume it without keeping the output.
+
+    Timing and memory are measured in separate passes since tracemalloc slows allocation.
+    """
+    t0 = time.perf_counter()
+    it = iter(produce())
+    first = next(it)
+    ttfb = time.perf_counter() - t0
+    total = len(first)
+    chunks = 1
+    for chunk in it:
+        total += len(chunk)
+        chunks += 1
+    elapsed = time.perf_counter() - t0
+
+    tracemalloc.start()
+    for _ in produce():
+        pass
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f'{label:>10}: ttfb {ttfb * 1000:8.1f}ms  total {elapsed * 1000:8.1f}ms  '
+          f'peak {peak / 1e6:7.1f}MB  {total / 1e6:.1f}MB in {chunks} chunks')
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--files', type=int, default=50000)
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        course = make_course(Path(tmp) / 'course', pages=10, files=args.files, modules=1)
+        app = create_app(str(course))
+        export_files = app.view_functions['files']
+
+        with app.test_request_context('/files'):
+            export = CanvasExport(str(course))
+
+            def full_render():
+                return [render_template('section.html', title='Files', items=export.get_files())]
+
+            def streamed():
+                return export_files().response
+
+            measure('full', full_render)
+            measure('streamed', streamed)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""Benchmark the exporter's page rendering: pages/s in process and on a PagePool.
+
+Each course page goes through the viewer's pipeline (parse, strip styles,
+rewrite links, page.html layout with nav and module sidebar), as
+CourseBuild.inject does; CSS injection alone is shown for comparison.
+
+Usage: PYTHONPATH=. python benchmarks/bench_page_render.py --pages 2000 --workers 4
+"""
+import argparse
+import os
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks.synthetic import make_course
+from scripts.export_courses import CourseBuild, PagePool, inject_page_bytes
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--pages', type=int, default=2000)
+    ap.add_argument('--words', type=int, default=400, help='words per page')
+    ap.add_argument('--modules', type=int, default=20)
+    ap.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        course = make_course(Path(tmp) / 'course', pages=args.pages, files=0, words_per_page=args.words,
+                             modules=args.modules)
+        build = CourseBuild(course, Path(tmp) / 'public')
+        build.scan()
+        build.parse()
+        renderer = build.page_renderer()
+        items = [(p.relative_to(course).as_posix(), p.read_bytes()) for p in sorted((course / 'wiki_content').iterdir())]
+        size = sum(len(raw) for _, raw in items)
+        print(f'{len(items)} pages, {size / 1e6:.1f}MB, {args.modules} modules')
+
+        t0 = time.perf_counter()
+        for rel, raw in items:
+            inject_page_bytes(raw, '../_static/canvas_viewer.css')
+        elapsed = time.perf_counter() - t0
+        print(f'{"CSS injection only":>20}: {elapsed:6.2f}s  {len(items) / elapsed:7.0f} pages/s')
+
+        for workers in sorted({1, args.workers}):
+            t0 = time.perf_counter()
+            with PagePool(renderer, workers) as pool:
+                out = pool.map(items)
+            elapsed = time.perf_counter() - t0
+            grown = sum(len(data) for data in out) / size
+            print(f'{f"rendered x{workers}":>20}: {elapsed:6.2f}s  {len(items) / elapsed:7.0f} pages/s '
+                  f'(output {grown:.2f}x the input)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""Benchmark per-page render time with a large organization tree.
+
+Compares /page renders that reuse the cached nav/sidebar fragments with renders
+where the fragment cache is cleared before every request.
+
+Usage: PYTHONPATH=. python benchmarks/bench_render.py --modules 300 --pages 8000
+"""
+import argparse
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks.synthetic import make_course
+from canvas_viewer.app import create_app
+
+
+def run(client, hrefs, before=None):
+    times = []
+    for href in hrefs:
+        if before:
+            before()
+        t0 = time.perf_counter()
+        r = client.get('/page/' + href)
+        times.append((time.perf_counter() - t0) * 1000)
+        assert r.status_code == 200
+    return times
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--modules', type=int, default=300)
+    ap.add_argument('--pages', type=int, default=8000)
+    ap.add_argument('--requests', type=int, default=50)
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        course = make_course(Path(tmp) / 'course', pages=args.pages, files=0, modules=args.modules, words_per_page=200)
+        app = create_app(str(course))
+        client = app.test_client()
+        fragments = app.extensions['canvas_caches']['fragments']
+        hrefs = [f'wiki_content/page-{i:05d}.html' for i in range(0, args.pages, max(1, args.pages // args.requests))][:args.requests]
+
+        client.get('/page/' + hrefs[0])  # warm templates
+        uncached = run(client, hrefs, before=fragments.clear)
+        cached = run(client, hrefs)
+        for label, times in (('uncached', uncached), ('cached', cached)):
+            print(f'{label:>9}: median {statistics.median(times):7.2f}ms  max {max(times):7.2f}ms')
+        print(f'sidebar items: {args.pages}, modules: {args.modules}')
+
+
+if __name__ == '__main__':
+    main()
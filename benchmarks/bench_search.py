@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""Benchmark search index build time and query latency on a synthetic course.
+
+Usage: PYTHONPATH=. python benchmarks/bench_search.py --pages 5000
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks.synthetic import WORDS, make_course
+from canvas_viewer.parser import CanvasExport
+from canvas_viewer.search import SearchIndex
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--pages', type=int, default=2000)
+    ap.add_argument('--words', type=int, default=400, help='words per page')
+    ap.add_argument('--queries', type=int, default=500)
+    ap.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        course = make_course(Path(tmp) / 'course', pages=args.pages, words_per_page=args.words)
+        cache = os.path.join(tmp, 'cache')
+        export = CanvasExport(str(course))
+
+        for workers in sorted({1, args.workers}):
+            if os.path.exists(cache):
+                for name in os.listdir(cache):
+                    os.remove(os.path.join(cache, name))
+            idx = SearchIndex(export, cache_dir=cache, workers=workers)
+            t0 = time.perf_counter()
+            idx.build()
+            print(f'cold build ({workers} workers): {time.perf_counter() - t0:.2f}s for {len(idx.docs)} pages, {len(idx.postings)} terms')
+
+        idx = SearchIndex(export, cache_dir=cache, workers=args.workers)
+        t0 = time.perf_counter()
+        idx.build()
+        print(f'warm load from disk: {time.perf_counter() - t0:.2f}s ({os.path.getsize(idx.index_path) / 1e6:.1f} MB)')
+
+        page = course / 'wiki_content' / 'page-00000.html'
+        page.write_text(page.read_text() + '<p>freshly added words</p>')
+        t0 = time.perf_counter()
+        changed = idx.refresh(force=True)
+        print(f'incremental refresh: {time.perf_counter() - t0:.3f}s ({changed} page re-indexed)')
+
+        rng = random.Random(1)
+        latencies = []
+        for _ in range(args.queries):
+            q = ' '.join(rng.choice(WORDS) for _ in range(rng.randint(1, 3)))
+            t0 = time.perf_counter()
+            idx.search(q)
+            latencies.append((time.perf_counter() - t0) * 1000)
+        latencies.sort()
+        p95 = latencies[int(len(latencies) * 0.95) - 1]
+        print(f'query latency: p50 {statistics.median(latencies):.2f}ms p95 {p95:.2f}ms max {latencies[-1]:.2f}ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""Benchmark the static site's sharded search index: build time, peak memory and size.
+
+Pages are read and tokenized one at a time, as the exporter does.  Sizes are
+reported per 1,000 pages, together with what a two-term query downloads
+(index.json plus its terms' shards) and, for comparison, the viewer's
+single-file index (canvas_viewer.search) of the same pages.
+
+Usage: PYTHONPATH=. python benchmarks/bench_search_shards.py --pages 5000
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+from benchmarks.synthetic import WORDS, make_course
+from canvas_viewer.parser import CanvasExport
+from canvas_viewer.search import SearchIndex, page_text
+from canvas_viewer.search_shards import ShardedIndexWriter, shard_key
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--pages', type=int, default=5000)
+    ap.add_argument('--words', type=int, default=400, help='words per page')
+    ap.add_argument('--prefix', type=int, default=2, help='term prefix length shards are split by')
+    ap.add_argument('--queries', type=int, default=200)
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        course = make_course(Path(tmp) / 'course', pages=args.pages, files=0, words_per_page=args.words)
+        pages = sorted((course / 'wiki_content').iterdir())
+        out = Path(tmp) / '_search'
+
+        def build():
+            writer = ShardedIndexWriter(out, prefix=args.prefix)
+            for p in pages:
+                title, text = page_text(p.read_bytes())
+                writer.add(p.name, title, text)
+            return writer.finish()
+
+        t0 = time.perf_counter()
+        stats = build()
+        elapsed = time.perf_counter() - t0
+        # tracemalloc slows the build down several times, so memory is measured on a second run
+        tracemalloc.start()
+        build()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        shard_sizes = {f.stem: f.stat().st_size for f in (out / 't').iterdir()}
+        meta_size = (out / 'index.json').stat().st_size
+        per_k = 1000 / len(pages)
+        print(f'{len(pages)} pages x {args.words} words, prefix {args.prefix}')
+        print(f'build: {elapsed:.2f}s ({elapsed * per_k:.2f}s per 1,000 pages), peak traced memory {peak / 1e6:.1f}MB')
+        print(f'size: {stats["bytes"] / 1e6:.2f}MB ({stats["bytes"] * per_k / 1e6:.2f}MB per 1,000 pages) '
+              f'in {stats["shards"]} shards; index.json {meta_size / 1e3:.1f}KB, '
+              f'largest shard {max(shard_sizes.values()) / 1e3:.1f}KB')
+
+        rng = random.Random(0)
+        fetched = []
+        for _ in range(args.queries):
+            keys = {shard_key(rng.choice(WORDS), args.prefix) for _ in range(2)}
+            fetched.append(meta_size + sum(shard_sizes.get(k, 0) for k in keys))
+        print(f'two-term query downloads {sum(fetched) / len(fetched) / 1e3:.1f}KB on average')
+
+        cache = os.path.join(tmp, 'cache')
+        SearchIndex(CanvasExport(str(course)), cache_dir=cache).build()
+        single = os.path.getsize(os.path.join(cache, 'search_index.json'))
+        print(f'viewer single-file index: {single / 1e6:.2f}MB (positions and page text included)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""Benchmark --output-archive against a tree build followed by a separate tar step.
+
+The tree build writes every file to --dir and `tar` then reads them all back;
+the archive build streams the same files into one archive.  Both use the
+same compressor (zstd, or gzip with --format tar.gz) with --threads threads.
+
+Usage: PYTHONPATH=. python benchmarks/bench_site_archive.py --courses 8 --pages 300 --files 300
+"""
+import argparse
+import contextlib
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks.synthetic import make_course
+from scripts.export_courses import build_site, build_site_archive
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--courses', type=int, default=8)
+    ap.add_argument('--pages', type=int, default=300)
+    ap.add_argument('--files', type=int, default=300)
+    ap.add_argument('--format', choices=('tar.zst', 'tar.gz'), default='tar.zst' if shutil.which('zstd') else 'tar.gz')
+    ap.add_argument('--threads', type=int, default=os.cpu_count() or 1, help='compressor threads')
+    ap.add_argument('--dir', default=None, help='directory to run in (default: system temp dir)')
+    args = ap.parse_args()
+
+    compressor = ['zstd', '-q', '-3', f'-T{args.threads}'] if args.format == 'tar.zst' else \
+        (['pigz', '-n', '-p', str(args.threads)] if shutil.which('pigz') else ['gzip', '-n'])
+    with tempfile.TemporaryDirectory(dir=args.dir) as tmp:
+        courses = Path(tmp) / 'courses'
+        for i in range(args.courses):
+            make_course(courses / f'course-{i:03d}', pages=args.pages, files=args.files, seed=i)
+        n_files = sum(1 for p in courses.rglob('*') if p.is_file())
+        print(f'{args.courses} courses, {n_files} input files, {args.format}, {args.threads} compressor threads')
+
+        out = Path(tmp) / 'public'
+        tree_archive = Path(tmp) / ('tree.' + args.format)
+        t0 = time.perf_counter()
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            build_site(courses, out)
+        t1 = time.perf_counter()
+        with open(tree_archive, 'wb') as fh:
+            tar = subprocess.Popen(['tar', '-C', str(out), '-cf', '-', '.'], stdout=subprocess.PIPE)
+            subprocess.run(compressor + ['-c'], stdin=tar.stdout, stdout=fh, check=True)
+            tar.wait()
+        t2 = time.perf_counter()
+        print(f'tree + tar: {t2 - t0:6.2f}s (build {t1 - t0:.2f}s, tar {t2 - t1:.2f}s)  '
+              f'{tree_archive.stat().st_size / 1e6:.1f}MB')
+
+        archive = Path(tmp) / ('site.' + args.format)
+        t0 = time.perf_counter()
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            totals = build_site_archive(courses, archive, threads=args.threads)
+        elapsed = time.perf_counter() - t0
+        print(f'   archive: {elapsed:6.2f}s  {archive.stat().st_size / 1e6:.1f}MB '
+              f'({totals["archive"]["files"]} files via {totals["archive"]["compressor"]})')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""Microbenchmark the exporter's per-course template cost.
+
+Compares compiling each listing template from source for every course (what
+build_course used to do with inline jinja2.Template strings) against the
+shared environment, where templates compile once per process.
+
+Usage: PYTHONPATH=. python benchmarks/bench_templates.py --courses 200 --pages 100
+"""
+import argparse
+import os
+import tempfile
+import time
+from pathlib import Path
+
+import jinja2
+
+from benchmarks.synthetic import make_course
+from canvas_viewer.parser import CanvasExport
+from canvas_viewer.templating import TEMPLATE_DIR, export_environment
+
+LISTINGS = ('pages.html', 'files.html', 'modules.html')
+
+
+def contexts(exp):
+    name = exp.title or 'course'
+    css = './_static/canvas_viewer.css'
+    return {
+        'pages.html': dict(title=name, pages=exp.get_pages_by_folder('wiki_content'), css_href=css),
+        'files.html': dict(title=name, files=exp.get_files(), css_href=css),
+        'modules.html': dict(title=name, modules=exp.get_modules(), css_href=css),
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--courses', type=int, default=200, help='courses to render (one synthetic course, rendered N times)')
+    ap.add_argument('--pages', type=int, default=100)
+    ap.add_argument('--files', type=int, default=50)
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        exp = CanvasExport(str(make_course(Path(tmp) / 'course', pages=args.pages, files=args.files)))
+        ctx = contexts(exp)
+        sources = {n: Path(TEMPLATE_DIR, 'export', n).read_text() for n in LISTINGS}
+
+        t0 = time.perf_counter()
+        for _ in range(args.courses):
+            for n in LISTINGS:
+                jinja2.Template(sources[n]).render(**ctx[n])
+        inline = time.perf_counter() - t0
+
+        cold = export_environment(os.path.join(tmp, 'cache'))
+        t0 = time.perf_counter()
+        for n in LISTINGS:
+            cold.get_template('export/' + n)
+        compile_once = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        for _ in range(args.courses):
+            for n in LISTINGS:
+                cold.get_template('export/' + n).render(**ctx[n])
+        shared = time.perf_counter() - t0
+
+        # a new process (e.g. an exporter worker) loading from the bytecode cache
+        export_environment.cache_clear()
+        t0 = time.perf_counter()
+        for n in LISTINGS:
+            export_environment(os.path.join(tmp, 'cache')).get_template('export/' + n)
+        warm_load = time.perf_counter() - t0
+
+        print(f'{args.courses} courses, {args.pages} pages / {args.files} files each')
+        print(f'  inline Template per course: {inline / args.courses * 1000:7.3f}ms per course')
+        print(f'  shared environment        : {shared / args.courses * 1000:7.3f}ms per course')
+        print(f'  compile once              : {compile_once * 1000:7.3f}ms; from bytecode cache {warm_load * 1000:.3f}ms')
+
+
+if __name__ == '__main__':
+    main()
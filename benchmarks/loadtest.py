@@ -0,0 +1,356 @@
+#!/usr/bin/env python3
+"""Load-test the viewer on localhost: throughput and p50/p95/p99 latency per route.
+
+The viewer (create_app) runs in a separate process under the chosen server,
+bound to 127.0.0.1 only, on a synthetic course (benchmarks.synthetic) or a
+real export (--export).  Client threads then send a weighted mix of requests
+(--mix) over keep-alive connections:
+
+    page         /page/<wiki page>
+    listing      /modules, /files or /pages
+    static       /static/<web_resources file>
+    range        the same with a Range header for a slice of the file (206)
+    canvas_data  /canvas-data
+
+either as fast as --concurrency connections allow (closed loop), or at
+--rate requests per second (open loop, fixed or Poisson arrivals), where
+latency is measured from each request's scheduled start so a slow server
+is not hidden by requests waiting to be sent.  The first --warmup seconds
+are not recorded.
+
+Servers: werkzeug (threaded, the Flask development server), waitress and
+gunicorn when installed.
+
+Usage:
+    PYTHONPATH=. python benchmarks/loadtest.py --pages 2000 --concurrency 16 --duration 20
+    PYTHONPATH=. python benchmarks/loadtest.py --export courses/minimal-course-export --rate 200 --server waitress
+"""
+import argparse
+import contextlib
+import http.client
+import json
+import math
+import multiprocessing
+import os
+import queue
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from benchmarks.synthetic import make_course
+from canvas_viewer.parser import CanvasExport
+
+HOST = '127.0.0.1'
+SERVERS = ('werkzeug', 'waitress', 'gunicorn')
+DEFAULT_MIX = 'page=50,listing=15,static=15,range=10,canvas_data=10'
+LISTINGS = ('/modules', '/files', '/pages')
+# bytes asked for by a range request
+RANGE_BYTES = 4096
+
+
+def parse_mix(text):
+    """'page=50,static=10' -> {'page': 50.0, 'static': 10.0}."""
+    mix = {}
+    for part in text.split(','):
+        name, _, weight = part.partition('=')
+        name = name.strip()
+        if name not in Workload.KINDS:
+            raise ValueError(f'unknown request kind {name!r} (use {", ".join(Workload.KINDS)})')
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+class Workload:
+    """Picks the next request of the mix: (route label, path, headers, expected status)."""
+
+    KINDS = ('page', 'listing', 'static', 'range', 'canvas_data')
+
+    def __init__(self, export_path, mix, seed=0):
+        exp = CanvasExport(str(export_path))
+        self.pages = [p['href'] for p in exp.get_pages_by_folder('wiki_content')]
+        self.files = []
+        for f in exp.get_files():
+            try:
+                self.files.append((f['href'], os.path.getsize(os.path.join(export_path, f['href']))))
+            except OSError:
+                continue
+        # kinds the export has nothing for are dropped from the mix
+        available = {'page': bool(self.pages), 'static': bool(self.files),
+                     'range': any(size > 1 for _, size in self.files)}
+        self.mix = {kind: w for kind, w in mix.items() if w > 0 and available.get(kind, True)}
+        if not self.mix:
+            raise ValueError('nothing in the mix can be requested from this export')
+        self.kinds = list(self.mix)
+        self.weights = [self.mix[k] for k in self.kinds]
+        self.seed = seed
+
+    def generator(self, index):
+        """An independent picker for client thread index."""
+        rng = random.Random(self.seed * 1000 + index)
+        ranged = [(href, size) for href, size in self.files if size > 1]
+
+        def pick():
+            kind = rng.choices(self.kinds, self.weights)[0]
+            if kind == 'page':
+                return '/page/<href>', '/page/' + rng.choice(self.pages), {}, 200
+            if kind == 'listing':
+                path = rng.choice(LISTINGS)
+                return path, path, {}, 200
+            if kind == 'static':
+                return '/static/<file>', '/static/' + rng.choice(self.files)[0], {}, 200
+            if kind == 'range':
+                href, size = rng.choice(ranged)
+                start = rng.randrange(size - 1)
+                end = min(size - 1, start + RANGE_BYTES - 1)
+                return '/static/<file> (range)', '/static/' + href, {'Range': f'bytes={start}-{end}'}, 206
+            return '/canvas-data', '/canvas-data', {}, 200
+        return pick
+
+
+def free_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind((HOST, 0))
+        return s.getsockname()[1]
+
+
+def _serve(server, export_path, port, threads, quiet):
+    # runs in the server process
+    if quiet:
+        sys.stdout = open(os.devnull, 'w')
+    from canvas_viewer.app import create_app
+    app = create_app(str(export_path))
+    if server == 'waitress':
+        import waitress
+        waitress.serve(app, host=HOST, port=port, threads=threads, _quiet=True)
+    else:
+        import logging
+        from werkzeug.serving import make_server
+        logging.getLogger('werkzeug').setLevel(logging.ERROR)
+        make_server(HOST, port, app, threaded=True).serve_forever()
+
+
+@contextlib.contextmanager
+def run_server(server, export_path, threads=8, workers=1, quiet=True, timeout=60.0):
+    """Serve create_app(export_path) on localhost under server; yields the port once it answers."""
+    port = free_port()
+    if server == 'gunicorn':
+        if not shutil.which('gunicorn'):
+            raise RuntimeError('gunicorn is not installed')
+        cmd = ['gunicorn', '--bind', f'{HOST}:{port}', '--workers', str(workers), '--threads', str(threads),
+               '--log-level', 'warning', f'canvas_viewer.app:create_app({str(export_path)!r})']
+        proc = subprocess.Popen(cmd, stdout=subprocess.DEVNULL if quiet else None)
+        stop = proc.terminate
+
+        def alive():
+            return proc.poll() is None
+    else:
+        if server == 'waitress':
+            # fail here rather than in the server process
+            import waitress  # noqa: F401
+        # a fresh interpreter, so the server shares nothing with the client threads
+        proc = multiprocessing.get_context('spawn').Process(
+            target=_serve, args=(server, export_path, port, threads, quiet), daemon=True)
+        proc.start()
+        stop = proc.terminate
+        alive = proc.is_alive
+    try:
+        deadline = time.monotonic() + timeout
+        while True:
+            if not alive():
+                raise RuntimeError(f'{server} exited before serving')
+            try:
+                conn = http.client.HTTPConnection(HOST, port, timeout=5)
+                conn.request('GET', '/')
+                conn.getresponse().read()
+                conn.close()
+                break
+            except OSError:
+                if time.monotonic() > deadline:
+                    raise RuntimeError(f'{server} did not answer within {timeout:.0f}s')
+                time.sleep(0.1)
+        yield port
+    finally:
+        stop()
+        if server == 'gunicorn':
+            proc.wait(10)
+        else:
+            proc.join(10)
+
+
+class Recorder:
+    """Latencies (seconds) and errors per route, for requests that start after the warmup."""
+
+    def __init__(self, record_from):
+        self.record_from = record_from
+        self.latencies = {}
+        self.errors = {}
+        self._lock = threading.Lock()
+
+    def add(self, route, start, latency, ok):
+        if start < self.record_from:
+            return
+        with self._lock:
+            self.latencies.setdefault(route, []).append(latency)
+            if not ok:
+                self.errors[route] = self.errors.get(route, 0) + 1
+
+    def report(self, seconds):
+        routes = {}
+        everything = []
+        for route, values in sorted(self.latencies.items()):
+            values.sort()
+            everything.extend(values)
+            routes[route] = self._summary(values, self.errors.get(route, 0), seconds)
+        everything.sort()
+        return {'seconds': round(seconds, 3), 'routes': routes,
+                'total': self._summary(everything, sum(self.errors.values()), seconds)}
+
+    @staticmethod
+    def _summary(values, errors, seconds):
+        summary = {'requests': len(values), 'errors': errors,
+                   'rps': round(len(values) / seconds, 2) if seconds else 0.0}
+        for pct in (50, 95, 99, 100):
+            value = percentile(values, pct)
+            summary[f'p{pct}_ms' if pct < 100 else 'max_ms'] = round(value * 1000, 3) if value is not None else None
+        return summary
+
+
+def _send(conn, path, headers, expect):
+    """Send one request on conn; returns (ok, conn), reconnecting after a failure."""
+    try:
+        conn.request('GET', path, headers=headers)
+        resp = conn.getresponse()
+        resp.read()
+        return resp.status == expect, conn
+    except (OSError, http.client.HTTPException):
+        conn.close()
+        return False, http.client.HTTPConnection(conn.host, conn.port, timeout=conn.timeout)
+
+
+def run_load(port, workload, concurrency=8, duration=10.0, warmup=1.0, rate=None, arrivals='poisson', seed=0):
+    """Drive the server on port for warmup + duration seconds; returns Recorder.report().
+
+    Without rate, concurrency threads each send their next request as soon as
+    the last one is answered.  With rate (requests/second), a scheduler
+    releases requests at that rate to concurrency threads, and latency
+    counts from the scheduled time.
+    """
+    t0 = time.perf_counter()
+    end = t0 + warmup + duration
+    recorder = Recorder(t0 + warmup)
+    jobs = queue.Queue() if rate else None
+
+    def client(index):
+        pick = workload.generator(index)
+        conn = http.client.HTTPConnection(HOST, port, timeout=30)
+        try:
+            while True:
+                if jobs is None:
+                    start = time.perf_counter()
+                    if start >= end:
+                        return
+                    route, path, headers, expect = pick()
+                else:
+                    item = jobs.get()
+                    if item is None:
+                        return
+                    start, (route, path, headers, expect) = item
+                ok, conn = _send(conn, path, headers, expect)
+                recorder.add(route, start, time.perf_counter() - start, ok)
+        finally:
+            conn.close()
+
+    threads = [threading.Thread(target=client, args=(i,), daemon=True) for i in range(concurrency)]
+    for t in threads:
+        t.start()
+    if jobs is not None:
+        rng = random.Random(seed)
+        pick = workload.generator(concurrency)
+        due = t0
+        while due < end:
+            due += rng.expovariate(rate) if arrivals == 'poisson' else 1.0 / rate
+            delay = due - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            jobs.put((due, pick()))
+        for _ in threads:
+            jobs.put(None)
+    for t in threads:
+        t.join()
+    return recorder.report(time.perf_counter() - recorder.record_from)
+
+
+def print_report(report):
+    print(f'{"route":<26} {"requests":>9} {"errors":>7} {"req/s":>9} {"p50 ms":>9} {"p95 ms":>9} {"p99 ms":>9}')
+    rows = list(report['routes'].items()) + [('total', report['total'])]
+    for route, r in rows:
+        if route == 'total':
+            print('-' * 84)
+        print(f'{route:<26} {r["requests"]:>9} {r["errors"]:>7} {r["rps"]:>9.1f} '
+              f'{r["p50_ms"] or 0:>9.2f} {r["p95_ms"] or 0:>9.2f} {r["p99_ms"] or 0:>9.2f}')
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--export', metavar='PATH', help='serve this export instead of a synthetic course')
+    ap.add_argument('--pages', type=int, default=1000)
+    ap.add_argument('--files', type=int, default=500)
+    ap.add_argument('--modules', type=int, default=30)
+    ap.add_argument('--file-kb', type=int, default=64)
+    ap.add_argument('--server', choices=SERVERS, default='werkzeug')
+    ap.add_argument('--server-threads', type=int, default=8, help='threads per server process (waitress, gunicorn)')
+    ap.add_argument('--server-workers', type=int, default=1, help='server processes (gunicorn)')
+    ap.add_argument('--mix', default=DEFAULT_MIX, help=f'request kinds and weights (default {DEFAULT_MIX})')
+    ap.add_argument('--concurrency', '-c', type=int, default=8, help='client connections')
+    ap.add_argument('--rate', type=float, default=None, help='requests per second (open loop); default: closed loop')
+    ap.add_argument('--arrivals', choices=('poisson', 'uniform'), default='poisson', help='arrival process with --rate')
+    ap.add_argument('--duration', type=float, default=10.0, help='seconds measured')
+    ap.add_argument('--warmup', type=float, default=2.0, help='seconds run before measuring')
+    ap.add_argument('--seed', type=int, default=0)
+    ap.add_argument('--output', metavar='PATH', help='write the report to PATH as JSON')
+    args = ap.parse_args()
+
+    try:
+        mix = parse_mix(args.mix)
+    except ValueError as e:
+        ap.error(str(e))
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.export:
+            export_path = Path(args.export).resolve()
+        else:
+            export_path = make_course(Path(tmp) / 'course', pages=args.pages, files=args.files, modules=args.modules,
+                                      file_kb=args.file_kb, links_per_page=8, files_meta=args.files)
+        # derived data goes to the temp dir, not next to a real export
+        os.environ['CANVAS_CACHE_DIR'] = os.path.join(tmp, 'cache')
+        workload = Workload(export_path, mix, args.seed)
+        mode = f'{args.rate:g} req/s ({args.arrivals})' if args.rate else 'closed loop'
+        print(f'{export_path}: {len(workload.pages)} pages, {len(workload.files)} files; {args.server}, '
+              f'{args.concurrency} connections, {mode}, {args.duration:g}s after {args.warmup:g}s warmup')
+        with run_server(args.server, export_path, threads=args.server_threads, workers=args.server_workers) as port:
+            report = run_load(port, workload, concurrency=args.concurrency, duration=args.duration,
+                              warmup=args.warmup, rate=args.rate, arrivals=args.arrivals, seed=args.seed)
+    report.update(server=args.server, concurrency=args.concurrency, rate=args.rate, mix=workload.mix)
+    print_report(report)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as fh:
+            json.dump(report, fh, indent=2)
+            fh.write('\n')
+    return 1 if report['total']['errors'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+"""Benchmark suite: parser, derived views, viewer routes and build_course on one synthetic export.
+
+Every benchmark is timed like timeit: a run repeats the operation until it
+has taken at least --min-time seconds, and the suite records the per-call
+time of --repeat runs.  Results are written as JSON (--output); with
+--baseline they are compared against a saved results file and benchmarks
+whose fastest run got slower by more than --threshold are reported as
+regressions (exit status 1); the minimum is compared, as the median moves
+with whatever else the machine is doing.
+
+The course is generated with benchmarks.synthetic.make_course, so results
+are only comparable between runs with the same course parameters; they are
+stored with the results, and --baseline refuses a file made with others.
+
+Usage:
+    PYTHONPATH=. python benchmarks/suite.py --output bench.json
+    PYTHONPATH=. python benchmarks/suite.py --baseline bench.json --only route.
+"""
+import argparse
+import contextlib
+import io
+import itertools
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks.synthetic import make_course
+from canvas_viewer.app import create_app
+from canvas_viewer.parser import CanvasExport
+from canvas_viewer.reports import canvas_data_report
+from scripts.export_courses import build_course
+
+RESULTS_VERSION = 1
+COURSE_PARAMS = ('pages', 'files', 'words_per_page', 'modules', 'module_depth', 'links_per_page', 'file_kb',
+                 'files_meta', 'data_uri_kb')
+# course options added after results were first saved, with the value those results were made with
+COURSE_PARAM_DEFAULTS = {'data_uri_kb': 0}
+# derived views of CanvasExport, called with these arguments
+VIEWS = {
+    'list_pages': (),
+    'get_pages_by_folder': ('wiki_content',),
+    'get_files': (),
+    'get_modules': (),
+    'tree_children': (0,),
+    'categorize_resources': (),
+    'detect_external_tools': (),
+    'find_external_links': (['https://*.instructure.com'],),
+    'get_course_metadata': (),
+    'get_syllabus': (),
+    'get_assignments': (),
+    'href_to_resource': ('web_resources/missing.txt',),
+}
+
+
+def time_runs(fn, repeat, min_time, setup=None):
+    """Per-call seconds of repeat runs of fn; setup (untimed) runs before every call."""
+    runs = []
+    for _ in range(repeat):
+        calls = 0
+        elapsed = 0.0
+        while elapsed < min_time or not calls:
+            if setup:
+                setup()
+            t0 = time.perf_counter()
+            fn()
+            elapsed += time.perf_counter() - t0
+            calls += 1
+        runs.append(elapsed / calls)
+    return runs
+
+
+def summarize(runs):
+    runs = sorted(runs)
+    return {
+        'median_ms': round(statistics.median(runs) * 1000, 4),
+        'min_ms': round(runs[0] * 1000, 4),
+        'max_ms': round(runs[-1] * 1000, 4),
+        'runs': len(runs),
+    }
+
+
+def benchmarks(course, tmp):
+    """Yield (name, fn, setup) for every benchmark of the suite."""
+    yield 'export.construct', lambda: CanvasExport(str(course)), None
+
+    exp = CanvasExport(str(course))
+    for view, view_args in VIEWS.items():
+        yield f'view.{view}', (lambda m=getattr(exp, view), a=view_args: m(*a)), None
+
+    def reset_organizations():
+        exp.state.organizations = None
+    yield 'view.organizations', lambda: exp.organizations, reset_organizations
+
+    yield 'report.canvas_data', lambda: canvas_data_report(exp, 'https://*.instructure.com'), None
+
+    os.environ['CANVAS_CACHE_DIR'] = os.path.join(tmp, 'cache')
+    app = create_app(str(course))
+    client = app.test_client()
+    pages = itertools.cycle(p['href'] for p in exp.get_pages_by_folder('wiki_content'))
+    files = itertools.cycle(f['href'] for f in exp.get_files())
+
+    def get(url, status=200):
+        r = client.get(url)
+        r.get_data()
+        assert r.status_code == status, (url, r.status_code)
+
+    yield 'route.page', lambda: get('/page/' + next(pages)), None
+    # rendered pages are cached; this one measures the parse/rewrite/render pipeline itself
+    yield 'route.page_uncached', lambda: get('/page/' + next(pages)), app.extensions['canvas_caches']['pages'].clear
+    yield 'route.static_hit', lambda: get('/static/' + next(files)), None
+    yield 'route.static_miss', lambda: get('/static/web_resources/missing.txt', 404), None
+    yield 'route.modules', lambda: get('/modules'), None
+    yield 'route.files', lambda: get('/files'), None
+    # the first request starts the report job; later ones are served from its result
+    get('/canvas-data')
+    key = ('canvas-data', os.environ.get('CANVAS_BASE_DOMAIN', 'https://*.instructure.com'))
+    while app.extensions['canvas_jobs'].latest(key) is None:
+        time.sleep(0.05)
+    yield 'route.canvas_data', lambda: get('/canvas-data'), None
+
+    out = Path(tmp) / 'public'
+
+    def clean():
+        shutil.rmtree(out, ignore_errors=True)
+    yield 'build.course', lambda: build_course(course, out), clean
+
+
+def compare(results, baseline, threshold):
+    """Print each benchmark's fastest run against the baseline's; returns the names that got slower than threshold allows."""
+    regressions = []
+    print(f'{"benchmark":<28} {"baseline ms":>12} {"now ms":>12} {"ratio":>7}')
+    for name, res in results['results'].items():
+        base = baseline['results'].get(name)
+        if base is None:
+            print(f'{name:<28} {"-":>12} {res["min_ms"]:>12.3f}')
+            continue
+        ratio = res['min_ms'] / base['min_ms'] if base['min_ms'] else float('inf')
+        flag = ''
+        if ratio > threshold:
+            regressions.append(name)
+            flag = '  slower'
+        elif ratio < 1 / threshold:
+            flag = '  faster'
+        print(f'{name:<28} {base["min_ms"]:>12.3f} {res["min_ms"]:>12.3f} {ratio:>6.2f}x{flag}')
+    return regressions
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--pages', type=int, default=2000)
+    ap.add_argument('--files', type=int, default=1000)
+    ap.add_argument('--words-per-page', type=int, default=300)
+    ap.add_argument('--modules', type=int, default=40)
+    ap.add_argument('--module-depth', type=int, default=2)
+    ap.add_argument('--links-per-page', type=int, default=8)
+    ap.add_argument('--file-kb', type=int, default=4)
+    ap.add_argument('--files-meta', type=int, default=500, help='files_meta.xml entries')
+    ap.add_argument('--data-uri-kb', type=int, default=0, help='size of a base64 data: URI image pasted into every page')
+    ap.add_argument('--repeat', type=int, default=5, help='timed runs per benchmark')
+    ap.add_argument('--min-time', type=float, default=0.2, help='seconds each run lasts at least')
+    ap.add_argument('--only', action='append', default=[], help='run benchmarks whose name starts with this (repeatable)')
+    ap.add_argument('--output', metavar='PATH', help='write the results to PATH as JSON')
+    ap.add_argument('--baseline', metavar='PATH', help='compare against results saved by an earlier --output')
+    ap.add_argument('--threshold', type=float, default=1.25,
+                    help='time ratio (fastest runs) above which a benchmark counts as a regression')
+    args = ap.parse_args()
+
+    course_params = {name: getattr(args, name) for name in COURSE_PARAMS}
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as fh:
+            baseline = json.load(fh)
+        if dict(COURSE_PARAM_DEFAULTS, **baseline.get('course', {})) != course_params:
+            ap.error(f'{args.baseline} was made with a different course: {baseline.get("course")}')
+
+    results = {
+        'version': RESULTS_VERSION,
+        'course': course_params,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'results': {},
+    }
+    with tempfile.TemporaryDirectory() as tmp:
+        course = make_course(Path(tmp) / 'course', **course_params)
+        print(f'course: {course_params}')
+        # the viewer and the exporter log every request and course; keep the report readable
+        log = io.StringIO()
+        suite = benchmarks(course, tmp)
+        while True:
+            with contextlib.redirect_stdout(log):
+                name, fn, setup = next(suite, (None, None, None))
+                if name is None:
+                    break
+                if args.only and not any(name.startswith(prefix) for prefix in args.only):
+                    continue
+                res = summarize(time_runs(fn, args.repeat, args.min_time, setup))
+            results['results'][name] = res
+            print(f'{name:<28} {res["median_ms"]:>10.3f} ms  (min {res["min_ms"]:.3f}, max {res["max_ms"]:.3f})')
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as fh:
+            json.dump(results, fh, indent=2)
+            fh.write('\n')
+    if baseline is not None:
+        print()
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f'{len(regressions)} regressions over {args.threshold:.2f}x: {", ".join(regressions)}')
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,134 @@
+"""Generate synthetic Canvas exports for benchmarks.
+
+The generated folder has the same layout the parser expects: an imsmanifest.xml
+with resources and an organization tree, wiki_content pages and web_resources files.
+Optionally the pages link to each other and to files through the placeholders
+Canvas writes ($WIKI_REFERENCE$, $IMS-CC-FILEBASE$, $CANVAS_COURSE_REFERENCE$)
+and to external sites, modules are nested several levels deep, and
+course_settings/files_meta.xml gives files display names and unlock dates.
+Pages can also carry pasted images as base64 data: URIs.
+"""
+import base64
+import random
+from pathlib import Path
+from xml.sax.saxutils import escape
+
+WORDS = (
+    'lecture syllabus assignment reading quiz exam module week chapter problem '
+    'solution review lab experiment data analysis theory model equation proof '
+    'history policy grading office hours deadline project report essay draft '
+    'photosynthesis enzyme protein genome cell energy market demand supply '
+    'algorithm graph matrix vector function integral derivative limit series'
+).split()
+
+MANIFEST_NS = 'http://www.imsglobal.org/xsd/imsccv1p1/imscp_v1p1'
+CANVAS_NS = 'http://canvas.instructure.com/xsd/cccv1p0'
+# what make_course's placeholder links point at, picked in turn
+LINK_KINDS = ('wiki', 'filebase', 'image', 'relative', 'course', 'external', 'canvas')
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+
+def _link(kind, rng, pages, files):
+    if kind == 'wiki' and pages:
+        return f'<a href="$WIKI_REFERENCE$/pages/page-{rng.randrange(pages):05d}">see also</a>'
+    if kind == 'filebase' and files:
+        return f'<a href="$IMS-CC-FILEBASE$/file-{rng.randrange(files):05d}.txt?canvas_download=1">handout</a>'
+    if kind == 'image' and files:
+        return f'<img src="$IMS-CC-FILEBASE$/file-{rng.randrange(files):05d}.txt" alt="figure">'
+    if kind == 'relative' and pages:
+        return f'<a href="page-{rng.randrange(pages):05d}.html">next</a>'
+    if kind == 'course':
+        return '<a href="$CANVAS_COURSE_REFERENCE$/modules">modules</a>'
+    if kind == 'external':
+        return f'<a href="https://example{rng.randrange(20)}.org/{rng.choice(WORDS)}">reference</a>'
+    if kind == 'canvas':
+        return f'<a href="https://school.instructure.com/courses/1/{rng.choice(WORDS)}">canvas</a>'
+    return ''
+
+
+def make_course(dest, pages=100, files=20, words_per_page=300, modules=10, seed=0, module_depth=1,
+                links_per_page=0, file_kb=0, files_meta=0, data_uri_kb=0):
+    """Write a synthetic export to dest and return its Path.
+
+    module_depth nests each module's items under that many levels of
+    headings; links_per_page adds that many links (LINK_KINDS in turn) to
+    every page; file_kb > 0 writes files of that size instead of a line of
+    words; files_meta writes files_meta.xml entries for the first that many
+    files; data_uri_kb > 0 pastes an image of that size into every page as a
+    base64 data: URI, like a screenshot pasted into the Canvas editor.
+    """
+    rng = random.Random(seed)
+    dest = Path(dest)
+    (dest / 'wiki_content').mkdir(parents=True, exist_ok=True)
+    (dest / 'web_resources').mkdir(parents=True, exist_ok=True)
+    (dest / 'course_settings').mkdir(parents=True, exist_ok=True)
+
+    resources = []
+    for i in range(pages):
+        href = f'wiki_content/page-{i:05d}.html'
+        paras = []
+        remaining = words_per_page
+        while remaining > 0:
+            n = min(remaining, 60)
+            paras.append('<p>' + ' '.join(rng.choice(WORDS) for _ in range(n)) + '</p>')
+            remaining -= n
+        if links_per_page:
+            paras.append('<p>' + ' '.join(_link(LINK_KINDS[(i + k) % len(LINK_KINDS)], rng, pages, files)
+                                          for k in range(links_per_page)) + '</p>')
+        if data_uri_kb:
+            image = PNG_SIGNATURE + rng.randbytes(data_uri_kb * 1024 - len(PNG_SIGNATURE))
+            paras.insert(1, f'<p><img alt="screenshot" src="data:image/png;base64,'
+                            f'{base64.b64encode(image).decode("ascii")}"></p>')
+        title = f'Page {i} {rng.choice(WORDS).title()}'
+        (dest / href).write_text(
+            f'<!doctype html>\n<html><head><meta charset="utf-8"><title>{title}</title></head>\n'
+            f'<body><h1>{title}</h1>\n' + '\n'.join(paras) + '\n</body></html>\n',
+            encoding='utf-8',
+        )
+        resources.append((f'res-page-{i}', href, title))
+    for i in range(files):
+        href = f'web_resources/file-{i:05d}.txt'
+        if file_kb:
+            line = (' '.join(rng.choice(WORDS) for _ in range(50)) + '\n').encode('utf-8')
+            (dest / href).write_bytes((line * (file_kb * 1024 // len(line) + 1))[:file_kb * 1024])
+        else:
+            (dest / href).write_text(' '.join(rng.choice(WORDS) for _ in range(50)), encoding='utf-8')
+        resources.append((f'res-file-{i}', href, f'File {i}'))
+    if files_meta:
+        entries = ''.join(
+            f'<file identifier="res-file-{i}"><display_name>{escape(rng.choice(WORDS).title())} handout {i}.txt'
+            f'</display_name><unlock_at>2024-{1 + i % 12:02d}-{1 + i % 28:02d}T08:00:00Z</unlock_at></file>'
+            for i in range(min(files_meta, files))
+        )
+        (dest / 'course_settings' / 'files_meta.xml').write_text(
+            f'<?xml version="1.0" encoding="UTF-8"?>\n<fileMeta xmlns="{CANVAS_NS}"><files>{entries}</files></fileMeta>\n',
+            encoding='utf-8',
+        )
+
+    (dest / 'course_settings' / 'course_settings.xml').write_text(
+        '<?xml version="1.0" encoding="UTF-8"?>\n<course><name>Synthetic Course</name></course>\n',
+        encoding='utf-8',
+    )
+
+    items = []
+    per_module = max(1, len(resources) // max(1, modules))
+    for m in range(modules):
+        chunk = resources[m * per_module:(m + 1) * per_module]
+        children = ''.join(
+            f'<item identifier="item-{m}-{j}" identifierref="{ident}"><title>{escape(title)}</title></item>'
+            for j, (ident, _, title) in enumerate(chunk)
+        )
+        for d in range(module_depth - 1, 0, -1):
+            children = f'<item identifier="mod-{m}-{d}"><title>Unit {m}.{d}</title>{children}</item>'
+        items.append(f'<item identifier="mod-{m}"><title>Module {m}</title>{children}</item>')
+    res_xml = ''.join(
+        f'<resource identifier="{ident}" type="webcontent" href="{href}"><file href="{href}"/></resource>'
+        for ident, href, _ in resources
+    )
+    (dest / 'imsmanifest.xml').write_text(
+        f'<?xml version="1.0" encoding="UTF-8"?>\n<manifest xmlns="{MANIFEST_NS}" identifier="synthetic">'
+        f'<organizations><organization identifier="org1"><title>Synthetic</title>{"".join(items)}'
+        f'</organization></organizations><resources>{res_xml}</resources></manifest>\n',
+        encoding='utf-8',
+    )
+    return dest
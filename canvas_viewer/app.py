@@ -1,50 +1,230 @@
+import hmac
 import os
-import json
-from datetime import datetime
-from flask import Flask, send_file, render_template, abort, send_from_directory, Response, url_for
+from flask import Flask, send_file, render_template, abort, send_from_directory, Response, url_for, request, jsonify, g
+from .archive import is_archive
 from .parser import CanvasExport
-from lxml import html
+from .search import SearchIndex
+from .jobs import JobRunner
+from .memory import GROUPS, AllocationTracer, memory_report
+from .assets import AssetStore
+from .cache import GenerationCache
+from .refgraph import build_reference_graph
+from .rendering import rewrite_page, viewer_link
+from .reports import canvas_data_report, empty_canvas_data_report
+from .templating import TEMPLATE_DIR, bytecode_cache
+from .tracing import SlowRequestProfiler, Trace, activate, deactivate, span, trace_exporter
+from markupsafe import Markup
 import io
-import posixpath
-from urllib.parse import urljoin, urlparse
+from urllib.parse import quote, urljoin
+from concurrent.futures import ThreadPoolExecutor
+import itertools
+import random
+import time
 
+# what create_app(warm=...) precomputes: 'key' views and pages, or 'all' pages
+WARM_MODES = ('key', 'all')
+# seconds browsers may cache /asset/<name> responses (a year)
+ASSET_MAX_AGE = 365 * 24 * 3600
 
-def create_app(export_path):
+
+def create_app(export_path, warm=None):
     # disable Flask's automatic static handling so our custom /static route is used
-    app = Flask(__name__, template_folder=os.path.join(os.path.dirname(__file__), 'templates'), static_folder=None)
+    app = Flask(__name__, template_folder=TEMPLATE_DIR, static_folder=None)
+    # pages and files are served straight from the export folder, which a package does not have
+    if is_archive(export_path) and os.path.isfile(export_path):
+        raise ValueError(f"{export_path} is a course package; extract it and point the viewer at the folder "
+                         "(scripts/export_courses.py builds packages without extracting them)")
     export = CanvasExport(export_path)
-
-    @app.context_processor
-    def inject_nav():
-        # compute availability of top-level sections so templates can hide empty menu items
-        cats = export.categorize_resources()
-        pages = export.get_pages_by_folder('wiki_content')
-        files = export.get_files()
-        mods = export.get_modules()
-        return {
-            'nav': {
-                'home': bool(pages) or bool(export.get_syllabus()),
-                'syllabus': bool(export.get_syllabus()),
+    # derived data (search index, ...) is cached next to the export unless CANVAS_CACHE_DIR overrides it
+    app.config['CACHE_DIR'] = os.environ.get('CANVAS_CACHE_DIR') or os.path.join(export_path, '.canvas_viewer')
+    # compiled templates are kept on disk so a restarted server skips compiling them
+    app.jinja_options = dict(app.jinja_options, bytecode_cache=bytecode_cache(app.config['CACHE_DIR']))
+    # templates build their links through link() (see canvas_viewer.rendering)
+    app.jinja_env.globals['link'] = viewer_link
+    # seconds between on-request checks for changed pages
+    app.config.setdefault('SEARCH_REFRESH_INTERVAL', 5.0)
+    search_index = SearchIndex(export, cache_dir=app.config['CACHE_DIR'])
+    search_index.build()
+    # number of template events Jinja buffers before flushing a chunk of a streamed listing
+    app.config.setdefault('STREAM_BUFFER_SIZE', 256)
+
+    def stream_listing(template_name, items, **context):
+        """Render a listing template as a streamed response.
+
+        items may be any iterable (typically a generator over the export's
+        indexes); it is peeked once so templates can still test `{% if items %}`.
+        The template context is resolved up front, so the stream itself does not
+        need the request context to stay alive.
+        """
+        items = iter(items)
+        first = next(items, None)
+        context['items'] = itertools.chain([first], items) if first is not None else []
+        app.update_template_context(context)
+        stream = app.jinja_env.get_template(template_name).stream(context)
+        stream.enable_buffering(app.config['STREAM_BUFFER_SIZE'])
+        return Response(stream, mimetype='text/html')
+
+    # reports that are too slow to compute inside a request run on this pool
+    app.config.setdefault('JOB_WORKERS', 2)
+    # seconds the first /canvas-data request waits for its report before rendering a placeholder
+    app.config.setdefault('CANVAS_DATA_WAIT', 2.0)
+    # seconds between checks for a changed manifest/course settings on disk
+    app.config.setdefault('EXPORT_RELOAD_INTERVAL', 2.0)
+    jobs = JobRunner(max_workers=app.config['JOB_WORKERS'])
+    app.extensions['canvas_jobs'] = jobs
+
+    # /_admin/... (and X-Canvas-Profile) are off unless CANVAS_ADMIN_TOKEN is set, and then only
+    # answer requests sending that token in X-Admin-Token; a local address proves nothing behind a proxy
+    app.config.setdefault('ADMIN_TOKEN', os.environ.get('CANVAS_ADMIN_TOKEN') or None)
+
+    def is_admin():
+        token = app.config['ADMIN_TOKEN']
+        if not token:
+            return False
+        return hmac.compare_digest(request.headers.get('X-Admin-Token', ''), token)
+
+    # per-request tracing spans (see canvas_viewer.tracing): CANVAS_TRACE=log writes a JSON line per
+    # traced request to CANVAS_TRACE_TARGET (a file) or stderr, CANVAS_TRACE=otlp posts the spans to
+    # an OTLP/HTTP collector at CANVAS_TRACE_TARGET (default http://127.0.0.1:4318/v1/traces)
+    app.config.setdefault('TRACE', os.environ.get('CANVAS_TRACE') or None)
+    app.config.setdefault('TRACE_TARGET', os.environ.get('CANVAS_TRACE_TARGET') or None)
+    # fraction of requests traced; a request with X-Canvas-Trace: 1 is always traced
+    app.config.setdefault('TRACE_SAMPLE_RATE', float(os.environ.get('CANVAS_TRACE_SAMPLE_RATE', 1.0)))
+    # fraction of requests run under cProfile (and, from an admin, any request with X-Canvas-Profile: 1);
+    # profiles of requests taking PROFILE_THRESHOLD_MS or longer are kept in PROFILE_DIR
+    app.config.setdefault('PROFILE_SAMPLE_RATE', float(os.environ.get('CANVAS_PROFILE_SAMPLE_RATE', 0.0)))
+    app.config.setdefault('PROFILE_THRESHOLD_MS', float(os.environ.get('CANVAS_PROFILE_THRESHOLD_MS', 200.0)))
+    app.config.setdefault('PROFILE_DIR', os.path.join(app.config['CACHE_DIR'], 'profiles'))
+    if app.config['TRACE']:
+        app.extensions['canvas_trace_exporter'] = trace_exporter(app.config['TRACE'], app.config['TRACE_TARGET'])
+    profiler = SlowRequestProfiler(app.config['PROFILE_DIR'], app.config['PROFILE_THRESHOLD_MS'])
+
+    # registered first, so the spans of every other hook land in the request's trace
+    @app.before_request
+    def start_trace():
+        exporter = app.extensions.get('canvas_trace_exporter')
+        if exporter is not None and (request.headers.get('X-Canvas-Trace') == '1'
+                                     or random.random() < app.config['TRACE_SAMPLE_RATE']):
+            route = request.url_rule.rule if request.url_rule else request.path
+            trace = Trace(f'{request.method} {route}', **{'http.method': request.method, 'http.route': route,
+                                                          'url.path': request.path})
+            g.canvas_trace = (trace, activate(trace))
+        if ((request.headers.get('X-Canvas-Profile') == '1' and is_admin())
+                or random.random() < app.config['PROFILE_SAMPLE_RATE']):
+            g.canvas_profile = (profiler.start(), time.perf_counter())
+
+    @app.after_request
+    def tag_trace(response):
+        traced = g.get('canvas_trace')
+        if traced:
+            traced[0].attrs['http.status_code'] = response.status_code
+            response.headers['X-Trace-Id'] = traced[0].trace_id
+        return response
+
+    @app.teardown_request
+    def finish_trace(exc):
+        prof, started = g.pop('canvas_profile', (None, None))
+        if prof is not None:
+            elapsed = (time.perf_counter() - started) * 1000
+            path = profiler.finish(prof, request.path, elapsed)
+            if path:
+                print(f"[profile] {request.path} took {elapsed:.0f}ms: {path}")
+        traced = g.pop('canvas_trace', None)
+        if traced:
+            trace, token = traced
+            deactivate(token)
+            trace.finish(**({'error': type(exc).__name__} if exc else {}))
+            app.extensions['canvas_trace_exporter'].export(trace)
+
+    @app.before_request
+    def check_export_changed():
+        export.reload_if_changed(min_interval=app.config['EXPORT_RELOAD_INTERVAL'])
+
+    def submit_canvas_data_job():
+        """Ensure a Canvas Data report for the current export generation is computed or underway.
+
+        Returns (job for the current generation, latest finished job or None).
+        """
+        # allowed base domain(s) can be configured via CANVAS_BASE_DOMAIN (comma-separated).
+        # default matches any *.instructure.com host.
+        raw_base = os.environ.get('CANVAS_BASE_DOMAIN', 'https://*.instructure.com')
+        key = ('canvas-data', raw_base)
+        job = jobs.submit(key, export.generation, lambda j: canvas_data_report(export, raw_base, progress=j.set_progress))
+        return job, jobs.latest(key)
+
+    # pre-rendered fragments shared by every page; keyed by export generation
+    fragments = GenerationCache('fragments')
+    # asset reference graph (and the set of files reachable in it), rebuilt when the manifest changes;
+    # the previous graph is served while the new one is built
+    refs = GenerationCache('refs', stale=True)
+    # the export's derived views (view('get_modules'), ...); callers must not modify what they get
+    views = GenerationCache('views')
+    # rendered /page responses, one per page, versioned by the file's mtime and size so an edited page
+    # replaces its old rendering; the least recently viewed pages go once they add up to PAGE_CACHE_BYTES
+    app.config.setdefault('PAGE_CACHE_BYTES', int(os.environ.get('CANVAS_PAGE_CACHE_BYTES', 64 * 1024 * 1024)))
+    rendered = GenerationCache('pages', max_bytes=app.config['PAGE_CACHE_BYTES'],
+                               sizeof=lambda body: len(body) if body else 0)
+    app.extensions['canvas_caches'] = {'fragments': fragments, 'refs': refs, 'views': views, 'pages': rendered}
+    # images lifted out of pages' base64 data: URIs, served by content hash from /asset/<name>
+    assets = AssetStore(os.path.join(app.config['CACHE_DIR'], 'assets'))
+    app.extensions['canvas_assets'] = assets
+
+    def view(name, *args):
+        return views.get_or_compute((name,) + args, export.generation, lambda: getattr(export, name)(*args))
+
+    def reference_graph():
+        def compute():
+            graph = build_reference_graph(export)
+            return graph, graph.reachable()
+        return refs.get_or_compute('graph', export.generation, compute)
+
+    def nav_flags():
+        # availability of top-level sections so templates can hide empty menu items
+        def compute():
+            cats = view('categorize_resources')
+            has_pages = any(export.iter_pages_by_folder('wiki_content'))
+            has_syllabus = bool(view('get_syllabus'))
+            return {
+                'home': has_pages or has_syllabus,
+                'syllabus': has_syllabus,
                 'announcements': bool(cats.get('announcements')),
-                'modules': bool(mods),
-                'pages': bool(pages),
-                'files': bool(files),
+                'modules': bool(view('get_modules')),
+                'pages': has_pages,
+                'files': any(export.iter_files()),
                 'quizzes': bool(cats.get('quizzes')),
                 'discussions': bool(cats.get('discussions')),
                 'people': bool(cats.get('people')),
             }
-        }
+        return fragments.get_or_compute('nav-flags', export.generation, compute)
+
+    def nav_fragment():
+        return fragments.get_or_compute('nav', export.generation, lambda: Markup(
+            app.jinja_env.get_template('_nav.html').render(nav=nav_flags())))
+
+    def sidebar_fragment():
+        # only the top level is pre-rendered; deeper levels are fetched from /modules/tree/<node>
+        def compute():
+            top = export.tree_children(0)
+            if not top:
+                return Markup('')
+            return Markup(app.jinja_env.get_template('_sidebar.html').render(items=top))
+        return fragments.get_or_compute('sidebar', export.generation, compute)
+
+    @app.context_processor
+    def inject_nav():
+        # fragments are passed as callables so templates that do not use them pay nothing
+        return {'nav': nav_flags(), 'nav_fragment': nav_fragment, 'sidebar_fragment': sidebar_fragment}
 
     @app.route('/')
     def index():
-        pages = export.list_pages()
+        pages = view('list_pages')
         title = export.title or os.path.basename(export_path)
-        metadata = export.get_course_metadata()
-        external_tools = export.detect_external_tools()
+        metadata = view('get_course_metadata')
+        external_tools = view('detect_external_tools')
         has_external_tools = bool(external_tools)
         # assets: include web_resources and course_settings files as 'assets'
         assets = [p for p in pages if p.get('href') and (p.get('href').startswith('web_resources') or p.get('href').startswith('course_settings'))]
-        return render_template('index.html', pages=pages, title=title, organizations=export.organizations, metadata=metadata, assets=assets, external_tools=external_tools, has_external_tools=has_external_tools)
+        return render_template('index.html', pages=pages, title=title, metadata=metadata, assets=assets, external_tools=external_tools, has_external_tools=has_external_tools)
 
     @app.route('/page/<path:href>')
     def page(href):
@@ -53,95 +233,37 @@ def create_app(export_path):
         if full and os.path.exists(full):
             # if HTML, render directly; otherwise send as file
             if full.lower().endswith('.html'):
-                # rewrite local links to point to /static/<path> or /page/<path>
-                with open(full, 'rb') as f:
-                    raw = f.read()
-                try:
-                    doc = html.fromstring(raw)
-                except Exception:
+                def compute():
+                    # rewrite local links to point to /static/<path> or /page/<path>
+                    with span('page.read'):
+                        with open(full, 'rb') as f:
+                            raw = f.read()
+                    out = rewrite_page(raw, href, viewer_link, assets)
+                    if out is None:
+                        return None
+                    # render inside page layout so nav/sidebar persist
+                    with span('page.render_template'):
+                        return render_template('page.html', content=out, title=os.path.basename(href))
+                st = os.stat(full)
+                body = rendered.get_or_compute(href, export.generation, compute, version=(st.st_mtime_ns, st.st_size))
+                if body is None:
                     return send_file(full)
-
-                # base directory for resolving relative links
-                base_dir = posixpath.dirname(href)
-                # remove embedded <style> blocks and external stylesheet links from exported pages
-                try:
-                    for s in doc.xpath('//style'):
-                        parent = s.getparent()
-                        if parent is not None:
-                            parent.remove(s)
-                except Exception:
-                    pass
-                try:
-                    for l in doc.xpath('//link'):
-                        rel = (l.get('rel') or '').lower()
-                        # if it's a stylesheet link, remove it so our site CSS wins
-                        if 'stylesheet' in rel or (l.get('type') or '').lower() == 'text/css':
-                            parent = l.getparent()
-                            if parent is not None:
-                                parent.remove(l)
-                except Exception:
-                    pass
-
-                def rewrite_attr(val):
-                    if not val:
-                        return val
-                    parsed = urlparse(val)
-                    # leave absolute URLs alone
-                    if parsed.scheme in ('http', 'https', 'mailto') or val.startswith('//'):
-                        return val
-                    # handle anchors
-                    if val.startswith('#'):
-                        return val
-                    # handle Canvas course reference links like $CANVAS_COURSE_REFERENCE$/modules
-                    if val.startswith('$CANVAS_COURSE_REFERENCE$'):
-                        tail = val.replace('$CANVAS_COURSE_REFERENCE$', '').lstrip('/')
-                        # map known route names
-                        if tail.startswith('modules'):
-                            return '/modules'
-                        if tail.startswith('pages'):
-                            return '/pages'
-                        return '/' + tail
-                    # handle IMS filebase placeholders by mapping to web_resources
-                    if val.startswith('$IMS-CC-FILEBASE$'):
-                        tail = val.replace('$IMS-CC-FILEBASE$', '').lstrip('/')
-                        return '/static/web_resources/' + tail
-                    # build normalized path relative to base_dir
-                    joined = posixpath.normpath(posixpath.join(base_dir, val)) if not posixpath.isabs(val) else val.lstrip('/')
-                    # if it points to html -> page route
-                    if joined.lower().endswith('.html'):
-                        return '/page/' + joined
-                    # otherwise serve as static
-                    return '/static/' + joined
-
-                # strip inline style attributes so the app's CSS takes precedence
-                for el in doc.xpath('//*'):
-                    # remove inline style attributes which would otherwise override site CSS
-                    if 'style' in el.attrib:
-                        try:
-                            del el.attrib['style']
-                        except Exception:
-                            pass
-                # rewrite tags (after stripping inline styles and removing stylesheet links)
-                for el in doc.xpath('//*'):
-                    tag = el.tag.lower() if hasattr(el, 'tag') else ''
-                    if tag == 'img' and el.get('src'):
-                        el.set('src', rewrite_attr(el.get('src')))
-                    if tag == 'a' and el.get('href'):
-                        el.set('href', rewrite_attr(el.get('href')))
-                    # link tags have been mostly removed; if remaining and have href, rewrite
-                    if tag == 'link' and el.get('href'):
-                        el.set('href', rewrite_attr(el.get('href')))
-                    if tag == 'script' and el.get('src'):
-                        el.set('src', rewrite_attr(el.get('src')))
-
-                out = html.tostring(doc, encoding='unicode', pretty_print=True)
-                # render inside page layout so nav/sidebar persist
-                return render_template('page.html', content=out, title=os.path.basename(href), organizations=export.organizations)
+                return body
             return send_file(full, as_attachment=False)
         abort(404)
 
     from urllib.parse import unquote
 
+    @app.route('/asset/<name>')
+    def asset(name):
+        # the name is the content's hash, so the file never changes: browsers may keep it for good
+        path = assets.path(name)
+        if path is None:
+            abort(404)
+        resp = send_file(path, mimetype=assets.mimetype(name), max_age=ASSET_MAX_AGE, etag=name.split('.')[0])
+        resp.cache_control.immutable = True
+        return resp
+
     @app.route('/static/<path:filename>')
     def static_files(filename):
         # decode URL-encoded parts (e.g., %20 -> space)
@@ -283,25 +405,36 @@ def create_app(export_path):
     # Course-level sections
     @app.route('/syllabus')
     def syllabus():
-        s = export.get_syllabus()
+        s = view('get_syllabus')
         if not s:
             return render_template('section.html', title='Syllabus', items=[], message='No syllabus found')
         return page(s['href'])
 
     @app.route('/files')
     def files():
-        files = export.get_files()
-        return render_template('section.html', title='Files', items=files)
+        return stream_listing('section.html', export.iter_files(), title='Files')
+
+    @app.route('/files/used-by/<path:rel>')
+    def file_used_by(rel):
+        """Reverse lookup: the pages that link to an export file, as JSON."""
+        graph, reachable = reference_graph()
+        if rel not in graph.files:
+            abort(404)
+        return jsonify({
+            'path': rel,
+            'generation': export.generation,
+            'referenced': rel in reachable,
+            'used_by': graph.used_by(rel),
+        })
 
     @app.route('/assignments')
     def assignments():
-        assigns = export.get_assignments()
-        return render_template('section.html', title='Assignments', items=assigns)
+        assigns = view('get_assignments')
+        return stream_listing('section.html', assigns, title='Assignments')
 
     @app.route('/pages')
     def pages():
-        pages = export.get_pages_by_folder('wiki_content')
-        return render_template('section.html', title='Pages', items=pages)
+        return stream_listing('section.html', export.iter_pages_by_folder('wiki_content'), title='Pages')
 
     @app.route('/home')
     def home():
@@ -327,116 +460,203 @@ def create_app(export_path):
 
     @app.route('/announcements')
     def announcements():
-        cats = export.categorize_resources()
+        cats = view('categorize_resources')
         items = cats.get('announcements', [])
-        return render_template('section.html', title='Announcements', items=items)
+        return stream_listing('section.html', items, title='Announcements')
 
     @app.route('/modules')
     def modules():
-        mods = export.get_modules()
+        # module bodies are loaded on demand from /modules/tree/<node>
+        mods = view('get_modules', False)
         return render_template('modules.html', title='Modules', modules=mods)
 
+    @app.route('/modules/tree/<int:node>')
+    def module_subtree(node):
+        """Return the direct children of one organization tree node as JSON (node 0 is the root)."""
+        if node < 0 or node >= len(export.org_tree):
+            abort(404)
+        return jsonify({
+            'node': node,
+            'generation': export.generation,
+            'title': export.org_tree.title[node],
+            'children': export.tree_children(node),
+        })
+
     @app.route('/canvas-data')
     def canvas_data():
-        # curated metadata page (Canvas Data)
-        meta = export.get_course_metadata()
-        # derived counts
-        pages = export.get_pages_by_folder('wiki_content')
-        files = export.get_files()
-        mods = export.get_modules()
-        cats = export.categorize_resources()
-        counts = {
-            'pages': len(pages),
-            'files': len(files),
-            'modules': len(mods),
-            'quizzes': len(cats.get('quizzes') or []),
-            'discussions': len(cats.get('discussions') or []),
-            'announcements': len(cats.get('announcements') or []),
-        }
-        # humanize some fields for display
-        def yesno(v):
-            return 'Yes' if v == 'true' or v is True else ('No' if v == 'false' or v is False else (v or '—'))
-
-        def human_size(bytes_str):
-            try:
-                b = int(bytes_str)
-            except Exception:
-                return bytes_str or '—'
-            for unit in ['B','KB','MB','GB','TB']:
-                if b < 1024:
-                    # show as integer for smaller units
-                    if unit == 'B':
-                        return f"{int(b)}{unit}"
-                    return f"{b:.0f}{unit}"
-                b = b/1024
-            return f"{b:.1f}PB"
-
-        def human_date(iso_str):
-            if not iso_str:
-                return '—'
-            s = iso_str
-            try:
-                # accommodate trailing Z (UTC)
-                if s.endswith('Z'):
-                    s = s.replace('Z', '+00:00')
-                dt = datetime.fromisoformat(s)
-                # include timezone name if present, otherwise omit
-                if dt.tzinfo:
-                    return dt.strftime("%b %d, %Y %H:%M %Z")
-                return dt.strftime("%b %d, %Y %H:%M")
-            except Exception:
-                # fallback to original string
-                return iso_str or '—'
-
-        # pretty-print tab configuration JSON if available
-        pretty_tab = '—'
-        raw_tab = meta.get('tab_configuration')
-        if raw_tab:
-            try:
-                obj = json.loads(raw_tab)
-                pretty_tab = json.dumps(obj, indent=2)
-            except Exception:
-                # already not-valid JSON: show as-is
-                pretty_tab = raw_tab
-
-        human = {
-            'title': meta.get('title') or (export.title or os.path.basename(export_path)),
-            'course_code': meta.get('course_code') or '—',
-            'start_at': human_date(meta.get('start_at')),
-            'conclude_at': human_date(meta.get('conclude_at')),
-            'is_public': yesno(meta.get('is_public')),
-            'public_syllabus': yesno(meta.get('public_syllabus')),
-            'storage_quota': human_size(meta.get('storage_quota')),
-            'grading_standard_id': meta.get('grading_standard_id') or '—',
-            'tab_configuration': pretty_tab,
-        }
-        external_tools = export.detect_external_tools()
-        has_external_tools = bool(external_tools)
-        # allowed base domain(s) can be configured via CANVAS_BASE_DOMAIN (comma-separated).
-        # default matches any *.instructure.com host.
-        raw_base = os.environ.get('CANVAS_BASE_DOMAIN', 'https://*.instructure.com')
-        base_domains = [d.strip() for d in raw_base.split(',') if d.strip()]
-        # find external links not pointing to the configured base domains
-        external_links = export.find_external_links(allowed_domains=base_domains)
-        return render_template('canvas_data.html', title='Canvas Data', metadata=meta, counts=counts, human=human, external_tools=external_tools, has_external_tools=has_external_tools, external_links=external_links, base_domain=raw_base)
+        # curated metadata page (Canvas Data); the report is computed by a background job
+        # and the latest finished version is served immediately
+        job, latest = submit_canvas_data_job()
+        if not latest:
+            # first request for this export: give the job a moment before showing a placeholder
+            job.wait(app.config['CANVAS_DATA_WAIT'])
+            latest = jobs.latest(job.key)
+        report = latest.result if latest else empty_canvas_data_report(job.key[1])
+        refreshing = latest is None or latest.generation != export.generation
+        return render_template('canvas_data.html', title='Canvas Data', refreshing=refreshing, job=job, **report)
+
+    @app.route('/canvas-data/progress')
+    def canvas_data_progress():
+        job, latest = submit_canvas_data_job()
+        data = job.to_dict()
+        data['current_generation'] = export.generation
+        data['latest_generation'] = latest.generation if latest else None
+        return jsonify(data)
+
+    tracer = AllocationTracer()
+
+    def require_admin():
+        if not is_admin():
+            abort(403)
+
+    def memory_usage():
+        """Approximate sizes of the export's structures and of every cache (see canvas_viewer.memory)."""
+        caches = dict(app.extensions['canvas_caches'])
+        caches.update({
+            'search.docs': search_index.docs,
+            'search.postings': search_index.postings,
+            'jobs': jobs,
+            'templates': app.jinja_env.cache or {},
+        })
+        return memory_report(export, caches)
+    app.extensions['canvas_memory'] = memory_usage
+
+    @app.route('/_admin/memory')
+    def admin_memory():
+        require_admin()
+        return jsonify(memory_usage())
+
+    @app.route('/_admin/memory/tracemalloc', methods=['GET', 'POST'])
+    def admin_tracemalloc():
+        """POST action=start (frames=N) or action=stop; GET a snapshot diffed against the previous one."""
+        require_admin()
+        if request.method == 'POST':
+            action = request.values.get('action')
+            if action == 'start':
+                tracer.start(max(1, min(64, request.values.get('frames', 1, type=int))))
+            elif action == 'stop':
+                tracer.stop()
+            else:
+                abort(400)
+            return jsonify({'tracing': tracer.tracing})
+        group = request.args.get('group', 'line')
+        if group not in GROUPS:
+            abort(400)
+        if not tracer.tracing:
+            return jsonify({'tracing': False, 'error': 'POST action=start first'}), 409
+        limit = max(1, min(200, request.args.get('limit', 20, type=int)))
+        return jsonify(dict(tracer.snapshot(group, limit), tracing=True))
+
+    @app.route('/search')
+    def search():
+        q = (request.args.get('q') or '').strip()
+        # queries read the in-memory index; changed pages are picked up (and the index written out)
+        # in the background, or inline with JOB_WORKERS=0
+        if app.config['JOB_WORKERS']:
+            search_index.refresh_in_background(min_interval=app.config['SEARCH_REFRESH_INTERVAL'])
+        else:
+            search_index.refresh(min_interval=app.config['SEARCH_REFRESH_INTERVAL'])
+        try:
+            limit = max(1, min(100, int(request.args.get('limit', 20))))
+        except ValueError:
+            limit = 20
+        results = search_index.search(q, limit=limit) if q else []
+        if request.args.get('format') == 'json':
+            return jsonify({'query': q, 'results': [dict(r, snippet=str(r['snippet'])) for r in results]})
+        return render_template('search.html', title='Search', query=q, results=results)
 
     @app.route('/quizzes')
     def quizzes():
-        cats = export.categorize_resources()
+        cats = view('categorize_resources')
         items = cats.get('quizzes', [])
-        return render_template('section.html', title='Quizzes', items=items)
+        return stream_listing('section.html', items, title='Quizzes')
 
     @app.route('/discussions')
     def discussions():
-        cats = export.categorize_resources()
+        cats = view('categorize_resources')
         items = cats.get('discussions', [])
-        return render_template('section.html', title='Discussions', items=items)
+        return stream_listing('section.html', items, title='Discussions')
 
     @app.route('/people')
     def people():
-        cats = export.categorize_resources()
+        cats = view('categorize_resources')
         items = cats.get('people', [])
-        return render_template('section.html', title='People', items=items)
+        return stream_listing('section.html', items, title='People')
+
+    # warm-up (warm= or CANVAS_WARM): 'key' computes the derived views, the reference graph and the
+    # Canvas Data report, then renders the home page, the syllabus and every module item page on
+    # WARM_WORKERS threads; 'all' renders every page of the export too.  It runs in the background
+    # (inline with JOB_WORKERS=0) and /ready answers 503 until it is finished
+    warm = warm or os.environ.get('CANVAS_WARM') or None
+    if warm is not None and warm not in WARM_MODES:
+        raise ValueError(f"unknown warm-up mode {warm!r}; expected one of {', '.join(WARM_MODES)}")
+    app.config['WARM'] = warm
+    app.config.setdefault('WARM_WORKERS', min(8, os.cpu_count() or 1))
+
+    def warm_targets(mode):
+        """The URLs a warm-up requests, most visited first."""
+        urls = ['/', '/home', '/syllabus', '/modules']
+        hrefs = [it['href'] for m in view('get_modules') for it in m['items'] if it['href']]
+        if mode == 'all':
+            hrefs += [p['href'] for p in view('list_pages')]
+        seen = set()
+        for href in hrefs:
+            if href.lower().endswith('.html') and href not in seen:
+                seen.add(href)
+                urls.append('/page/' + quote(href))
+        return urls
+
+    def warm_up(job):
+        started = time.perf_counter()
+        steps = [
+            ('navigation', lambda: (nav_fragment(), sidebar_fragment())),
+            ('course metadata', lambda: view('get_course_metadata')),
+            ('external tools', lambda: view('detect_external_tools')),
+            ('pages', lambda: view('list_pages')),
+            ('assignments', lambda: view('get_assignments')),
+            ('reference graph', reference_graph),
+            ('canvas data', lambda: submit_canvas_data_job()[0].wait()),
+        ]
+        urls = warm_targets(app.config['WARM'])
+        total = len(steps) + len(urls)
+        with app.app_context():
+            for done, (message, compute) in enumerate(steps):
+                job.set_progress(done / total, message)
+                compute()
+
+        def fetch(url):
+            resp = app.test_client().get(url)
+            resp.close()
+            return resp.status_code
+
+        failed = []
+        job.set_progress(len(steps) / total, f'rendering {len(urls)} pages')
+        with ThreadPoolExecutor(max_workers=app.config['WARM_WORKERS'], thread_name_prefix='canvas-warm') as pool:
+            for done, (url, status) in enumerate(zip(urls, pool.map(fetch, urls)), len(steps) + 1):
+                if status >= 500:
+                    failed.append(url)
+                job.set_progress(done / total)
+        seconds = time.perf_counter() - started
+        print(f"Warm-up ({app.config['WARM']}): {len(urls)} pages in {seconds:.1f}s" +
+              (f", {len(failed)} failed" if failed else ''))
+        return {'pages': len(urls), 'failed': failed, 'seconds': round(seconds, 3)}
+
+    # its own runner, so the warm-up can wait for the Canvas Data job however few JOB_WORKERS there are
+    warm_jobs = JobRunner(max_workers=1 if app.config['JOB_WORKERS'] else 0)
+
+    @app.route('/ready')
+    def ready():
+        """Readiness for a load balancer: 200 once the warm-up (if any) has finished, 503 while it runs or if it failed."""
+        job = app.extensions['canvas_warmup']
+        if job is None:
+            return jsonify({'ready': True, 'warm': None})
+        ready = job.status == 'done'
+        data = {'ready': ready, 'warm': app.config['WARM'], 'job': job.to_dict(), 'result': job.result}
+        if job.status == 'failed':
+            data['error'] = job.error
+        return jsonify(data), 200 if ready else 503
+
+    app.extensions['canvas_warmup'] = warm_jobs.submit('warm-up', export.generation, warm_up) if warm else None
 
     def rewrite_link_target(path):
         # helper to route href/src to either /page or /static depending on file type
@@ -0,0 +1,113 @@
+"""Read course packages (.imscc/.zip) in place, without extracting them.
+
+ZipFile objects share one file position, so ArchiveReader gives every thread
+its own handle: members can then be decompressed on a thread pool (zlib
+releases the GIL) without serialising on a lock.
+"""
+import hashlib
+import os
+import posixpath
+import threading
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+from .copying import temp_name
+
+ARCHIVE_SUFFIXES = ('.imscc', '.zip')
+
+
+def is_archive(path):
+    return str(path).lower().endswith(ARCHIVE_SUFFIXES)
+
+
+def _safe_name(name):
+    """Normalise a member name to a relative posix path; None if it would escape the package."""
+    name = posixpath.normpath(name.replace('\\', '/'))
+    if name.startswith(('/', '../')) or name in ('.', '..'):
+        return None
+    return name
+
+
+class ArchiveReader:
+    def __init__(self, path):
+        self.path = str(path)
+        self._local = threading.local()
+        self._handles = []
+        self._lock = threading.Lock()
+        # member name -> ZipInfo, for regular files with a safe path only
+        self.members = {}
+        with zipfile.ZipFile(self.path) as z:
+            for info in z.infolist():
+                name = _safe_name(info.filename)
+                if name and not info.is_dir():
+                    self.members[name] = info
+
+    def _zipfile(self):
+        z = getattr(self._local, 'zipfile', None)
+        if z is None:
+            z = zipfile.ZipFile(self.path)
+            self._local.zipfile = z
+            with self._lock:
+                self._handles.append(z)
+        return z
+
+    def __contains__(self, name):
+        return name in self.members
+
+    def open(self, name):
+        return self._zipfile().open(self.members[name])
+
+    def read(self, name):
+        return self._zipfile().read(self.members[name])
+
+    def mtime(self, name):
+        """The member's timestamp (zip stores local time to the second) as seconds since the epoch."""
+        return time.mktime(self.members[name].date_time + (0, 0, -1))
+
+    def close(self):
+        with self._lock:
+            for z in self._handles:
+                z.close()
+            self._handles = []
+        self._local = threading.local()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def extract_members(archive, pairs, workers=None, chunk=1024 * 1024):
+    """Stream (member name, destination path) pairs out of archive on a thread pool.
+
+    Members are written under a temporary name and renamed over their
+    destination, like canvas_viewer.copying.copy_file, and get the member's
+    timestamp.  Returns the sha256 of each member in order.
+    """
+    def extract(pair):
+        name, dst = pair
+        os.makedirs(os.path.dirname(dst) or '.', exist_ok=True)
+        tmp = temp_name(dst)
+        h = hashlib.sha256()
+        try:
+            with archive.open(name) as fin, open(tmp, 'wb') as fout:
+                for block in iter(lambda: fin.read(chunk), b''):
+                    h.update(block)
+                    fout.write(block)
+            mtime = archive.mtime(name)
+            os.utime(tmp, (mtime, mtime))
+            os.replace(tmp, dst)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+            raise
+        return h.hexdigest()
+
+    pairs = list(pairs)
+    workers = workers or min(8, (os.cpu_count() or 1) * 2)
+    if workers <= 1 or len(pairs) <= 1:
+        return [extract(p) for p in pairs]
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(extract, pairs))
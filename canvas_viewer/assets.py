@@ -0,0 +1,93 @@
+"""Images lifted out of pages' data: URIs, stored by content hash.
+
+Pasted screenshots reach Canvas pages as <img src="data:image/png;base64,...">,
+which can make a page several MB of base64 that is parsed and serialized on
+every render and downloaded again on every view.  AssetStore decodes such a
+URI once, writes the image to <root>/<sha256><ext> and gives back that file
+name; the page then links to it, and since the name is the content hash the
+file never changes and can be cached by browsers for good.
+"""
+import base64
+import binascii
+import hashlib
+import os
+import re
+import threading
+
+# data URIs smaller than this stay inline: an extra request costs more than the bytes
+MIN_ASSET_BYTES = 2048
+MIME_EXTENSIONS = {
+    'image/png': '.png',
+    'image/jpeg': '.jpg',
+    'image/jpg': '.jpg',
+    'image/gif': '.gif',
+    'image/webp': '.webp',
+    'image/svg+xml': '.svg',
+    'image/bmp': '.bmp',
+    'image/avif': '.avif',
+}
+EXTENSION_MIMES = {ext: mime for mime, ext in reversed(list(MIME_EXTENSIONS.items()))}
+_DATA_URI = re.compile(r'data:(image/[\w.+-]+)((?:;[\w.+-]+=[^;,]*)*);base64,', re.I)
+_ASSET_NAME = re.compile(r'[0-9a-f]{64}\.[a-z]+')
+
+
+class AssetStore:
+    def __init__(self, root, min_bytes=MIN_ASSET_BYTES):
+        self.root = str(root)
+        self.min_bytes = min_bytes
+        self._lock = threading.Lock()
+        # data URIs lifted out of pages, and the page bytes that saved
+        self.extracted = 0
+        self.bytes_saved = 0
+        # set after the first failed write, so the warning is printed once
+        self._write_failed = False
+
+    def add_data_uri(self, uri):
+        """Store the image of a base64 data: URI; returns its asset name, or None to leave the URI inline."""
+        if len(uri) < self.min_bytes:
+            return None
+        m = _DATA_URI.match(uri)
+        if not m:
+            return None
+        ext = MIME_EXTENSIONS.get(m.group(1).lower())
+        if ext is None:
+            return None
+        try:
+            data = base64.b64decode(''.join(uri[m.end():].split()), validate=True)
+        except (binascii.Error, ValueError):
+            return None
+        name = hashlib.sha256(data).hexdigest() + ext
+        path = os.path.join(self.root, name)
+        if not os.path.exists(path):
+            tmp = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+            try:
+                os.makedirs(self.root, exist_ok=True)
+                with open(tmp, 'wb') as fh:
+                    fh.write(data)
+                # same name, same bytes: whichever writer renames last, the content is the one expected
+                os.replace(tmp, path)
+            except OSError as e:
+                # a read-only or broken cache dir only costs the saving: the page keeps its data: URI
+                if not self._write_failed:
+                    self._write_failed = True
+                    print(f"Warning: cannot store assets in {self.root} ({e}); leaving data: URIs inline")
+                try:
+                    os.unlink(tmp)
+                except OSError:
+                    pass
+                return None
+        with self._lock:
+            self.extracted += 1
+            self.bytes_saved += len(uri)
+        return name
+
+    def path(self, name):
+        """The file of an asset name, or None if name is not one this store hands out (or is missing)."""
+        if not _ASSET_NAME.fullmatch(name):
+            return None
+        path = os.path.join(self.root, name)
+        return path if os.path.isfile(path) else None
+
+    @staticmethod
+    def mimetype(name):
+        return EXTENSION_MIMES.get(os.path.splitext(name)[1])
@@ -0,0 +1,181 @@
+"""Caches for data derived from an export.
+
+Entries are keyed by the export generation (see CanvasExport.generation): when
+the export is re-parsed, lookups for the new generation miss and entries from
+older generations are dropped.
+
+Misses are single-flight: while one thread computes an entry, other threads
+asking for the same key wait for its result instead of computing it again.
+A cache created with stale=True serves the previous generation's entry
+during that computation (stale-while-revalidate), which then runs in the
+background.
+
+An entry can also carry a version (a file's mtime and size, say): asking
+for another version of the key is a miss, and its result replaces the old
+entry.  A cache created with max_bytes keeps at most that many bytes (as
+measured by sizeof) and drops the least recently used entries beyond it.
+"""
+import threading
+from collections import OrderedDict
+
+from .tracing import span
+
+
+class CacheTimeout(TimeoutError):
+    """Waiting for another thread to compute a cache entry took longer than the timeout."""
+
+
+class _Flight:
+    """One computation of an entry, which the threads missing on the same key wait for."""
+
+    __slots__ = ('generation', 'version', 'done', 'value', 'error')
+
+    def __init__(self, generation, version=None):
+        self.generation = generation
+        self.version = version
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+    def result(self):
+        if self.error is not None:
+            raise self.error
+        return self.value
+
+
+class GenerationCache:
+    def __init__(self, name, stale=False, timeout=None, max_bytes=None, sizeof=len):
+        self.name = name
+        self._entries = OrderedDict()  # key -> (generation, version, value, size), least recently used first
+        self._flights = {}  # key -> _Flight being computed
+        self._lock = threading.Lock()
+        # serve the previous generation's entry while the current one is computed in the background
+        self.stale = stale
+        # seconds a miss waits for another thread's computation before raising CacheTimeout (None: no limit)
+        self.timeout = timeout
+        self.hits = 0
+        self.misses = 0
+        # misses that waited for another thread's computation, and misses answered with a stale entry
+        self.coalesced = 0
+        self.stale_hits = 0
+        # total sizeof() of the entries kept; None: no limit
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self.bytes = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _fresh(entry, generation, version):
+        return entry is not None and entry[0] == generation and entry[1] == version
+
+    def get_or_compute(self, key, generation, compute, stale=None, timeout=None, version=None):
+        """Return the entry for key at generation (and version), calling compute() on a miss.
+
+        compute runs at most once at a time per key: concurrent misses wait
+        for it (up to timeout seconds) and get its value, or its exception.
+        With stale (default: the cache's), a miss that finds the entry of an
+        older generation returns that at once and recomputes in a background
+        thread, so compute must not depend on the calling thread's state.
+        An entry of another version is not served at all; the result of
+        compute replaces it.  compute must not ask this cache for the key it
+        is computing.
+        """
+        entry = self._entries.get(key)
+        # a bounded cache takes the lock on hits too, to keep its least recently used order
+        if self.max_bytes is None and self._fresh(entry, generation, version):
+            self.hits += 1
+            return entry[2]
+        stale = self.stale if stale is None else stale
+        timeout = self.timeout if timeout is None else timeout
+        with self._lock:
+            entry = self._entries.get(key)
+            if self._fresh(entry, generation, version):
+                self.hits += 1
+                if self.max_bytes is not None:
+                    self._entries.move_to_end(key)
+                return entry[2]
+            flight = self._flights.get(key)
+            # a computation for an older generation (or another version) cannot answer this miss; a newer one can
+            leader = (flight is None or flight.generation < generation
+                      or (flight.generation == generation and flight.version != version))
+            if leader:
+                flight = self._flights[key] = _Flight(generation, version)
+            if stale and entry is not None and entry[0] < generation:
+                self.stale_hits += 1
+                if leader:
+                    threading.Thread(target=self._revalidate, args=(key, flight, compute), daemon=True,
+                                     name=f'{self.name}-revalidate').start()
+                return entry[2]
+            if leader:
+                self.misses += 1
+            else:
+                self.coalesced += 1
+        if leader:
+            self._compute(key, flight, compute)
+        else:
+            with span('cache.wait', cache=self.name):
+                finished = flight.done.wait(timeout)
+            if not finished:
+                raise CacheTimeout(f'{self.name}: gave up waiting {timeout}s for {key!r} to be computed')
+        return flight.result()
+
+    def _compute(self, key, flight, compute):
+        try:
+            flight.value = compute()
+        except BaseException as e:
+            # handed to every waiting thread; the next miss computes again
+            flight.error = e
+        with self._lock:
+            if flight.error is None:
+                current = self._entries.get(key)
+                # never overwrite an entry computed for a newer generation
+                if current is None or current[0] <= flight.generation:
+                    self._store(key, flight)
+                # a stale cache keeps the previous generation around to serve while revalidating
+                oldest = flight.generation - 1 if self.stale else flight.generation
+                stale = [k for k, entry in self._entries.items() if entry[0] < oldest]
+                for k in stale:
+                    self._drop(k)
+                self._evict()
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+        flight.done.set()
+
+    def _store(self, key, flight):
+        size = self.sizeof(flight.value) if self.max_bytes is not None else 0
+        if key in self._entries:
+            self._drop(key)
+        if self.max_bytes is not None and size > self.max_bytes:
+            # would push out everything else and then itself
+            return
+        self._entries[key] = (flight.generation, flight.version, flight.value, size)
+        self.bytes += size
+
+    def _drop(self, key):
+        self.bytes -= self._entries.pop(key)[3]
+
+    def _evict(self):
+        if self.max_bytes is None:
+            return
+        while self.bytes > self.max_bytes and self._entries:
+            self._drop(next(iter(self._entries)))
+            self.evictions += 1
+
+    def _revalidate(self, key, flight, compute):
+        self._compute(key, flight, compute)
+        if flight.error is not None:
+            # nobody waits for a background computation; the stale entry stays and the next miss retries
+            print(f"Warning: recomputing {self.name} entry {key!r} failed: {flight.error!r}")
+
+    def values(self):
+        """A snapshot of the cached values, for memory accounting."""
+        with self._lock:
+            return [entry[2] for entry in self._entries.values()]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    def __len__(self):
+        return len(self._entries)
@@ -0,0 +1,128 @@
+"""File copy strategies for static exports.
+
+- copy: a regular byte copy (shutil.copy2, which uses sendfile where available)
+- reflink: a copy-on-write clone (FICLONE) where the filesystem supports it,
+  else os.copy_file_range so the kernel moves the bytes, else a regular copy
+- hardlink: link the output to the source file, else fall back to reflink
+
+Destinations are never written through: every copy goes to a temporary
+name next to the destination and is renamed over it.  A destination that is
+a hard link to a source file is therefore never modified in place, and a
+reader (e.g. a web server on the output while --watch rebuilds it) sees the
+old file or the new one, never a partial copy.  Callers that rewrite an
+output (e.g. CSS injection) must likewise replace the file rather than
+truncate it.
+"""
+import os
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import fcntl
+except ImportError:  # not available on Windows
+    fcntl = None
+
+COPY_STRATEGIES = ('copy', 'reflink', 'hardlink')
+# ioctl request number for FICLONE on Linux (_IOW(0x94, 9, int))
+FICLONE = 0x40049409
+
+
+def _reflink(src, dst):
+    with open(src, 'rb') as fin, open(dst, 'wb') as fout:
+        if fcntl is not None:
+            try:
+                fcntl.ioctl(fout.fileno(), FICLONE, fin.fileno())
+                return 'reflink'
+            except OSError:
+                pass
+        if hasattr(os, 'copy_file_range'):
+            size = os.fstat(fin.fileno()).st_size
+            copied = 0
+            try:
+                while copied < size:
+                    n = os.copy_file_range(fin.fileno(), fout.fileno(), size - copied)
+                    if n == 0:
+                        break
+                    copied += n
+                if copied >= size:
+                    return 'copy_file_range'
+            except OSError:
+                pass
+            # start over with a plain copy
+            fin.seek(0)
+            fout.seek(0)
+            fout.truncate()
+        shutil.copyfileobj(fin, fout, 1024 * 1024)
+        return 'copy'
+
+
+def temp_name(dst):
+    """A temporary name next to dst, unique to this process and thread."""
+    return f'{dst}.{os.getpid()}.{threading.get_ident()}.tmp'
+
+
+def copy_file(src, dst, strategy='copy'):
+    """Copy src to dst using strategy, falling back as needed; returns the method actually used."""
+    if strategy not in COPY_STRATEGIES:
+        raise ValueError(f'unknown copy strategy: {strategy}')
+    os.makedirs(os.path.dirname(dst) or '.', exist_ok=True)
+    tmp = temp_name(dst)
+    try:
+        method = _copy_file(src, tmp, strategy)
+        os.replace(tmp, dst)
+    except BaseException:
+        if os.path.lexists(tmp):
+            os.unlink(tmp)
+        raise
+    return method
+
+
+def _copy_file(src, dst, strategy):
+    if os.path.lexists(dst):
+        os.unlink(dst)
+    if strategy == 'hardlink':
+        try:
+            os.link(src, dst)
+            return 'hardlink'
+        except OSError:
+            # cross-device, unsupported filesystem or link limit reached
+            strategy = 'reflink'
+    if strategy == 'reflink':
+        try:
+            method = _reflink(src, dst)
+            shutil.copystat(src, dst)
+            return method
+        except OSError:
+            if os.path.lexists(dst):
+                os.unlink(dst)
+    shutil.copy2(src, dst)
+    return 'copy'
+
+
+def copy_files(pairs, strategy='copy', workers=None):
+    """Copy (src, dst) pairs on a thread pool; returns {method: count}."""
+    pairs = list(pairs)
+    counts = {}
+    if not pairs:
+        return counts
+    workers = workers or min(8, (os.cpu_count() or 1) * 2)
+    if workers <= 1 or len(pairs) == 1:
+        methods = [copy_file(src, dst, strategy) for src, dst in pairs]
+    else:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            methods = list(pool.map(lambda p: copy_file(p[0], p[1], strategy), pairs))
+    for m in methods:
+        counts[m] = counts.get(m, 0) + 1
+    return counts
+
+
+def copy_tree(src_dir, dst_dir, strategy='copy', workers=None):
+    """Copy a directory tree file by file with the given strategy; returns {method: count}."""
+    pairs = []
+    for root, dirs, files in os.walk(src_dir):
+        rel = os.path.relpath(root, src_dir)
+        os.makedirs(os.path.join(dst_dir, rel), exist_ok=True)
+        for name in files:
+            pairs.append((os.path.join(root, name), os.path.join(dst_dir, rel, name)))
+    return copy_files(pairs, strategy=strategy, workers=workers)
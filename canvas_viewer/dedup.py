@@ -0,0 +1,112 @@
+"""Content-addressed store for static exports.
+
+Every unique file is written once, to <store>/<sha[:2]>/<sha><ext>, and each
+course output that has those bytes becomes a hard link or a relative symlink
+to it.  Blobs are only ever created (tmp file, then linked into place; the
+first writer wins), never modified, so concurrent course builds can share a
+store safely.
+"""
+import hashlib
+import os
+import shutil
+import threading
+
+from .copying import copy_file
+
+DEDUP_MODES = ('hardlink', 'symlink')
+
+
+class ContentStore:
+    def __init__(self, root, mode='hardlink'):
+        if mode not in DEDUP_MODES:
+            raise ValueError(f'unknown dedup mode: {mode}')
+        self.root = str(root)
+        self.mode = mode
+
+    def blob_path(self, sha, ext=''):
+        return os.path.join(self.root, sha[:2], sha + ext.lower())
+
+    def _tmp_path(self, blob):
+        return f'{blob}.{os.getpid()}.{threading.get_ident()}.tmp'
+
+    @staticmethod
+    def _publish(tmp, blob):
+        # a rename would replace a blob another build stored in the meantime, and the links already
+        # made to it would no longer share its inode; linking fails instead, and that blob is kept
+        try:
+            os.link(tmp, blob)
+        except FileExistsError:
+            pass
+        except OSError:
+            # no hard links on this filesystem
+            os.replace(tmp, blob)
+            return
+        os.unlink(tmp)
+
+    def add_file(self, src, sha, ext='', strategy='copy'):
+        """Store src, whose sha256 is sha, unless the blob already exists; returns the blob path."""
+        blob = self.blob_path(sha, ext)
+        if not os.path.exists(blob):
+            tmp = self._tmp_path(blob)
+            copy_file(src, tmp, strategy)
+            self._publish(tmp, blob)
+        return blob
+
+    def add_stream(self, fin, ext='', chunk=1024 * 1024):
+        """Store the bytes read from fin, hashing them on the way; returns (sha, blob path)."""
+        os.makedirs(self.root, exist_ok=True)
+        tmp = self._tmp_path(os.path.join(self.root, 'stream'))
+        h = hashlib.sha256()
+        with open(tmp, 'wb') as fout:
+            for block in iter(lambda: fin.read(chunk), b''):
+                h.update(block)
+                fout.write(block)
+        sha = h.hexdigest()
+        blob = self.blob_path(sha, ext)
+        if os.path.exists(blob):
+            os.unlink(tmp)
+        else:
+            os.makedirs(os.path.dirname(blob), exist_ok=True)
+            self._publish(tmp, blob)
+        return sha, blob
+
+    def link(self, blob, dst):
+        """Point dst at blob; returns the method used ('hardlink', 'symlink' or 'copy')."""
+        os.makedirs(os.path.dirname(dst) or '.', exist_ok=True)
+        # linked under a temporary name and renamed over dst, so dst is replaced in one step
+        tmp = self._tmp_path(dst)
+        if self.mode == 'symlink':
+            os.symlink(os.path.relpath(blob, os.path.dirname(dst) or '.'), tmp)
+            method = 'symlink'
+        else:
+            try:
+                os.link(blob, tmp)
+                method = 'hardlink'
+            except OSError:
+                # link limit reached or links unsupported: fall back to a private copy
+                shutil.copy2(blob, tmp)
+                method = 'copy'
+        os.replace(tmp, dst)
+        return method
+
+    def usage(self):
+        """Return (blob count, bytes stored)."""
+        count = size = 0
+        for root, dirs, files in os.walk(self.root):
+            for name in files:
+                count += 1
+                size += os.path.getsize(os.path.join(root, name))
+        return count, size
+
+    def prune(self, keep):
+        """Delete blobs whose hash is not in keep (plus stray tmp files); returns (files, bytes) removed."""
+        removed = freed = 0
+        for root, dirs, files in os.walk(self.root):
+            for name in files:
+                if name.split('.', 1)[0] in keep and not name.endswith('.tmp'):
+                    continue
+                path = os.path.join(root, name)
+                freed += os.path.getsize(path)
+                os.unlink(path)
+                removed += 1
+        return removed, freed
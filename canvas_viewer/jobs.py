@@ -0,0 +1,131 @@
+"""A small in-process background job runner.
+
+Expensive reports are computed on a thread pool off the request path.  Each job
+is identified by a key and the export generation it was computed for, so views
+can serve the latest finished result immediately while a newer generation is
+still being computed.  No external broker is involved; with max_workers=0 jobs
+run inline, which keeps tests deterministic.
+"""
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+# finished (done or failed) generations kept per key; older ones are dropped, except the newest done result
+KEEP_GENERATIONS = 2
+
+
+class Job:
+    def __init__(self, key, generation):
+        self.key = key
+        self.generation = generation
+        self.status = 'queued'  # queued -> running -> done | failed
+        self.progress = 0.0
+        self.message = None
+        self.result = None
+        self.error = None
+        self.submitted = time.time()
+        self.started = None
+        self.finished = None
+        self._done = threading.Event()
+
+    @property
+    def done(self):
+        return self.status in ('done', 'failed')
+
+    def set_progress(self, fraction, message=None):
+        self.progress = max(0.0, min(1.0, float(fraction)))
+        if message is not None:
+            self.message = message
+
+    def wait(self, timeout=None):
+        return self._done.wait(timeout)
+
+    def to_dict(self):
+        return {
+            'key': self.key if isinstance(self.key, str) else list(self.key),
+            'generation': self.generation,
+            'status': self.status,
+            'progress': round(self.progress, 3),
+            'message': self.message,
+            'error': self.error,
+            'submitted': self.submitted,
+            'started': self.started,
+            'finished': self.finished,
+        }
+
+
+class JobRunner:
+    def __init__(self, max_workers=2):
+        self.max_workers = max_workers
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='canvas-job') if max_workers else None
+        self._jobs = {}  # key -> {generation: Job}
+        self._lock = threading.Lock()
+
+    def submit(self, key, generation, fn):
+        """Schedule fn(job) for (key, generation) unless it is already queued, running or done.
+
+        fn receives the Job and may call job.set_progress(); its return value
+        becomes job.result.  A failed job is retried on the next submit.
+        """
+        with self._lock:
+            versions = self._jobs.setdefault(key, {})
+            job = versions.get(generation)
+            if job is not None and job.status != 'failed':
+                return job
+            job = Job(key, generation)
+            versions[generation] = job
+        if self._pool is None:
+            self._run(job, fn)
+        else:
+            self._pool.submit(self._run, job, fn)
+        return job
+
+    def _run(self, job, fn):
+        job.status = 'running'
+        job.started = time.time()
+        try:
+            job.result = fn(job)
+            job.progress = 1.0
+            job.status = 'done'
+        except Exception as e:
+            job.error = f'{type(e).__name__}: {e}'
+            job.status = 'failed'
+            traceback.print_exc()
+        finally:
+            job.finished = time.time()
+            job._done.set()
+            self._prune(job.key)
+
+    def _prune(self, key):
+        """Keep the last KEEP_GENERATIONS finished generations of key, and the newest done one.
+
+        A failed job older than the newest done one is dropped too: latest()
+        already has a newer result and nobody resubmits that generation.
+        """
+        with self._lock:
+            versions = self._jobs.get(key) or {}
+            done = [g for g, j in versions.items() if j.status == 'done']
+            newest_done = max(done) if done else None
+            finished = sorted(g for g, j in versions.items() if j.done)
+            for g in finished[:-KEEP_GENERATIONS]:
+                if g != newest_done:
+                    del versions[g]
+            for g, j in list(versions.items()):
+                if j.status == 'failed' and newest_done is not None and g < newest_done:
+                    del versions[g]
+
+    def get(self, key, generation):
+        with self._lock:
+            return (self._jobs.get(key) or {}).get(generation)
+
+    def latest(self, key):
+        """Return the finished job with the highest generation for key, or None."""
+        with self._lock:
+            versions = self._jobs.get(key) or {}
+            done = [j for j in versions.values() if j.status == 'done']
+        return max(done, key=lambda j: j.generation) if done else None
+
+    def shutdown(self, wait=True):
+        if self._pool is not None:
+            self._pool.shutdown(wait=wait)
@@ -0,0 +1,199 @@
+"""Memory accounting for the viewer and the exporter.
+
+deep_sizeof() gives the approximate size of a structure (the object and
+everything it references, each object counted once); memory_report() applies
+it to every attribute of a CanvasExport and to every cache.  Sizes are
+estimates: sys.getsizeof() only sees Python objects, so lxml trees are
+counted per element at LXML_NODE_BYTES, and shared objects are charged to
+whichever structure reaches them first.
+
+AllocationTracer takes tracemalloc snapshots on demand and diffs each
+against the previous one, grouped by file (module) or by line, to pin down
+what keeps allocating between two points in time.
+"""
+import concurrent.futures
+import io
+import os
+import sys
+import threading
+import tracemalloc
+import types
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from .cache import GenerationCache
+
+# rough cost of one lxml element (libxml2 node, attributes and text, Python proxy)
+LXML_NODE_BYTES = 256
+# objects that are not data: neither counted nor descended into
+_OPAQUE = (type, types.ModuleType, types.FunctionType, types.BuiltinFunctionType, types.MethodType,
+           types.CodeType, types.FrameType, type(threading.Lock()), type(threading.RLock()), threading.Condition,
+           threading.Event, threading.Thread, io.IOBase, concurrent.futures.Executor)
+# tracemalloc frames that only describe the tracing or importing itself
+_TRACE_FILTERS = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>'),
+    tracemalloc.Filter(False, '<unknown>'),
+)
+GROUPS = {'module': 'filename', 'filename': 'filename', 'line': 'lineno', 'lineno': 'lineno'}
+
+
+def _opaque(obj):
+    if isinstance(obj, _OPAQUE):
+        return True
+    # the Flask app and Jinja environment reach everything else; they are not a cache
+    module = type(obj).__module__ or ''
+    return module.startswith(('flask.', 'jinja2.environment', 'werkzeug.'))
+
+
+def _lxml_nodes(obj):
+    """Element count of an lxml element or tree, or None if obj is not one."""
+    if not type(obj).__module__.startswith('lxml.'):
+        return None
+    root = obj.getroot() if hasattr(obj, 'getroot') else obj
+    try:
+        return sum(1 for _ in root.iter())
+    except (AttributeError, TypeError):
+        return 0
+
+
+def deep_sizeof(obj, seen=None):
+    """Approximate bytes used by obj and everything it references (not already in seen)."""
+    seen = set() if seen is None else seen
+    total = 0
+    stack = [obj]
+    while stack:
+        o = stack.pop()
+        if id(o) in seen or _opaque(o):
+            continue
+        seen.add(id(o))
+        nodes = _lxml_nodes(o)
+        if nodes is not None:
+            total += nodes * LXML_NODE_BYTES
+            continue
+        total += sys.getsizeof(o)
+        if isinstance(o, (str, bytes, bytearray, int, float, bool, type(None))):
+            continue
+        if isinstance(o, dict):
+            stack.extend(o.keys())
+            stack.extend(o.values())
+        elif isinstance(o, (list, tuple, set, frozenset)):
+            stack.extend(o)
+        else:
+            if hasattr(o, '__dict__'):
+                stack.append(vars(o))
+            for cls in type(o).__mro__:
+                for slot in getattr(cls, '__slots__', ()):
+                    if hasattr(o, slot):
+                        stack.append(getattr(o, slot))
+    return total
+
+
+def export_sizes(export):
+    """{attribute: approximate bytes} for every data attribute of a CanvasExport, largest first."""
+    seen = set()
+    attrs = dict(vars(export))
+    # the parsed data lives in the export's current ExportState; report it per attribute
+    state = attrs.pop('_state', None)
+    if state is not None:
+        attrs.update((name, getattr(state, name)) for name in type(state).__slots__)
+    sizes = {name: deep_sizeof(value, seen) for name, value in attrs.items()}
+    return dict(sorted(((k, v) for k, v in sizes.items() if v), key=lambda kv: -kv[1]))
+
+
+def cache_sizes(caches):
+    """{name: {entries, bytes[, hits, misses, coalesced, stale_hits, evictions]}} for GenerationCaches and any other cache-like object."""
+    out = {}
+    for name, cache in caches.items():
+        if isinstance(cache, GenerationCache):
+            out[name] = {'entries': len(cache), 'bytes': deep_sizeof(cache.values()),
+                         'hits': cache.hits, 'misses': cache.misses, 'coalesced': cache.coalesced,
+                         'stale_hits': cache.stale_hits, 'evictions': cache.evictions}
+        else:
+            out[name] = {'entries': len(cache) if hasattr(cache, '__len__') else None, 'bytes': deep_sizeof(cache)}
+    return out
+
+
+def process_memory():
+    """Current and peak resident set size in bytes (None where the platform does not tell)."""
+    rss = None
+    try:
+        with open('/proc/self/statm') as fh:
+            rss = int(fh.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        pass
+    peak = None
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is in kilobytes on Linux, bytes on macOS
+        peak = peak if sys.platform == 'darwin' else peak * 1024
+    return {'rss_bytes': rss, 'peak_rss_bytes': peak}
+
+
+def memory_report(export, caches):
+    """Process RSS, the export's structures and the caches, in bytes."""
+    sizes = export_sizes(export)
+    cached = cache_sizes(caches)
+    return {
+        'process': process_memory(),
+        'export': {'generation': export.generation, 'bytes': sum(sizes.values()), 'structures': sizes},
+        'caches': cached,
+        'caches_bytes': sum(c['bytes'] for c in cached.values()),
+        'tracemalloc': tracemalloc.is_tracing(),
+    }
+
+
+class AllocationTracer:
+    """tracemalloc snapshots on demand, each compared with the one before."""
+
+    def __init__(self):
+        self._previous = None
+        self._lock = threading.Lock()
+
+    @property
+    def tracing(self):
+        return tracemalloc.is_tracing()
+
+    def start(self, frames=1):
+        """Start tracing (frames of traceback per allocation); the next snapshot is the baseline."""
+        with self._lock:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(frames)
+            self._previous = None
+
+    def stop(self):
+        with self._lock:
+            tracemalloc.stop()
+            self._previous = None
+
+    def snapshot(self, group='line', limit=20):
+        """Top allocations now and, after the first snapshot, what changed since the previous one.
+
+        group is 'module' (per file) or 'line'.  Returns {'traced_bytes',
+        'peak_bytes', 'top': [...], 'diff': [...] or None}; entries are
+        {'where', 'bytes', 'count'} plus 'bytes_diff' and 'count_diff' in diff.
+        """
+        key_type = GROUPS[group]
+        with self._lock:
+            if not tracemalloc.is_tracing():
+                raise RuntimeError('tracemalloc is not tracing; start() it first')
+            snap = tracemalloc.take_snapshot().filter_traces(_TRACE_FILTERS)
+            current, peak = tracemalloc.get_traced_memory()
+            previous, self._previous = self._previous, snap
+        top = [self._entry(stat, key_type) for stat in snap.statistics(key_type)[:limit]]
+        diff = None
+        if previous is not None:
+            stats = [s for s in snap.compare_to(previous, key_type) if s.size_diff or s.count_diff]
+            diff = [dict(self._entry(s, key_type), bytes_diff=s.size_diff, count_diff=s.count_diff)
+                    for s in stats[:limit]]
+        return {'traced_bytes': current, 'peak_bytes': peak, 'top': top, 'diff': diff}
+
+    @staticmethod
+    def _entry(stat, key_type):
+        frame = stat.traceback[0]
+        where = frame.filename if key_type == 'filename' else f'{frame.filename}:{frame.lineno}'
+        return {'where': where, 'bytes': stat.size, 'count': stat.count}
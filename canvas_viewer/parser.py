@@ -1,30 +1,222 @@
 import os
+import threading
+from collections import deque
+import time
 from lxml import etree
 
+from .archive import ArchiveReader, is_archive
+from .tracing import traced
+
 NS = {
     'ims': 'http://www.imsglobal.org/xsd/imsccv1p1/imscp_v1p1',
     'lom': 'http://ltsc.ieee.org/xsd/imsccv1p1/LOM/resource',
 }
 
 
-class CanvasExport:
-    def __init__(self, path):
-        self.path = path
-        self.manifest_path = os.path.join(path, 'imsmanifest.xml')
+IMS_ITEM = '{http://www.imsglobal.org/xsd/imsccv1p1/imscp_v1p1}item'
+IMS_TITLE = '{http://www.imsglobal.org/xsd/imsccv1p1/imscp_v1p1}title'
+
+
+class OrganizationTree:
+    """The manifest's organization items flattened into parallel arrays.
+
+    Node 0 is the <organization> element itself.  Nodes are numbered
+    breadth-first, so the children of node i occupy the contiguous index range
+    first_child[i] .. first_child[i] + child_count[i].  The tree is built and
+    walked iteratively, so deeply nested manifests cannot hit the recursion limit.
+    """
+
+    def __init__(self):
+        self.title = [None]
+        self.identifierref = [None]
+        self.parent = [-1]
+        self.first_child = [1]
+        self.child_count = [0]
+
+    @classmethod
+    def from_element(cls, org_el):
+        tree = cls()
+        pending = deque([(org_el, 0)])
+        while pending:
+            el, idx = pending.popleft()
+            items = el.findall(IMS_ITEM)
+            tree.first_child[idx] = len(tree.title)
+            tree.child_count[idx] = len(items)
+            for item in items:
+                title_el = item.find(IMS_TITLE)
+                tree.title.append(title_el.text if title_el is not None else None)
+                tree.identifierref.append(item.get('identifierref'))
+                tree.parent.append(idx)
+                tree.first_child.append(0)
+                tree.child_count.append(0)
+                pending.append((item, len(tree.title) - 1))
+        return tree
+
+    def __len__(self):
+        return len(self.title)
+
+    def children(self, idx):
+        start = self.first_child[idx]
+        return range(start, start + self.child_count[idx])
+
+    def to_nested(self):
+        """Return the legacy nested form: [{'title', 'identifierref', 'children': [...]}, ...]."""
+        nodes = [{'title': t, 'identifierref': r, 'children': []} for t, r in zip(self.title, self.identifierref)]
+        # breadth-first numbering means appending in index order keeps siblings in document order
+        for idx in range(1, len(nodes)):
+            nodes[self.parent[idx]]['children'].append(nodes[idx])
+        return nodes[0]['children']
+
+
+class ExportState:
+    """Everything parsed from one version of an export.
+
+    CanvasExport publishes a state in a single assignment and never modifies
+    it afterwards (apart from filling in organizations on first use), so code that reads several attributes from one state (say
+    resources and href_order) sees a single generation of the export even
+    while a reload swaps in the next one.
+    """
+
+    __slots__ = ('generation', 'archive', 'title', 'resources', 'org_tree', 'href_order', 'file_meta',
+                 'course_settings', 'organizations')
+
+    def __init__(self, generation=1, archive=None):
+        # generation is bumped whenever the export is re-parsed after a change on disk;
+        # caches of derived data key their entries by it
+        self.generation = generation
+        self.archive = archive
         self.title = None
         self.resources = {}  # identifier -> {href, files: []}
-        self.organizations = []
+        self.org_tree = OrganizationTree()
+        # resource identifiers sorted by href; listings iterate this instead of re-sorting
+        self.href_order = []
         # parsed metadata about files (course_settings/files_meta.xml)
         self.file_meta = {}
+        self.course_settings = None
+        # nested organization items, built on first use from org_tree
+        self.organizations = None
 
-        if not os.path.exists(self.manifest_path):
-            raise FileNotFoundError(f"imsmanifest.xml not found in {path}")
 
-        self._parse_manifest()
+def _state_attr(name):
+    return property(lambda self: getattr(self._state, name),
+                    doc=f'{name} of the current ExportState (read .state once to combine several)')
+
+
+class CanvasExport:
+    generation = _state_attr('generation')
+    archive = _state_attr('archive')
+    title = _state_attr('title')
+    resources = _state_attr('resources')
+    org_tree = _state_attr('org_tree')
+    href_order = _state_attr('href_order')
+    file_meta = _state_attr('file_meta')
+    course_settings = _state_attr('course_settings')
+
+    def __init__(self, path):
+        self.path = path
+        # a .imscc/.zip package is read in place; member paths are the same as in an extracted folder
+        archive = ArchiveReader(path) if is_archive(path) and os.path.isfile(path) else None
+        self.manifest_path = path if archive else os.path.join(path, 'imsmanifest.xml')
+        # nobody else sees this object yet: the state is filled in place before it is returned
+        self._state = ExportState(archive=archive)
 
-    def _parse_manifest(self):
-        parser = etree.XMLParser(remove_comments=True)
-        tree = etree.parse(self.manifest_path, parser)
+        if not self._exists('imsmanifest.xml'):
+            raise FileNotFoundError(f"imsmanifest.xml not found in {path}")
+
+        self._signature = self._stat_signature()
+        self._reload_lock = threading.Lock()
+        self._last_reload_check = time.monotonic()
+        self._parse_manifest(self._state)
+
+    @property
+    def state(self):
+        """The current ExportState; take it once to read several attributes of the same generation."""
+        return self._state
+
+    def _exists(self, rel):
+        if self.archive:
+            return rel in self.archive
+        return os.path.exists(os.path.join(self.path, rel))
+
+    def _open(self, rel):
+        """Open a file of the export (relative posix path) for reading bytes."""
+        if self.archive:
+            return self.archive.open(rel)
+        return open(os.path.join(self.path, rel), 'rb')
+
+    @traced('parser.read')
+    def read(self, rel):
+        """Return the bytes of a file of the export, given its relative posix path."""
+        with self._open(rel) as fh:
+            return fh.read()
+
+    def iter_paths(self, dirs=('wiki_content', 'web_resources', 'course_settings')):
+        """Yield the relative posix paths of the files under dirs, sorted per directory."""
+        if self.archive:
+            for name in sorted(self.archive.members):
+                if name.split('/', 1)[0] in dirs:
+                    yield name
+            return
+        for sub in dirs:
+            paths = []
+            for root, _, files in os.walk(os.path.join(self.path, sub)):
+                rel = os.path.relpath(root, self.path).replace(os.sep, '/')
+                paths.extend(f'{rel}/{name}' for name in files)
+            yield from sorted(paths)
+
+    def _getmtime(self, rel):
+        if self.archive:
+            return self.archive.mtime(rel)
+        return os.path.getmtime(os.path.join(self.path, rel))
+
+    def _stat_signature(self):
+        sig = []
+        # an archive is replaced as a whole, so its own stat covers every member
+        paths = (self.manifest_path,) if self.archive else (
+            self.manifest_path,
+            os.path.join(self.path, 'course_settings', 'course_settings.xml'),
+            os.path.join(self.path, 'course_settings', 'files_meta.xml'))
+        for p in paths:
+            try:
+                st = os.stat(p)
+                sig.append((st.st_mtime_ns, st.st_size))
+            except OSError:
+                sig.append(None)
+        return tuple(sig)
+
+    @traced('parser.reload_if_changed')
+    def reload_if_changed(self, min_interval=0.0):
+        """Re-parse the export if the manifest or course settings changed on disk.
+
+        The new state is parsed by a fresh object and published in a single
+        assignment, so readers never observe half-parsed resources, and a reader
+        holding the previous state (a streamed listing, say) keeps a consistent
+        view of it.  Returns True if a reload happened.
+        """
+        now = time.monotonic()
+        if now - self._last_reload_check < min_interval:
+            return False
+        with self._reload_lock:
+            self._last_reload_check = now
+            sig = self._stat_signature()
+            if sig == self._signature:
+                return False
+            state = CanvasExport(self.path)._state
+            old = self._state
+            state.generation = old.generation + 1
+            self._state = state
+            self._signature = sig
+            # the new state opened its own reader; a later read through the old one reopens a handle
+            if old.archive is not None:
+                old.archive.close()
+            return True
+
+    @traced('parser.parse_manifest')
+    def _parse_manifest(self, state):
+        # huge_tree lifts libxml2's 256-level depth limit; the org tree is walked iteratively
+        parser = etree.XMLParser(remove_comments=True, huge_tree=True)
+        with self._open('imsmanifest.xml') as fh:
+            tree = etree.parse(fh, parser)
         root = tree.getroot()
 
         # title
@@ -32,7 +224,7 @@ class CanvasExport:
         if title_el is not None:
             string_el = title_el.find('{http://ltsc.ieee.org/xsd/imsccv1p1/LOM/manifest}string')
             if string_el is not None and string_el.text:
-                self.title = string_el.text
+                state.title = string_el.text
 
         # resources
         for res in root.findall('.//{http://www.imsglobal.org/xsd/imsccv1p1/imscp_v1p1}resource'):
@@ -40,39 +232,41 @@ class CanvasExport:
             href = res.get('href')
             files = [f.get('href') for f in res.findall('{http://www.imsglobal.org/xsd/imsccv1p1/imscp_v1p1}file') if f.get('href')]
             rtype = res.get('type')
-            self.resources[ident] = {
+            state.resources[ident] = {
                 'identifier': ident,
                 'href': href,
                 'files': files,
                 'type': rtype,
             }
 
+        state.href_order = sorted((i for i, r in state.resources.items() if r.get('href')), key=lambda i: state.resources[i]['href'])
+
         # organizations -> walk items to get structure
         org = root.find('.//{http://www.imsglobal.org/xsd/imsccv1p1/imscp_v1p1}organization')
         if org is not None:
-            self.organizations = self._parse_items(org)
+            state.org_tree = OrganizationTree.from_element(org)
 
         # try loading course_settings xml into metadata
-        cs_path = os.path.join(self.path, 'course_settings', 'course_settings.xml')
-        if os.path.exists(cs_path):
+        if self._exists('course_settings/course_settings.xml'):
             try:
-                cstree = etree.parse(cs_path)
+                with self._open('course_settings/course_settings.xml') as fh:
+                    cstree = etree.parse(fh)
                 csroot = cstree.getroot()
                 # get course title, short name
                 title = csroot.find('.//course/name')
                 if title is not None and title.text:
-                    self.title = title.text
-                self.course_settings = etree.tostring(csroot, encoding='utf-8')
+                    state.title = title.text
+                state.course_settings = etree.tostring(csroot, encoding='utf-8')
             except Exception:
-                self.course_settings = None
+                state.course_settings = None
         else:
-            self.course_settings = None
+            state.course_settings = None
 
         # parse files metadata if present (course_settings/files_meta.xml)
-        fm_path = os.path.join(self.path, 'course_settings', 'files_meta.xml')
-        if os.path.exists(fm_path):
+        if self._exists('course_settings/files_meta.xml'):
             try:
-                fmtree = etree.parse(fm_path)
+                with self._open('course_settings/files_meta.xml') as fh:
+                    fmtree = etree.parse(fh)
                 fmroot = fmtree.getroot()
                 # files are under the Canvas namespace; match by exact tag
                 for f in fmroot.findall('.//{http://canvas.instructure.com/xsd/cccv1p0}file'):
@@ -85,10 +279,11 @@ class CanvasExport:
                     ua = f.find('{http://canvas.instructure.com/xsd/cccv1p0}unlock_at')
                     if ua is not None and ua.text:
                         unlock_at = ua.text
-                    self.file_meta[ident] = {'display_name': display, 'unlock_at': unlock_at}
+                    state.file_meta[ident] = {'display_name': display, 'unlock_at': unlock_at}
             except Exception:
-                self.file_meta = {}
+                state.file_meta = {}
 
+    @traced('parser.get_course_metadata')
     def get_course_metadata(self):
         """Return dict of course metadata parsed from course_settings/course_settings.xml if present.
 
@@ -96,11 +291,11 @@ class CanvasExport:
         image_href (if resolvable), is_public, license, storage_quota, grading_standard_id
         """
         meta = {}
-        cs_path = os.path.join(self.path, 'course_settings', 'course_settings.xml')
-        if not os.path.exists(cs_path):
+        if not self._exists('course_settings/course_settings.xml'):
             return meta
         try:
-            tree = etree.parse(cs_path)
+            with self._open('course_settings/course_settings.xml') as fh:
+                tree = etree.parse(fh)
             root = tree.getroot()
             ns = {'c': root.nsmap.get(None)} if None in root.nsmap else {}
             def get_text(tag):
@@ -212,6 +407,7 @@ class CanvasExport:
             except Exception:
                 self.file_meta = {}
 
+    @traced('parser.categorize_resources')
     def categorize_resources(self):
         """Return a dict of likely categories with lists of resource dicts.
         Heuristics: filenames and folder names.
@@ -235,16 +431,33 @@ class CanvasExport:
                 cats['people'].append(r)
         return cats
 
-    def _parse_items(self, parent):
-        items = []
-        for item in parent.findall('{http://www.imsglobal.org/xsd/imsccv1p1/imscp_v1p1}item'):
-            title_el = item.find('{http://www.imsglobal.org/xsd/imsccv1p1/imscp_v1p1}title')
-            title = title_el.text if title_el is not None else None
-            identifierref = item.get('identifierref')
-            children = self._parse_items(item)
-            items.append({'title': title, 'identifierref': identifierref, 'children': children})
-        return items
-
+    @property
+    def organizations(self):
+        """Nested organization items, built on first use from org_tree."""
+        state = self._state
+        if state.organizations is None:
+            state.organizations = state.org_tree.to_nested()
+        return state.organizations
+
+    @traced('parser.tree_children')
+    def tree_children(self, node=0):
+        """Return the direct children of an org_tree node as dicts for lazy tree rendering."""
+        state = self._state
+        tree = state.org_tree
+        out = []
+        for idx in tree.children(node):
+            ident = tree.identifierref[idx]
+            res = state.resources.get(ident) if ident else None
+            out.append({
+                'node': idx,
+                'title': tree.title[idx],
+                'href': res.get('href') if res else None,
+                'child_count': tree.child_count[idx],
+                'has_children': tree.child_count[idx] > 0,
+            })
+        return out
+
+    @traced('parser.list_pages')
     def list_pages(self):
         # pages in resources with webcontent or associatedcontent hrefs
         pages = []
@@ -254,6 +467,7 @@ class CanvasExport:
                 pages.append({'id': ident, 'href': href, 'title': os.path.basename(href)})
         return pages
 
+    @traced('parser.detect_external_tools')
     def detect_external_tools(self):
         """Return a list of likely external tools or plugins referenced in the export.
 
@@ -290,11 +504,11 @@ class CanvasExport:
                         found.add(name)
 
         # also scan course_settings for tab_configuration references
-        cs_path = os.path.join(self.path, 'course_settings', 'course_settings.xml')
-        if os.path.exists(cs_path):
+        if self._exists('course_settings/course_settings.xml'):
             try:
                 from lxml import etree
-                tree = etree.parse(cs_path)
+                with self._open('course_settings/course_settings.xml') as fh:
+                    tree = etree.parse(fh)
                 root = tree.getroot()
                 tc = root.find('.//tab_configuration')
                 if tc is not None and tc.text:
@@ -308,6 +522,7 @@ class CanvasExport:
 
         return sorted(found)
 
+    @traced('parser.find_external_links')
     def find_external_links(self, allowed_domains=None):
         """Scan resources and HTML pages for absolute links that point outside allowed_domains.
 
@@ -386,15 +601,16 @@ class CanvasExport:
         for ident, r in self.resources.items():
             href = r.get('href') or ''
             if href.lower().endswith('.html') or href.startswith('wiki_content') or href.startswith('course_settings'):
-                p = os.path.join(self.path, href)
-                if not os.path.exists(p):
-                    p = os.path.join(self.path, href.strip())
-                if not os.path.exists(p):
+                p = href
+                if not self._exists(p):
+                    p = href.strip()
+                if not self._exists(p):
                     continue
                 if lhtml is None:
                     # fallback: simple regex for http(s) links
                     try:
-                        text = open(p, 'r', encoding='utf-8', errors='ignore').read()
+                        with self._open(p) as fh:
+                            text = fh.read().decode('utf-8', errors='ignore')
                         for m in re.findall(r'https?://[^\s"\'>)]+', text):
                             if is_external(m) and m not in seen:
                                 seen.add(m)
@@ -403,7 +619,8 @@ class CanvasExport:
                         continue
                 else:
                     try:
-                        doc = lhtml.parse(p)
+                        with self._open(p) as fh:
+                            doc = lhtml.parse(fh)
                         # collect from tags
                         for el in doc.iter():
                             for attr in ('href', 'src'):
@@ -415,7 +632,8 @@ class CanvasExport:
                     except Exception:
                         # fallback regex
                         try:
-                            text = open(p, 'r', encoding='utf-8', errors='ignore').read()
+                            with self._open(p) as fh:
+                                text = fh.read().decode('utf-8', errors='ignore')
                             for m in re.findall(r'https?://[^\s"\'>)]+', text):
                                 if is_external(m) and m not in seen:
                                     seen.add(m)
@@ -424,10 +642,10 @@ class CanvasExport:
                             continue
 
         # also scan course_settings/tab_configuration raw text for URLs
-        cs_path = os.path.join(self.path, 'course_settings', 'course_settings.xml')
-        if os.path.exists(cs_path):
+        if self._exists('course_settings/course_settings.xml'):
             try:
-                text = open(cs_path, 'r', encoding='utf-8', errors='ignore').read()
+                with self._open('course_settings/course_settings.xml') as fh:
+                    text = fh.read().decode('utf-8', errors='ignore')
                 for m in re.findall(r'https?://[^\s"\'>)]+', text):
                     if is_external(m) and m not in seen:
                         seen.add(m)
@@ -437,55 +655,68 @@ class CanvasExport:
 
         return links
 
+    def iter_pages_by_folder(self, folder_prefix='wiki_content'):
+        """Yield page dicts under folder_prefix in href order without building a list."""
+        # one state for the whole iteration: the listing may still be streaming when a reload swaps it
+        state = self._state
+        for ident in state.href_order:
+            href = state.resources[ident].get('href')
+            if href.startswith(folder_prefix) and href.lower().endswith('.html'):
+                yield {'id': ident, 'href': href, 'title': os.path.basename(href)}
+
     def get_pages_by_folder(self, folder_prefix='wiki_content'):
-        pages = []
-        for ident, r in self.resources.items():
-            href = r.get('href')
-            if href and href.startswith(folder_prefix) and href.lower().endswith('.html'):
-                pages.append({'id': ident, 'href': href, 'title': os.path.basename(href)})
-        return sorted(pages, key=lambda p: p['href'])
+        return list(self.iter_pages_by_folder(folder_prefix))
 
-    def get_files(self):
-        files = []
-        for ident, r in self.resources.items():
-            href = r.get('href')
-            if href and href.startswith('web_resources'):
-                meta = self.file_meta.get(ident, {})
-                title = meta.get('display_name') or os.path.basename(href)
-                date = meta.get('unlock_at')
-                date_source = None
-                # fallback: if no date metadata, try filesystem mtime of resolved file
-                if date:
-                    date_source = 'meta'
-                if not date:
-                    p = os.path.join(self.path, href)
-                    if not os.path.exists(p):
-                        # sometimes hrefs may have stray leading/trailing whitespace
-                        p = os.path.join(self.path, href.strip())
-                    try:
-                        if os.path.exists(p):
-                            mtime = os.path.getmtime(p)
-                            # ISO-like fallback (date only)
-                            import datetime
+    def iter_files(self):
+        """Yield file dicts for web_resources in href order.
 
-                            date = datetime.datetime.fromtimestamp(mtime).strftime('%Y-%m-%d')
-                            date_source = 'file'
-                    except Exception:
-                        date = None
-                files.append({'id': ident, 'href': href, 'title': title, 'date': date, 'date_source': date_source})
-        return sorted(files, key=lambda f: f['href'])
+        Dates fall back to the file's mtime, so iterating lazily also spreads the
+        stat() calls over the response instead of paying for all of them up front.
+        """
+        import datetime
+
+        state = self._state
+        for ident in state.href_order:
+            href = state.resources[ident].get('href')
+            if not href.startswith('web_resources'):
+                continue
+            meta = state.file_meta.get(ident, {})
+            title = meta.get('display_name') or os.path.basename(href)
+            date = meta.get('unlock_at')
+            date_source = None
+            # fallback: if no date metadata, try filesystem mtime of resolved file
+            if date:
+                date_source = 'meta'
+            if not date:
+                p = href
+                if not self._exists(p):
+                    # sometimes hrefs may have stray leading/trailing whitespace
+                    p = href.strip()
+                try:
+                    if self._exists(p):
+                        mtime = self._getmtime(p)
+                        # ISO-like fallback (date only)
+                        date = datetime.datetime.fromtimestamp(mtime).strftime('%Y-%m-%d')
+                        date_source = 'file'
+                except Exception:
+                    date = None
+            yield {'id': ident, 'href': href, 'title': title, 'date': date, 'date_source': date_source}
+
+    def get_files(self):
+        return list(self.iter_files())
 
+    @traced('parser.get_syllabus')
     def get_syllabus(self):
         # look for resource with intendeduse=syllabus or known syllabus path
         for ident, r in self.resources.items():
             if r.get('href') and 'syllabus' in r.get('href'):
                 return r
             # intendeduse handled in manifest not stored; fallback to course_settings
-        p = os.path.join(self.path, 'course_settings', 'syllabus.html')
-        if os.path.exists(p):
+        if self._exists('course_settings/syllabus.html'):
             return {'identifier': 'syllabus', 'href': 'course_settings/syllabus.html', 'files': ['course_settings/syllabus.html']}
         return None
 
+    @traced('parser.get_assignments')
     def get_assignments(self):
         assigns = []
         for ident, r in self.resources.items():
@@ -494,40 +725,42 @@ class CanvasExport:
                 assigns.append({'id': ident, 'href': r.get('href'), 'title': os.path.basename(r.get('href') or '')})
         return sorted(assigns, key=lambda a: a['href'] or '')
 
-    def get_modules(self):
+    @traced('parser.get_modules')
+    def get_modules(self, include_items=True):
         """Construct modules from the manifest's organizations.
 
         Returns a list of modules where each module is a dict:
-          {'title': <module title>, 'items': [{'title':..., 'href':...}, ...]}
+          {'title': <module title>, 'node': <org_tree index>, 'items': [{'title':..., 'href':...}, ...]}
         The method walks organization items and treats any item whose children
-        reference resources (identifierref) as a module grouping.
+        reference resources (identifierref) as a module grouping; other items are
+        descended into.  With include_items=False the item lists are left empty,
+        for views that load them on demand via tree_children().
         """
+        state = self._state
+        tree = state.org_tree
         modules = []
-
-        def process_item(item):
+        stack = list(reversed(tree.children(0)))
+        while stack:
+            idx = stack.pop()
+            children = tree.children(idx)
             # if this item has children, and any child references a resource,
             # treat the item as a module container
-            children = item.get('children') or []
-            has_ref_child = any((c.get('identifierref') for c in children))
-            if has_ref_child:
-                mod = {'title': item.get('title') or 'Module', 'items': []}
-                for child in children:
-                    ident = child.get('identifierref')
-                    res = self.resources.get(ident) if ident else None
-                    href = res.get('href') if res else None
-                    title = child.get('title') or (res and (res.get('title') or os.path.basename(href or ''))) 
-                    mod['items'].append({'title': title, 'href': href})
+            if any(tree.identifierref[c] for c in children):
+                mod = {'title': tree.title[idx] or 'Module', 'node': idx, 'items': []}
+                if include_items:
+                    for c in children:
+                        ident = tree.identifierref[c]
+                        res = state.resources.get(ident) if ident else None
+                        href = res.get('href') if res else None
+                        title = tree.title[c] or (res and (res.get('title') or os.path.basename(href or '')))
+                        mod['items'].append({'title': title, 'href': href})
                 modules.append(mod)
             else:
-                # recurse into children
-                for c in children:
-                    process_item(c)
-
-        for top in self.organizations:
-            process_item(top)
-
+                # descend into children
+                stack.extend(reversed(children))
         return modules
 
+    @traced('parser.href_to_resource')
     def href_to_resource(self, href):
         # return resource entry that matches href exactly
         for r in self.resources.values():
@@ -538,6 +771,7 @@ class CanvasExport:
                     return r
         return None
 
+    @traced('parser.resolve_path')
     def resolve_path(self, href):
         if not href:
             return None
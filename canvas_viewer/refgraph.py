@@ -0,0 +1,195 @@
+"""Asset reference graph of an export: which files are used, and by what.
+
+Edges come from three places:
+- the manifest: a resource's href depends on each of its <file> entries
+- the organization (modules): every module item's resource is a root
+- links inside pages: href/src/data/poster attributes, every candidate of a
+  srcset, and CSS url(...) in style attributes and <style> blocks, in HTML
+  files and in the HTML that Canvas stores escaped inside XML files
+  (discussions, quizzes), with $IMS-CC-FILEBASE$ and $WIKI_REFERENCE$
+  placeholders resolved
+- url(...) and @import in .css files, relative to the stylesheet
+
+Roots are module items, wiki pages, course settings and every resource that
+is not plain web content (assignments, discussions, ...); whatever cannot be
+reached from them is an orphan.  Pages are scanned with a regex rather than
+a full HTML parse, on a thread pool, in one pass over the export.
+"""
+import html
+import posixpath
+import re
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import unquote, urlsplit
+
+FILEBASE = '$IMS-CC-FILEBASE$'
+WIKI_REFERENCE = '$WIKI_REFERENCE$'
+LINK_RE = re.compile(rb'''\b(?:href|src|data|poster)\s*=\s*(?:"([^"]*)"|'([^']*)')''', re.IGNORECASE)
+SRCSET_RE = re.compile(rb'''\bsrcset\s*=\s*(?:"([^"]*)"|'([^']*)')''', re.IGNORECASE)
+# CSS inside a page: style="..." attributes and <style> elements
+STYLE_RE = re.compile(rb'''\bstyle\s*=\s*(?:"([^"]*)"|'([^']*)')|<style\b[^>]*>(.*?)</style\s*>''',
+                      re.IGNORECASE | re.DOTALL)
+CSS_URL_RE = re.compile(rb'''\burl\(\s*(?:"([^"]*)"|'([^']*)'|([^)"'\s]*))\s*\)|@import\s+(?:"([^"]*)"|'([^']*)')''',
+                        re.IGNORECASE)
+SCANNED_SUFFIXES = ('.html', '.htm', '.xml', '.css')
+ROOT_DIRS = ('wiki_content/', 'course_settings/')
+
+
+def resolve_link(value, base_dir):
+    """Resolve a link found in a page under base_dir to an export-relative path, or None if it is not local."""
+    value = html.unescape(value).strip()
+    if not value or value.startswith(('#', '//')):
+        return None
+    if value.startswith(FILEBASE):
+        path = 'web_resources/' + value[len(FILEBASE):].lstrip('/')
+    elif value.startswith(WIKI_REFERENCE):
+        tail = value[len(WIKI_REFERENCE):].lstrip('/')
+        if not tail.startswith('pages/'):
+            return None
+        path = 'wiki_content/' + tail[len('pages/'):].split('?', 1)[0].split('#', 1)[0] + '.html'
+    elif value.startswith('$'):
+        # other Canvas placeholders ($CANVAS_COURSE_REFERENCE$, ...) point at course areas, not files
+        return None
+    else:
+        parts = urlsplit(value)
+        if parts.scheme or parts.netloc:
+            return None
+        path = value if value.startswith('/') else posixpath.join(base_dir, value)
+    path = unquote(urlsplit(path).path)
+    path = posixpath.normpath(path.lstrip('/'))
+    if path in ('.', '') or path.startswith('../'):
+        return None
+    return path
+
+
+def _first_group(m):
+    return next(g for g in m.groups() if g is not None)
+
+
+def _css_urls(css):
+    for m in CSS_URL_RE.finditer(css):
+        yield _first_group(m)
+
+
+def _link_values(raw, css):
+    """Yield the raw link values found in a page's (or, with css, a stylesheet's) contents."""
+    if css:
+        yield from _css_urls(raw)
+        return
+    for m in LINK_RE.finditer(raw):
+        yield _first_group(m)
+    for m in SRCSET_RE.finditer(raw):
+        # "a.png 1x, b.png 2x": the URL is the first word of each candidate
+        for candidate in _first_group(m).split(b','):
+            words = candidate.split()
+            if words:
+                yield words[0]
+    for m in STYLE_RE.finditer(raw):
+        # quotes inside style="..." are escaped (url(&quot;x&quot;)): unescape before looking for url()
+        yield from _css_urls(html.unescape(_first_group(m).decode('utf-8', errors='ignore')).encode('utf-8'))
+
+
+def page_links(raw, rel):
+    """Return the set of export paths linked from the page (XML file, stylesheet) rel with contents raw."""
+    lower = rel.lower()
+    if lower.endswith('.xml'):
+        # HTML bodies are stored escaped inside the XML
+        raw = html.unescape(raw.decode('utf-8', errors='ignore')).encode('utf-8')
+    base_dir = posixpath.dirname(rel)
+    links = set()
+    for value in _link_values(raw, lower.endswith('.css')):
+        target = resolve_link(value.decode('utf-8', errors='ignore'), base_dir)
+        if target and target != rel:
+            links.add(target)
+    return links
+
+
+class ReferenceGraph:
+    def __init__(self, files=()):
+        self.files = set(files)   # paths that exist (and would be exported)
+        self.roots = set()
+        self.links = {}           # source -> {target, ...}
+        self.referrers = {}       # target -> {source, ...}
+        self.page_sources = set()  # sources whose links came from scanning their contents
+
+    def add(self, source, target):
+        self.links.setdefault(source, set()).add(target)
+        self.referrers.setdefault(target, set()).add(source)
+
+    def reachable(self):
+        seen = set(self.roots)
+        stack = list(self.roots)
+        while stack:
+            for target in self.links.get(stack.pop(), ()):
+                if target not in seen:
+                    seen.add(target)
+                    stack.append(target)
+        return seen
+
+    def orphans(self):
+        """Existing files nothing reachable refers to, sorted."""
+        return sorted(self.files - self.reachable())
+
+    def missing(self):
+        """{path: [pages]} for links from pages to files that do not exist."""
+        out = {}
+        for target, sources in self.referrers.items():
+            pages = sorted(sources & self.page_sources)
+            if target not in self.files and pages:
+                out[target] = pages
+        return dict(sorted(out.items()))
+
+    def used_by(self, path):
+        """Pages that link to path, sorted."""
+        return sorted(self.referrers.get(path, set()) & self.page_sources)
+
+
+def build_reference_graph(export, files=None, workers=None):
+    """Build the ReferenceGraph of a CanvasExport.
+
+    files are the export paths to account for (default: everything under
+    wiki_content, web_resources and course_settings).
+    """
+    files = list(export.iter_paths()) if files is None else list(files)
+    graph = ReferenceGraph(files)
+
+    to_scan = {rel for rel in files if rel.lower().endswith(SCANNED_SUFFIXES)}
+    state = export.state
+    for res in state.resources.values():
+        href = res.get('href')
+        deps = [f for f in (res.get('files') or []) if f != href]
+        for f in deps:
+            if href:
+                graph.add(href, f)
+        if (res.get('type') or 'webcontent') != 'webcontent':
+            graph.roots.update([href] if href else deps)
+        # resource pages outside the exported folders (discussion/quiz XML, ...) are scanned too
+        for path in ([href] + deps) if href else deps:
+            if path and path.lower().endswith(SCANNED_SUFFIXES) and not urlsplit(path).scheme:
+                to_scan.add(path)
+    tree = state.org_tree
+    for ident in tree.identifierref:
+        res = state.resources.get(ident) if ident else None
+        if res and res.get('href'):
+            graph.roots.add(res['href'])
+    graph.roots.update(rel for rel in files if rel.startswith(ROOT_DIRS))
+
+    def scan(rel):
+        try:
+            return rel, page_links(export.read(rel), rel)
+        except (OSError, KeyError):
+            # listed in the manifest but not present in the export
+            return rel, None
+
+    to_scan = sorted(to_scan)
+    if workers == 1 or len(to_scan) <= 1:
+        results = map(scan, to_scan)
+    else:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(scan, to_scan))
+    for rel, links in results:
+        if links is None:
+            continue
+        graph.page_sources.add(rel)
+        for target in links:
+            graph.add(rel, target)
+    return graph
@@ -0,0 +1,188 @@
+"""Rendering of exported HTML pages, shared by the live viewer and the static exporter.
+
+rewrite_page() cleans up a page the way the viewer always has (embedded
+stylesheets and inline styles removed, so the viewer's CSS wins) and rewrites
+its links; render_page() then puts it in the page.html layout.
+
+Where links point is up to a `link(kind, target='')` callable, which the
+templates (page.html, _nav.html, _sidebar.html) use too:
+
+    'page'     an .html page of the export (target is its export path)
+    'file'     any other file of the export
+    'static'   a viewer asset in canvas_viewer/static
+    'course'   a $CANVAS_COURSE_REFERENCE$ link (target is the part after it)
+    'root'     the site root
+    'tree'     the lazy module tree endpoint (used by module_tree.js)
+    'asset'    an image lifted out of a data: URI (target is its AssetStore name)
+    'home', 'syllabus', 'modules', 'pages', 'files', 'search', ...
+               the viewer's sections
+
+viewer_link gives the live viewer's routes; StaticLinks gives paths relative
+to a page of the static export, or None for sections a static site does not
+have, which the templates then leave out.
+"""
+import posixpath
+from urllib.parse import urlparse
+
+from lxml import html
+
+from .tracing import span
+
+FILEBASE = '$IMS-CC-FILEBASE$'
+COURSE_REFERENCE = '$CANVAS_COURSE_REFERENCE$'
+WIKI_REFERENCE = '$WIKI_REFERENCE$'
+
+
+def _course_section(tail):
+    if tail.startswith('modules'):
+        return 'modules'
+    if tail.startswith('pages'):
+        return 'pages'
+    return None
+
+
+def viewer_link(kind, target=''):
+    """URLs of the live viewer (canvas_viewer.app)."""
+    if kind == 'root':
+        return '/'
+    if kind == 'page':
+        return '/page/' + target
+    if kind in ('file', 'static'):
+        return '/static/' + target
+    if kind == 'tree':
+        return '/modules/tree/'
+    if kind == 'asset':
+        return '/asset/' + target
+    if kind == 'course':
+        section = _course_section(target)
+        return '/' + section if section else '/' + target
+    return '/' + kind
+
+
+class StaticLinks:
+    """Links from the static export's page at href (a path inside the course folder).
+
+    syllabus is the export path of the course's syllabus page, if it has one.
+    """
+
+    # sections the exporter writes, as paths inside the course folder
+    SECTIONS = {
+        'home': 'index.html',
+        'modules': 'modules.html',
+        'pages': 'pages.html',
+        'files': 'files.html',
+    }
+
+    def __init__(self, href, syllabus=None):
+        self.base = posixpath.dirname(href) or '.'
+        self.sections = dict(self.SECTIONS, syllabus=syllabus) if syllabus else self.SECTIONS
+
+    def __call__(self, kind, target=''):
+        if kind == 'root':
+            dest = '../index.html'
+        elif kind in ('page', 'file'):
+            dest = target
+        elif kind == 'static':
+            dest = '_static/' + target
+        elif kind == 'course':
+            dest = self.sections.get(_course_section(target), 'index.html')
+        else:
+            dest = self.sections.get(kind)
+            if dest is None:
+                return None
+        return posixpath.relpath(dest, self.base)
+
+
+def rewrite_link(val, base_dir, link):
+    """The rewritten value of an href/src found in a page under base_dir."""
+    if not val:
+        return val
+    parsed = urlparse(val)
+    # leave absolute URLs (and inline data) alone
+    if parsed.scheme in ('http', 'https', 'mailto', 'data') or val.startswith('//'):
+        return val
+    # handle anchors
+    if val.startswith('#'):
+        return val
+    # handle Canvas course reference links like $CANVAS_COURSE_REFERENCE$/modules
+    if val.startswith(COURSE_REFERENCE):
+        return link('course', val.replace(COURSE_REFERENCE, '').lstrip('/'))
+    # handle IMS filebase placeholders by mapping to web_resources
+    if val.startswith(FILEBASE):
+        return link('file', 'web_resources/' + val.replace(FILEBASE, '').lstrip('/'))
+    # wiki page links ($WIKI_REFERENCE$/pages/<slug>) point at wiki_content/<slug>.html
+    if val.startswith(WIKI_REFERENCE + '/pages/'):
+        slug = val[len(WIKI_REFERENCE + '/pages/'):].split('#', 1)[0].split('?', 1)[0]
+        return link('page', 'wiki_content/' + slug + '.html')
+    # build normalized path relative to base_dir
+    joined = posixpath.normpath(posixpath.join(base_dir, val)) if not posixpath.isabs(val) else val.lstrip('/')
+    # if it points to html -> page route
+    if joined.lower().endswith('.html'):
+        return link('page', joined)
+    # otherwise serve as static
+    return link('file', joined)
+
+
+def rewrite_page(raw, href, link, assets=None):
+    """Return the cleaned-up, link-rewritten HTML of the page at href, or None if it cannot be parsed.
+
+    With assets (an AssetStore, see canvas_viewer.assets), images inlined as
+    base64 data: URIs are stored there and linked as link('asset', name).
+    """
+    try:
+        with span('page.parse', bytes=len(raw)):
+            doc = html.fromstring(raw)
+    except Exception:
+        return None
+
+    # base directory for resolving relative links
+    base_dir = posixpath.dirname(href)
+    # remove embedded <style> blocks and external stylesheet links from exported pages
+    with span('page.strip_styles'):
+        for s in doc.xpath('//style'):
+            parent = s.getparent()
+            if parent is not None:
+                parent.remove(s)
+        for el in doc.xpath('//link'):
+            rel = (el.get('rel') or '').lower()
+            # if it's a stylesheet link, remove it so our site CSS wins
+            if 'stylesheet' in rel or (el.get('type') or '').lower() == 'text/css':
+                parent = el.getparent()
+                if parent is not None:
+                    parent.remove(el)
+
+    # strip inline style attributes so the app's CSS takes precedence, then rewrite links
+    # (one pass over the tree, so the inline styles are part of the rewrite span)
+    with span('page.rewrite'):
+        for el in doc.iter():
+            if not isinstance(el.tag, str):
+                continue
+            if 'style' in el.attrib:
+                del el.attrib['style']
+            tag = el.tag.lower()
+            if tag == 'img' and el.get('src'):
+                src = el.get('src')
+                name = assets.add_data_uri(src) if assets is not None and src.startswith('data:') else None
+                el.set('src', link('asset', name) if name else rewrite_link(src, base_dir, link))
+            if tag == 'a' and el.get('href'):
+                el.set('href', rewrite_link(el.get('href'), base_dir, link))
+            # link tags have been mostly removed; if remaining and have href, rewrite
+            if tag == 'link' and el.get('href'):
+                el.set('href', rewrite_link(el.get('href'), base_dir, link))
+            if tag == 'script' and el.get('src'):
+                el.set('src', rewrite_link(el.get('src'), base_dir, link))
+
+    with span('page.serialize'):
+        return html.tostring(doc, encoding='unicode', pretty_print=True)
+
+
+def render_page(env, raw, href, link, **context):
+    """Render the page at href (raw bytes) in page.html; None if it cannot be parsed.
+
+    env is a Jinja environment that can load page.html; context supplies the
+    rest of the layout (nav, nav_fragment, sidebar_fragment).
+    """
+    content = rewrite_page(raw, href, link)
+    if content is None:
+        return None
+    return env.get_template('page.html').render(content=content, title=posixpath.basename(href), link=link, **context)
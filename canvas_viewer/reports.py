@@ -0,0 +1,124 @@
+"""Report builders for expensive views such as /canvas-data."""
+import json
+import os
+from datetime import datetime
+
+
+def yesno(v):
+    return 'Yes' if v == 'true' or v is True else ('No' if v == 'false' or v is False else (v or '—'))
+
+
+def human_size(bytes_str):
+    try:
+        b = int(bytes_str)
+    except Exception:
+        return bytes_str or '—'
+    for unit in ['B', 'KB', 'MB', 'GB', 'TB']:
+        if b < 1024:
+            # show as integer for smaller units
+            if unit == 'B':
+                return f"{int(b)}{unit}"
+            return f"{b:.0f}{unit}"
+        b = b / 1024
+    return f"{b:.1f}PB"
+
+
+def human_date(iso_str):
+    if not iso_str:
+        return '—'
+    s = iso_str
+    try:
+        # accommodate trailing Z (UTC)
+        if s.endswith('Z'):
+            s = s.replace('Z', '+00:00')
+        dt = datetime.fromisoformat(s)
+        # include timezone name if present, otherwise omit
+        if dt.tzinfo:
+            return dt.strftime("%b %d, %Y %H:%M %Z")
+        return dt.strftime("%b %d, %Y %H:%M")
+    except Exception:
+        # fallback to original string
+        return iso_str or '—'
+
+
+def empty_canvas_data_report(base_domain):
+    """Placeholder used while the first report for an export is still being computed."""
+    return {
+        'metadata': {},
+        'counts': {},
+        'human': {},
+        'external_tools': [],
+        'has_external_tools': False,
+        'external_links': [],
+        'base_domain': base_domain,
+    }
+
+
+def canvas_data_report(export, raw_base, progress=None):
+    """Compute everything the Canvas Data page shows.
+
+    raw_base is the comma-separated list of internal base domains.  progress,
+    if given, is called as progress(fraction, message) between stages.
+    """
+    def step(fraction, message):
+        if progress:
+            progress(fraction, message)
+
+    step(0.0, 'Reading course metadata')
+    meta = export.get_course_metadata()
+
+    step(0.1, 'Counting course content')
+    pages = export.get_pages_by_folder('wiki_content')
+    files = export.get_files()
+    mods = export.get_modules()
+    cats = export.categorize_resources()
+    counts = {
+        'pages': len(pages),
+        'files': len(files),
+        'modules': len(mods),
+        'quizzes': len(cats.get('quizzes') or []),
+        'discussions': len(cats.get('discussions') or []),
+        'announcements': len(cats.get('announcements') or []),
+    }
+
+    # pretty-print tab configuration JSON if available
+    pretty_tab = '—'
+    raw_tab = meta.get('tab_configuration')
+    if raw_tab:
+        try:
+            obj = json.loads(raw_tab)
+            pretty_tab = json.dumps(obj, indent=2)
+        except Exception:
+            # already not-valid JSON: show as-is
+            pretty_tab = raw_tab
+
+    human = {
+        'title': meta.get('title') or (export.title or os.path.basename(export.path)),
+        'course_code': meta.get('course_code') or '—',
+        'start_at': human_date(meta.get('start_at')),
+        'conclude_at': human_date(meta.get('conclude_at')),
+        'is_public': yesno(meta.get('is_public')),
+        'public_syllabus': yesno(meta.get('public_syllabus')),
+        'storage_quota': human_size(meta.get('storage_quota')),
+        'grading_standard_id': meta.get('grading_standard_id') or '—',
+        'tab_configuration': pretty_tab,
+    }
+
+    step(0.3, 'Detecting external tools')
+    external_tools = export.detect_external_tools()
+
+    step(0.4, 'Scanning pages for external links')
+    base_domains = [d.strip() for d in raw_base.split(',') if d.strip()]
+    # find external links not pointing to the configured base domains
+    external_links = export.find_external_links(allowed_domains=base_domains)
+
+    step(1.0, 'Done')
+    return {
+        'metadata': meta,
+        'counts': counts,
+        'human': human,
+        'external_tools': external_tools,
+        'has_external_tools': bool(external_tools),
+        'external_links': external_links,
+        'base_domain': raw_base,
+    }
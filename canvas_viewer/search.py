@@ -0,0 +1,305 @@
+"""Full-text search over the HTML pages of a Canvas export.
+
+The index is a positional inverted index (term -> {page href -> [token positions]})
+built from the text of every wiki_content and course_settings HTML page.  It is
+persisted as JSON inside the export's cache directory and refreshed
+incrementally: only pages whose size or mtime changed are re-tokenized.
+Queries only read the in-memory index; the viewer refreshes it, and writes
+it out, on a background thread.
+"""
+import json
+import math
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from lxml import html as lhtml
+from markupsafe import Markup, escape
+
+from .copying import temp_name
+
+INDEX_VERSION = 1
+INDEX_FILENAME = 'search_index.json'
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+# BM25 tuning; title matches get a flat bonus so page names rank first
+BM25_K1 = 1.2
+BM25_B = 0.75
+TITLE_BOOST = 2.0
+SNIPPET_CHARS = 160
+
+
+def tokenize(text):
+    """Return the lowercased word tokens of text; list index is the token position."""
+    return [t.lower() for t in TOKEN_RE.findall(text or '')]
+
+
+def extract_text(path):
+    """Return (title, text) for an HTML file, ignoring script/style content."""
+    with open(path, 'rb') as f:
+        return page_text(f.read())
+
+
+def page_text(raw):
+    """Return (title, text) for the bytes of an HTML page, ignoring script/style content."""
+    if not raw.strip():
+        return None, ''
+    try:
+        doc = lhtml.fromstring(raw)
+    except Exception:
+        return None, ''
+    for el in doc.xpath('//script|//style'):
+        parent = el.getparent()
+        if parent is not None:
+            parent.remove(el)
+    title = None
+    t = doc.find('.//title')
+    if t is not None and t.text and t.text.strip():
+        title = t.text.strip()
+    body = doc.find('.//body')
+    # join text nodes with spaces so adjacent block elements do not fuse into one token
+    text = ' '.join(' '.join((body if body is not None else doc).itertext()).split())
+    return title, text
+
+
+class SearchIndex:
+    def __init__(self, export, cache_dir=None, workers=None):
+        self.export = export
+        self.cache_dir = cache_dir
+        self.workers = workers or min(8, os.cpu_count() or 1)
+        self.docs = {}  # href -> {title, text, length, mtime, size}
+        self.postings = {}  # term -> {href: [positions]}
+        self.total_length = 0
+        self._lock = threading.Lock()
+        # one refresh at a time; one index write at a time, so the file ends up with the newest snapshot
+        self._refresh_lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self.last_refresh = 0.0
+
+    @property
+    def index_path(self):
+        if not self.cache_dir:
+            return None
+        return os.path.join(self.cache_dir, INDEX_FILENAME)
+
+    def candidate_pages(self):
+        """Return {href: absolute path} for every indexable HTML page in the export."""
+        found = {}
+        for r in self.export.resources.values():
+            href = (r.get('href') or '').strip()
+            if href.lower().endswith('.html') and (href.startswith('wiki_content') or href.startswith('course_settings')):
+                p = self.export.resolve_path(href)
+                if p and os.path.exists(p):
+                    found[href] = p
+        # course_settings pages (e.g. syllabus.html) are not always listed as resources
+        cs_dir = os.path.join(self.export.path, 'course_settings')
+        if os.path.isdir(cs_dir):
+            for name in os.listdir(cs_dir):
+                if name.lower().endswith('.html'):
+                    found.setdefault('course_settings/' + name, os.path.join(cs_dir, name))
+        return found
+
+    def load(self):
+        """Load a persisted index from the cache directory; returns True on success."""
+        p = self.index_path
+        if not p or not os.path.exists(p):
+            return False
+        try:
+            with open(p, 'r', encoding='utf-8') as fh:
+                data = json.load(fh)
+        except Exception:
+            return False
+        if data.get('version') != INDEX_VERSION:
+            return False
+        with self._lock:
+            self.docs = data.get('docs') or {}
+            self.postings = data.get('postings') or {}
+            self.total_length = sum(d['length'] for d in self.docs.values())
+        return True
+
+    def save(self):
+        p = self.index_path
+        if not p:
+            return
+        with self._save_lock:
+            # copy under the lock, write without it: searches only wait for the copy.  docs entries are
+            # replaced, never changed, and a re-indexed page gets new position lists
+            with self._lock:
+                data = {'version': INDEX_VERSION, 'docs': dict(self.docs),
+                        'postings': {term: dict(plist) for term, plist in self.postings.items()}}
+            tmp = temp_name(p)
+            try:
+                os.makedirs(self.cache_dir, exist_ok=True)
+                with open(tmp, 'w', encoding='utf-8') as fh:
+                    json.dump(data, fh, separators=(',', ':'))
+                os.replace(tmp, p)
+            except OSError as e:
+                print(f"[search] could not persist index to {p}: {e}")
+                if os.path.exists(tmp):
+                    os.unlink(tmp)
+
+    def build(self):
+        """Load the persisted index (if any) and bring it up to date with the export."""
+        self.load()
+        return self.refresh(force=True)
+
+    def refresh(self, force=False, min_interval=0.0):
+        """Re-index pages that were added or changed on disk and drop removed pages.
+
+        Returns the number of pages that were (re)indexed or removed.  When
+        min_interval is given, calls within that many seconds of the previous
+        refresh return 0 without touching the filesystem.
+        """
+        with self._refresh_lock:
+            return self._refresh(force, min_interval)
+
+    def refresh_in_background(self, min_interval=0.0):
+        """Start a refresh on a background thread and return at once.
+
+        Does nothing (and returns False) if a refresh is already running or
+        the previous one started within min_interval seconds.
+        """
+        if time.monotonic() - self.last_refresh < min_interval:
+            return False
+        if not self._refresh_lock.acquire(blocking=False):
+            return False
+
+        def run():
+            try:
+                self._refresh(False, min_interval)
+            except Exception as e:
+                print(f"[search] background refresh failed: {e!r}")
+            finally:
+                self._refresh_lock.release()
+
+        threading.Thread(target=run, daemon=True, name='search-refresh').start()
+        return True
+
+    def _refresh(self, force, min_interval):
+        now = time.monotonic()
+        if not force and now - self.last_refresh < min_interval:
+            return 0
+        self.last_refresh = now
+
+        pages = self.candidate_pages()
+        stale = {}
+        for href, path in pages.items():
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            doc = self.docs.get(href)
+            if doc is None or doc.get('mtime') != st.st_mtime_ns or doc.get('size') != st.st_size:
+                stale[href] = (path, st.st_mtime_ns, st.st_size)
+        removed = [h for h in self.docs if h not in pages]
+        if not stale and not removed:
+            return 0
+
+        def work(item):
+            href, (path, mtime, size) = item
+            try:
+                title, text = extract_text(path)
+            except OSError:
+                title, text = None, ''
+            return href, title, text, mtime, size
+
+        # lxml releases the GIL while parsing, so a thread pool parallelizes the expensive part
+        if len(stale) > 1 and self.workers > 1:
+            with ThreadPoolExecutor(max_workers=self.workers) as pool:
+                results = list(pool.map(work, stale.items()))
+        else:
+            results = [work(item) for item in stale.items()]
+
+        with self._lock:
+            for href in removed:
+                self._remove(href)
+            for href, title, text, mtime, size in results:
+                self._remove(href)
+                self._add(href, title, text, mtime, size)
+        self.save()
+        return len(results) + len(removed)
+
+    def _add(self, href, title, text, mtime, size):
+        tokens = tokenize(text)
+        self.docs[href] = {
+            'title': title or os.path.basename(href),
+            'text': text,
+            'length': len(tokens),
+            'mtime': mtime,
+            'size': size,
+        }
+        self.total_length += len(tokens)
+        for pos, term in enumerate(tokens):
+            self.postings.setdefault(term, {}).setdefault(href, []).append(pos)
+
+    def _remove(self, href):
+        doc = self.docs.pop(href, None)
+        if doc is None:
+            return
+        self.total_length -= doc['length']
+        for term in set(tokenize(doc['text'])):
+            plist = self.postings.get(term)
+            if plist is None:
+                continue
+            plist.pop(href, None)
+            if not plist:
+                del self.postings[term]
+
+    def search(self, query, limit=20):
+        """Return ranked results for query as dicts: {href, title, score, snippet}."""
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms:
+            return []
+        with self._lock:
+            n_docs = len(self.docs)
+            if not n_docs:
+                return []
+            avg_len = (self.total_length / n_docs) or 1.0
+            scores = {}
+            for term in terms:
+                plist = self.postings.get(term)
+                if not plist:
+                    continue
+                idf = math.log(1 + (n_docs - len(plist) + 0.5) / (len(plist) + 0.5))
+                for href, positions in plist.items():
+                    tf = len(positions)
+                    length = self.docs[href]['length']
+                    norm = tf * (BM25_K1 + 1) / (tf + BM25_K1 * (1 - BM25_B + BM25_B * length / avg_len))
+                    scores[href] = scores.get(href, 0.0) + idf * norm
+            for href in scores:
+                title_tokens = set(tokenize(self.docs[href]['title']))
+                scores[href] += TITLE_BOOST * sum(1 for t in terms if t in title_tokens)
+            ranked = sorted(scores.items(), key=lambda kv: (-kv[1], kv[0]))[:limit]
+            results = []
+            for href, score in ranked:
+                doc = self.docs[href]
+                results.append({
+                    'href': href,
+                    'title': doc['title'],
+                    'score': round(score, 4),
+                    'snippet': make_snippet(doc['text'], terms),
+                })
+        return results
+
+
+def make_snippet(text, terms, width=SNIPPET_CHARS):
+    """Return an HTML-safe excerpt of text around the first query hit with hits wrapped in <mark>."""
+    pattern = re.compile(r'(?<!\w)(' + '|'.join(re.escape(t) for t in terms) + r')(?!\w)', re.IGNORECASE)
+    m = pattern.search(text)
+    start = 0
+    if m:
+        start = max(0, m.start() - width // 3)
+    end = min(len(text), start + width)
+    excerpt = text[start:end]
+    out = []
+    pos = 0
+    for hit in pattern.finditer(excerpt):
+        out.append(escape(excerpt[pos:hit.start()]))
+        out.append(Markup('<mark>%s</mark>') % hit.group(0))
+        pos = hit.end()
+    out.append(escape(excerpt[pos:]))
+    prefix = '…' if start > 0 else ''
+    suffix = '…' if end < len(text) else ''
+    return Markup(prefix) + Markup('').join(out) + Markup(suffix)
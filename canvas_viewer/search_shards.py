@@ -0,0 +1,177 @@
+"""Prebuilt, sharded search index for the static site.
+
+The static export has no server to run queries, so the exporter writes an
+inverted index the browser can query itself (see static/search.js):
+
+    _search/index.json      {version, prefix, docs: [[url, title, length], ...], avg_length, shards}
+    _search/t/<key>.json    {term: [doc, tf, doc, tf, ...], ...} for the terms whose first
+                            `prefix` characters map to <key> (see shard_key)
+
+A query only downloads index.json and the shards of its terms.  The writer
+never holds the corpus: each page is tokenized as it is added and its
+(term, doc, tf) postings are buffered per shard and, once the buffer is full,
+appended to one temporary spool file per shard; finish() then turns each
+shard's spool into its JSON file, one shard at a time.  Ranking is BM25, as
+in canvas_viewer.search, so doc lengths are kept in index.json.
+"""
+import json
+import os
+import shutil
+import tempfile
+from collections import Counter
+
+from .search import tokenize
+
+SHARD_VERSION = 1
+SHARD_PREFIX = 2
+SEARCH_DIR = '_search'
+# spooled postings are flushed to disk once this many bytes are buffered
+SPOOL_BYTES = 4 * 1024 * 1024
+
+
+def shard_key(term, prefix=SHARD_PREFIX):
+    """File name (without .json) of the shard holding term.
+
+    a-z and 0-9 are kept as they are; any other character becomes _<hex code point>_
+    so keys are safe, unambiguous file names.  static/search.js mirrors this.
+    """
+    return ''.join(c if 'a' <= c <= 'z' or '0' <= c <= '9' else f'_{ord(c):x}_' for c in term[:prefix])
+
+
+class ShardedIndexWriter:
+    """Streams documents into a sharded index written to out_dir on finish().
+
+    out_dir may be None when the index is consumed through files() instead.
+    """
+
+    def __init__(self, out_dir=None, prefix=SHARD_PREFIX, spool_bytes=SPOOL_BYTES):
+        self.out_dir = None if out_dir is None else str(out_dir)
+        self.prefix = prefix
+        self.spool_bytes = spool_bytes
+        self.docs = []
+        self.total_length = 0
+        self.terms = 0
+        self._spool_dir = None
+        self._buffers = {}   # shard key -> [(term, doc, tf)]
+        self._buffered = 0
+        self._keys = {}      # term -> shard key
+
+    def add(self, url, title, text):
+        """Index one page; returns its doc id."""
+        return self.add_tokens(url, title, tokenize(text))
+
+    def add_tokens(self, url, title, tokens):
+        doc = self.add_doc(url, title, len(tokens))
+        for term, tf in Counter(tokens).items():
+            self.add_posting(term, doc, tf)
+        return doc
+
+    def add_doc(self, url, title, length):
+        self.docs.append([url, title, length])
+        self.total_length += length
+        return len(self.docs) - 1
+
+    def add_posting(self, term, doc, tf):
+        # postings arrive in doc order, so each spooled shard is already sorted by doc
+        key = self._keys.get(term)
+        if key is None:
+            key = self._keys[term] = shard_key(term, self.prefix)
+        self._buffers.setdefault(key, []).append((term, doc, tf))
+        # roughly the size of the spooled line
+        self._buffered += len(term) + 12
+        if self._buffered >= self.spool_bytes:
+            self._flush()
+
+    def merge(self, index_dir, url_prefix=''):
+        """Append another sharded index (e.g. a course's) to this one, one shard at a time."""
+        with open(os.path.join(index_dir, 'index.json'), 'r', encoding='utf-8') as fh:
+            meta = json.load(fh)
+        offset = len(self.docs)
+        for url, title, length in meta['docs']:
+            self.add_doc(url_prefix + url, title, length)
+        for key in meta['shards']:
+            with open(os.path.join(index_dir, 't', key + '.json'), 'r', encoding='utf-8') as fh:
+                shard = json.load(fh)
+            for term, plist in shard.items():
+                for i in range(0, len(plist), 2):
+                    self.add_posting(term, plist[i] + offset, plist[i + 1])
+
+    def _flush(self):
+        if self._spool_dir is None:
+            self._spool_dir = tempfile.mkdtemp(prefix='search-spool-')
+        for key, postings in self._buffers.items():
+            with open(os.path.join(self._spool_dir, key), 'a', encoding='utf-8') as fh:
+                fh.writelines(f'{term}\t{doc}\t{tf}\n' for term, doc, tf in postings)
+        self._buffers = {}
+        self._buffered = 0
+
+    def files(self):
+        """Yield (path inside the index, JSON bytes): index.json, then each shard in key order.
+
+        Shards are built one at a time from their spool file and whatever is
+        still buffered (an index that never outgrew the buffer never touches
+        the disk); the spool is dropped once the last one is out.
+        """
+        try:
+            spooled = set(os.listdir(self._spool_dir)) if self._spool_dir else set()
+            keys = sorted(spooled | set(self._buffers))
+            meta = {
+                'version': SHARD_VERSION,
+                'prefix': self.prefix,
+                'docs': self.docs,
+                'avg_length': round(self.total_length / len(self.docs), 3) if self.docs else 0,
+                'shards': keys,
+            }
+            yield 'index.json', self._json(meta)
+            for key in keys:
+                shard = {}
+                if key in spooled:
+                    with open(os.path.join(self._spool_dir, key), 'r', encoding='utf-8') as fh:
+                        for line in fh:
+                            term, doc, tf = line.rstrip('\n').split('\t')
+                            shard.setdefault(term, []).extend((int(doc), int(tf)))
+                for term, doc, tf in self._buffers.pop(key, ()):
+                    shard.setdefault(term, []).extend((doc, tf))
+                self.terms += len(shard)
+                yield 't/' + key + '.json', self._json(shard)
+        finally:
+            self.discard()
+
+    def finish(self):
+        """Write the index and replace whatever was in out_dir; returns {docs, terms, shards, bytes}."""
+        stats = {'docs': len(self.docs), 'terms': 0, 'shards': 0, 'bytes': 0}
+        parent = os.path.dirname(os.path.abspath(self.out_dir))
+        os.makedirs(parent, exist_ok=True)
+        tmp = tempfile.mkdtemp(prefix='.search-', dir=parent)
+        try:
+            os.mkdir(os.path.join(tmp, 't'))
+            for name, data in self.files():
+                with open(os.path.join(tmp, name), 'wb') as fh:
+                    fh.write(data)
+                stats['bytes'] += len(data)
+                stats['shards'] += name != 'index.json'
+            stats['terms'] = self.terms
+            # swap the finished index in with two renames instead of rewriting shards in place
+            if os.path.exists(self.out_dir):
+                old = tmp + '.old'
+                os.rename(self.out_dir, old)
+                os.rename(tmp, self.out_dir)
+                shutil.rmtree(old)
+            else:
+                os.rename(tmp, self.out_dir)
+        except BaseException:
+            shutil.rmtree(tmp, ignore_errors=True)
+            raise
+        return stats
+
+    def discard(self):
+        """Drop the spooled postings without writing anything."""
+        if self._spool_dir is not None:
+            shutil.rmtree(self._spool_dir, ignore_errors=True)
+            self._spool_dir = None
+        self._buffers = {}
+        self._buffered = 0
+
+    @staticmethod
+    def _json(data):
+        return json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
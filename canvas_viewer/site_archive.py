@@ -0,0 +1,173 @@
+"""Write a static site straight into one archive (.tar.zst, .tar.gz, .tar or .zip).
+
+Entries are added in the order the caller produces them, with fixed
+timestamps, owners and modes, so the same input always gives byte-identical
+archives.  The timestamp is SOURCE_DATE_EPOCH when set (the reproducible
+builds convention), else 1980-01-01, the earliest date zip can store.
+
+Tar archives are written as a stream (tarfile mode 'w|'), through a
+compressor: the zstandard module if installed, else the zstd or pigz command
+in a child process, so compression runs in parallel with the build and, with
+threads > 1, on several cores.  .tar.gz falls back to the gzip module.  Zip
+members are deflated in process.
+"""
+import contextlib
+import gzip
+import io
+import os
+import shutil
+import subprocess
+import tarfile
+import threading
+import time
+import zipfile
+
+try:
+    import zstandard
+except ImportError:  # optional; the zstd command is used instead
+    zstandard = None
+
+SITE_ARCHIVE_FORMATS = {'.tar.zst': 'zst', '.tar.gz': 'gz', '.tgz': 'gz', '.tar': 'tar', '.zip': 'zip'}
+# 1980-01-01T00:00:00Z
+DEFAULT_MTIME = 315532800
+ZST_LEVEL = 3
+GZ_LEVEL = 6
+
+
+def site_archive_format(path):
+    """'zst', 'gz', 'tar' or 'zip' for an archive path; None if the suffix is not supported."""
+    name = str(path).lower()
+    for suffix, fmt in SITE_ARCHIVE_FORMATS.items():
+        if name.endswith(suffix):
+            return fmt
+    return None
+
+
+def source_date_epoch():
+    value = os.environ.get('SOURCE_DATE_EPOCH')
+    return max(int(value), DEFAULT_MTIME) if value and value.isdigit() else DEFAULT_MTIME
+
+
+class _CommandWriter:
+    """A file object piping everything written to it into a compressor command that writes path."""
+
+    def __init__(self, cmd, path):
+        self._out = open(path, 'wb')
+        self._proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=self._out)
+
+    def write(self, data):
+        return self._proc.stdin.write(data)
+
+    def close(self):
+        self._proc.stdin.close()
+        code = self._proc.wait()
+        self._out.close()
+        if code:
+            raise OSError(f'{self._proc.args[0]} exited with status {code}')
+
+
+class SiteArchive:
+    """Streams files into the archive at path; use as a context manager.
+
+    threads > 1 asks the compressor for that many threads (zstd, pigz); the
+    archive is written to path + '.tmp' and renamed into place on a clean exit.
+    """
+
+    def __init__(self, path, threads=None, mtime=None):
+        self.path = str(path)
+        self.format = site_archive_format(path)
+        if self.format is None:
+            raise ValueError(f'unsupported archive type: {path} (use one of {", ".join(SITE_ARCHIVE_FORMATS)})')
+        self.threads = threads or 1
+        self.mtime = source_date_epoch() if mtime is None else mtime
+        self.files = 0
+        self.bytes = 0
+        self.compressor = None
+        self._lock = threading.Lock()
+        self._tmp = self.path + '.tmp'
+        self._raw = None
+        self._tar = None
+        self._zip = None
+
+    def __enter__(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        if self.format == 'zip':
+            self._zip = zipfile.ZipFile(self._tmp, 'w', zipfile.ZIP_DEFLATED)
+            self.compressor = 'zipfile'
+        else:
+            self._raw = self._open_compressor()
+            self._tar = tarfile.open(fileobj=self._raw, mode='w|', format=tarfile.PAX_FORMAT)
+        return self
+
+    def _open_compressor(self):
+        if self.format == 'tar':
+            self.compressor = 'none'
+            return open(self._tmp, 'wb')
+        if self.format == 'zst':
+            if zstandard is not None:
+                self.compressor = 'zstandard'
+                params = zstandard.ZstdCompressor(level=ZST_LEVEL, threads=self.threads if self.threads > 1 else 0)
+                return params.stream_writer(open(self._tmp, 'wb'), closefd=True)
+            if shutil.which('zstd'):
+                self.compressor = 'zstd'
+                return _CommandWriter(['zstd', '-q', f'-{ZST_LEVEL}', f'-T{self.threads}', '-c'], self._tmp)
+            raise RuntimeError('.tar.zst needs the zstandard package or the zstd command')
+        if self.threads > 1 and shutil.which('pigz'):
+            self.compressor = 'pigz'
+            return _CommandWriter(['pigz', '-n', f'-{GZ_LEVEL}', '-p', str(self.threads), '-c'], self._tmp)
+        self.compressor = 'gzip'
+        # an empty file name and a fixed mtime keep the gzip header reproducible
+        return gzip.GzipFile(filename='', mode='wb', fileobj=open(self._tmp, 'wb'), compresslevel=GZ_LEVEL,
+                             mtime=self.mtime)
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            self._close()
+        except BaseException:
+            self._discard()
+            raise
+        if exc_type is not None:
+            self._discard()
+            return
+        os.replace(self._tmp, self.path)
+
+    def _close(self):
+        if self._zip is not None:
+            self._zip.close()
+            return
+        self._tar.close()
+        fileobj = getattr(self._raw, 'fileobj', None)
+        self._raw.close()
+        if isinstance(self._raw, gzip.GzipFile):
+            # GzipFile does not close a file object it was given
+            fileobj.close()
+
+    def _discard(self):
+        with contextlib.suppress(OSError):
+            os.unlink(self._tmp)
+
+    def add_bytes(self, name, data):
+        self.add_stream(name, io.BytesIO(data), len(data))
+
+    def add_stream(self, name, fileobj, size):
+        """Add the size bytes read from fileobj as name (a posix path inside the archive)."""
+        with self._lock:
+            if self._zip is not None:
+                info = zipfile.ZipInfo(name, date_time=time.gmtime(self.mtime)[:6])
+                info.compress_type = zipfile.ZIP_DEFLATED
+                info.external_attr = 0o644 << 16
+                with self._zip.open(info, 'w', force_zip64=size > 0x7fffffff) as out:
+                    shutil.copyfileobj(fileobj, out, 1024 * 1024)
+            else:
+                info = tarfile.TarInfo(name)
+                info.size = size
+                info.mtime = self.mtime
+                info.mode = 0o644
+                self._tar.addfile(info, fileobj)
+            self.files += 1
+            self.bytes += size
+
+    def add_file(self, name, path):
+        with open(path, 'rb') as fh:
+            self.add_stream(name, fh, os.fstat(fh.fileno()).st_size)
+
@@ -0,0 +1,75 @@
+// Lazy module tree: each expand fetches one subtree from /modules/tree/<node>.
+(function () {
+  function toggleButton(node) {
+    const btn = document.createElement('button');
+    btn.type = 'button';
+    btn.className = 'btn btn-link btn-sm p-0 me-1 tree-toggle';
+    btn.dataset.node = node;
+    btn.setAttribute('aria-expanded', 'false');
+    btn.setAttribute('aria-label', 'Expand');
+    btn.innerHTML = '&#9656;';
+    return btn;
+  }
+
+  function renderChildren(container, data) {
+    const ul = document.createElement('ul');
+    ul.className = container.dataset.listClass || 'list-unstyled sidebar-tree';
+    data.children.forEach(c => {
+      const li = document.createElement('li');
+      if (container.dataset.itemClass) li.className = container.dataset.itemClass;
+      if (c.has_children) li.appendChild(toggleButton(c.node));
+      let label;
+      if (c.href) {
+        label = document.createElement('a');
+        label.href = '/page/' + c.href;
+      } else {
+        label = document.createElement('span');
+        label.className = 'fw-semibold';
+      }
+      label.textContent = c.title || c.href || '';
+      li.appendChild(label);
+      ul.appendChild(li);
+    });
+    container.querySelectorAll(':scope > .tree-loading').forEach(el => el.remove());
+    if (data.children.length) {
+      container.appendChild(ul);
+    } else {
+      const p = document.createElement('p');
+      p.className = 'text-muted small mb-0';
+      p.textContent = 'No items.';
+      container.appendChild(p);
+    }
+  }
+
+  function load(node, container) {
+    if (container.dataset.loaded) return;
+    container.dataset.loaded = '1';
+    fetch('/modules/tree/' + node)
+      .then(r => r.json())
+      .then(d => renderChildren(container, d))
+      .catch(() => { delete container.dataset.loaded; });
+  }
+
+  document.addEventListener('click', e => {
+    const btn = e.target.closest('.tree-toggle');
+    if (!btn) return;
+    const li = btn.parentElement;
+    const expanded = btn.getAttribute('aria-expanded') === 'true';
+    btn.setAttribute('aria-expanded', expanded ? 'false' : 'true');
+    btn.innerHTML = expanded ? '&#9656;' : '&#9662;';
+    const ul = li.querySelector(':scope > ul');
+    if (ul) {
+      ul.hidden = expanded;
+    } else if (!expanded) {
+      load(btn.dataset.node, li);
+    }
+  });
+
+  // modules page: fill an accordion panel the first time it opens
+  document.querySelectorAll('[data-module-node]').forEach(panel => {
+    const body = panel.querySelector('.accordion-body');
+    const fill = () => load(panel.dataset.moduleNode, body);
+    panel.addEventListener('show.bs.collapse', fill);
+    if (panel.classList.contains('show')) fill();
+  });
+})();
@@ -0,0 +1,111 @@
+// Client-side search over the sharded index written by the static exporter
+// (canvas_viewer/search_shards.py).  A query fetches _search/index.json once
+// and then only the shards its terms fall into, and ranks pages with BM25
+// the way the viewer's /search does.
+(function () {
+  var K1 = 1.2, B = 0.75, TITLE_BOOST = 2.0, LIMIT = 20;
+
+  function tokenize(text) {
+    return ((text || '').toLowerCase().match(/[\p{L}\p{N}_]+/gu) || []);
+  }
+
+  // mirrors shard_key(): a-z/0-9 kept, anything else as _<hex code point>_
+  function shardKey(term, prefix) {
+    return Array.from(term).slice(0, prefix).map(function (c) {
+      return /[a-z0-9]/.test(c) ? c : '_' + c.codePointAt(0).toString(16) + '_';
+    }).join('');
+  }
+
+  function fetchJSON(url) {
+    return fetch(url).then(function (r) {
+      if (!r.ok) throw new Error(url + ': ' + r.status);
+      return r.json();
+    });
+  }
+
+  function SearchIndex(base) {
+    this.base = base;
+    this.meta = null;
+    this.shards = {};
+  }
+
+  SearchIndex.prototype.load = function () {
+    if (!this.meta) this.meta = fetchJSON(this.base + 'index.json');
+    return this.meta;
+  };
+
+  SearchIndex.prototype.shard = function (key) {
+    if (!(key in this.shards)) {
+      this.shards[key] = fetchJSON(this.base + 't/' + encodeURIComponent(key) + '.json');
+    }
+    return this.shards[key];
+  };
+
+  SearchIndex.prototype.search = function (query) {
+    var self = this;
+    var terms = Array.from(new Set(tokenize(query)));
+    return this.load().then(function (meta) {
+      var known = new Set(meta.shards);
+      var wanted = terms.filter(function (t) { return known.has(shardKey(t, meta.prefix)); });
+      return Promise.all(wanted.map(function (t) { return self.shard(shardKey(t, meta.prefix)); }))
+        .then(function (shards) {
+          var n = meta.docs.length, avg = meta.avg_length || 1, scores = new Map();
+          wanted.forEach(function (term, i) {
+            var plist = shards[i][term];
+            if (!plist) return;
+            var df = plist.length / 2;
+            var idf = Math.log(1 + (n - df + 0.5) / (df + 0.5));
+            for (var j = 0; j < plist.length; j += 2) {
+              var doc = plist[j], tf = plist[j + 1], len = meta.docs[doc][2];
+              var norm = tf * (K1 + 1) / (tf + K1 * (1 - B + B * len / avg));
+              scores.set(doc, (scores.get(doc) || 0) + idf * norm);
+            }
+          });
+          scores.forEach(function (score, doc) {
+            var title = new Set(tokenize(meta.docs[doc][1]));
+            terms.forEach(function (t) { if (title.has(t)) score += TITLE_BOOST; });
+            scores.set(doc, score);
+          });
+          return Array.from(scores).sort(function (a, b) { return b[1] - a[1] || a[0] - b[0]; })
+            .slice(0, LIMIT).map(function (e) {
+              return {href: meta.docs[e[0]][0], title: meta.docs[e[0]][1], score: e[1]};
+            });
+        });
+    });
+  };
+
+  function attach(form) {
+    var index = new SearchIndex(form.getAttribute('data-index'));
+    var root = form.getAttribute('data-root') || './';
+    var out = document.getElementById(form.getAttribute('data-results'));
+    var input = form.querySelector('input[type=search]');
+    form.addEventListener('submit', function (ev) {
+      ev.preventDefault();
+      index.search(input.value).then(function (results) {
+        out.textContent = '';
+        if (!results.length) {
+          out.textContent = input.value.trim() ? 'No results.' : '';
+          return;
+        }
+        var list = document.createElement('div');
+        list.className = 'list-group mb-3';
+        results.forEach(function (r) {
+          var a = document.createElement('a');
+          a.className = 'list-group-item list-group-item-action';
+          a.href = root + r.href;
+          a.textContent = r.title + ' ';
+          var path = document.createElement('small');
+          path.className = 'text-muted';
+          path.textContent = r.href;
+          a.appendChild(path);
+          list.appendChild(a);
+        });
+        out.appendChild(list);
+      }).catch(function () {
+        out.textContent = 'Search is not available.';
+      });
+    });
+  }
+
+  document.querySelectorAll('form[data-index]').forEach(attach);
+})();
@@ -0,0 +1,36 @@
+"""Jinja environment shared by the live viewer and the static exporter.
+
+Both load templates from canvas_viewer/templates (the exporter's own layouts
+live under templates/export/), and compiled templates are kept in a
+FileSystemBytecodeCache so a fresh process, e.g. an exporter worker, loads
+them instead of compiling them again.
+"""
+import functools
+import os
+
+import jinja2
+
+TEMPLATE_DIR = os.path.join(os.path.dirname(__file__), 'templates')
+
+
+def bytecode_cache(cache_dir=None):
+    """Return a bytecode cache in cache_dir/jinja (Jinja's per-user temp dir if cache_dir is None)."""
+    if cache_dir is None:
+        return jinja2.FileSystemBytecodeCache()
+    directory = os.path.join(cache_dir, 'jinja')
+    try:
+        os.makedirs(directory, exist_ok=True)
+    except OSError:
+        print(f"Warning: cannot create template cache {directory}; compiling templates in memory")
+        return None
+    return jinja2.FileSystemBytecodeCache(directory)
+
+
+@functools.lru_cache(maxsize=None)
+def export_environment(cache_dir=None):
+    """The exporter's environment: one per process (and cache_dir), so each template compiles once."""
+    return jinja2.Environment(
+        loader=jinja2.FileSystemLoader(TEMPLATE_DIR),
+        autoescape=jinja2.select_autoescape(['html']),
+        bytecode_cache=bytecode_cache(cache_dir),
+    )
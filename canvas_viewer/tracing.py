@@ -0,0 +1,297 @@
+"""Per-request tracing spans and sampled profiling of slow requests.
+
+span() and @traced record into the current Trace, if there is one.  The
+parser and the page pipeline are instrumented unconditionally: without a
+current trace a span costs a ContextVar lookup, so the exporter, which never
+starts a trace, pays nothing for them.
+
+A finished trace is handed to an exporter: LogExporter writes it as one JSON
+line (a structured log), OTLPExporter posts batches to an OpenTelemetry
+collector (OTLP/HTTP with JSON encoding, e.g. http://127.0.0.1:4318/v1/traces)
+from a background thread so requests never wait for the collector.
+
+SlowRequestProfiler runs cProfile over a request and keeps the profile only
+if the request took longer than a threshold.
+"""
+import contextlib
+import contextvars
+import cProfile
+import functools
+import json
+import os
+import queue
+import re
+import secrets
+import sys
+import threading
+import time
+import urllib.request
+
+TRACE_EXPORTERS = ('log', 'otlp')
+OTLP_ENDPOINT = 'http://127.0.0.1:4318/v1/traces'
+# OTLP span kinds
+_KIND_INTERNAL = 1
+_KIND_SERVER = 2
+
+_current = contextvars.ContextVar('canvas_trace', default=None)
+
+
+class Trace:
+    """The spans of one unit of work (a request); the trace itself is the root span."""
+
+    def __init__(self, name, **attrs):
+        self.trace_id = secrets.token_hex(16)
+        self.span_id = secrets.token_hex(8)
+        self.name = name
+        self.attrs = attrs
+        self.start_ns = time.time_ns()
+        self._t0 = time.perf_counter_ns()
+        self.duration_ns = None
+        # finished spans: {'span_id', 'parent_id', 'name', 'start_ns', 'duration_ns', 'attrs'}
+        self.spans = []
+        self._open = []
+
+    @contextlib.contextmanager
+    def span(self, name, **attrs):
+        parent = self._open[-1] if self._open else self.span_id
+        span_id = secrets.token_hex(8)
+        self._open.append(span_id)
+        start = time.perf_counter_ns()
+        try:
+            yield attrs
+        except BaseException as e:
+            attrs['error'] = type(e).__name__
+            raise
+        finally:
+            end = time.perf_counter_ns()
+            self._open.pop()
+            self.spans.append({'span_id': span_id, 'parent_id': parent, 'name': name,
+                               'start_ns': self.start_ns + start - self._t0, 'duration_ns': end - start,
+                               'attrs': attrs})
+
+    def finish(self, **attrs):
+        self.attrs.update(attrs)
+        if self.duration_ns is None:
+            self.duration_ns = time.perf_counter_ns() - self._t0
+
+    @property
+    def duration_ms(self):
+        ns = self.duration_ns if self.duration_ns is not None else time.perf_counter_ns() - self._t0
+        return ns / 1e6
+
+    def to_dict(self):
+        """The trace as a structured log record; span times are milliseconds from the start of the trace."""
+        return {
+            'trace_id': self.trace_id,
+            'name': self.name,
+            'start': self.start_ns / 1e9,
+            'duration_ms': round(self.duration_ms, 3),
+            'attrs': self.attrs,
+            'spans': [{'name': s['name'], 'id': s['span_id'], 'parent': s['parent_id'],
+                       'start_ms': round((s['start_ns'] - self.start_ns) / 1e6, 3),
+                       'duration_ms': round(s['duration_ns'] / 1e6, 3), **({'attrs': s['attrs']} if s['attrs'] else {})}
+                      for s in sorted(self.spans, key=lambda s: s['start_ns'])],
+        }
+
+
+def current_trace():
+    return _current.get()
+
+
+def activate(trace):
+    """Make trace the current one; returns a token for deactivate()."""
+    return _current.set(trace)
+
+
+def deactivate(token):
+    try:
+        _current.reset(token)
+    except ValueError:
+        # reset from another context (a streamed response finishing elsewhere)
+        _current.set(None)
+
+
+@contextlib.contextmanager
+def span(name, **attrs):
+    """Record the block as a span of the current trace (a no-op without one); yields the span's attrs."""
+    trace = _current.get()
+    if trace is None:
+        yield attrs
+        return
+    with trace.span(name, **attrs) as span_attrs:
+        yield span_attrs
+
+
+def traced(name):
+    """Decorator: record every call of the function as a span called name."""
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            trace = _current.get()
+            if trace is None:
+                return fn(*args, **kwargs)
+            with trace.span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+class LogExporter:
+    """Write each trace as a JSON line to a file (appended) or to stderr."""
+
+    def __init__(self, path=None):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def export(self, trace):
+        line = json.dumps(trace.to_dict(), default=str) + '\n'
+        with self._lock:
+            if self.path:
+                with open(self.path, 'a', encoding='utf-8') as fh:
+                    fh.write(line)
+            else:
+                sys.stderr.write(line)
+
+    def close(self):
+        pass
+
+
+def _otlp_value(value):
+    if isinstance(value, bool):
+        return {'boolValue': value}
+    if isinstance(value, int):
+        return {'intValue': str(value)}
+    if isinstance(value, float):
+        return {'doubleValue': value}
+    return {'stringValue': str(value)}
+
+
+def _otlp_attrs(attrs):
+    return [{'key': k, 'value': _otlp_value(v)} for k, v in attrs.items() if v is not None]
+
+
+def otlp_spans(trace):
+    """The trace's spans in OTLP JSON form, root span first."""
+    root = {
+        'traceId': trace.trace_id, 'spanId': trace.span_id, 'name': trace.name, 'kind': _KIND_SERVER,
+        'startTimeUnixNano': str(trace.start_ns), 'endTimeUnixNano': str(trace.start_ns + (trace.duration_ns or 0)),
+        'attributes': _otlp_attrs(trace.attrs),
+    }
+    if trace.attrs.get('error'):
+        root['status'] = {'code': 2, 'message': str(trace.attrs['error'])}
+    spans = [root]
+    for s in trace.spans:
+        out = {'traceId': trace.trace_id, 'spanId': s['span_id'], 'parentSpanId': s['parent_id'], 'name': s['name'],
+               'kind': _KIND_INTERNAL, 'startTimeUnixNano': str(s['start_ns']),
+               'endTimeUnixNano': str(s['start_ns'] + s['duration_ns']), 'attributes': _otlp_attrs(s['attrs'])}
+        if s['attrs'].get('error'):
+            out['status'] = {'code': 2, 'message': str(s['attrs']['error'])}
+        spans.append(out)
+    return spans
+
+
+class OTLPExporter:
+    """Post traces to an OTLP/HTTP (JSON) collector in batches from a background thread.
+
+    Traces are queued (up to max_queue; beyond that they are dropped) and sent
+    every interval seconds or once batch_size are waiting.  A collector that is
+    down costs a warning, not a slow request.
+    """
+
+    def __init__(self, endpoint=OTLP_ENDPOINT, service='canvas-viewer', batch_size=64, interval=1.0,
+                 max_queue=2048, timeout=2.0):
+        self.endpoint = endpoint
+        self.service = service
+        self.batch_size = batch_size
+        self.interval = interval
+        self.timeout = timeout
+        self.dropped = 0
+        self._queue = queue.Queue(max_queue)
+        self._warned = False
+        self._thread = threading.Thread(target=self._run, name='otlp-exporter', daemon=True)
+        self._thread.start()
+
+    def export(self, trace):
+        try:
+            self._queue.put_nowait(trace)
+        except queue.Full:
+            self.dropped += 1
+
+    def payload(self, traces):
+        return {'resourceSpans': [{
+            'resource': {'attributes': _otlp_attrs({'service.name': self.service})},
+            'scopeSpans': [{'scope': {'name': 'canvas_viewer'},
+                            'spans': [s for t in traces for s in otlp_spans(t)]}],
+        }]}
+
+    def _send(self, traces):
+        body = json.dumps(self.payload(traces)).encode('utf-8')
+        req = urllib.request.Request(self.endpoint, data=body, headers={'Content-Type': 'application/json'})
+        try:
+            with urllib.request.urlopen(req, timeout=self.timeout) as resp:
+                resp.read()
+        except OSError as e:
+            self.dropped += len(traces)
+            if not self._warned:
+                print(f"Warning: could not send traces to {self.endpoint}: {e}")
+                self._warned = True
+
+    def _run(self):
+        closing = False
+        while not closing:
+            batch = []
+            deadline = time.monotonic() + self.interval
+            while len(batch) < self.batch_size:
+                try:
+                    item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if item is None:
+                    closing = True
+                    break
+                batch.append(item)
+            if batch:
+                self._send(batch)
+
+    def close(self):
+        """Send what is queued and stop the background thread."""
+        self._queue.put(None)
+        self._thread.join(self.timeout + self.interval)
+
+
+def trace_exporter(kind, target=None):
+    """The exporter for kind ('log': JSON lines to target or stderr; 'otlp': a collector at target)."""
+    if kind == 'log':
+        return LogExporter(target)
+    if kind == 'otlp':
+        return OTLPExporter(target or OTLP_ENDPOINT)
+    raise ValueError(f"unknown trace exporter {kind!r}; expected one of {', '.join(TRACE_EXPORTERS)}")
+
+
+class SlowRequestProfiler:
+    """cProfile a request and keep the profile (a .prof file in directory) if it took threshold_ms or longer."""
+
+    def __init__(self, directory, threshold_ms=200.0):
+        self.directory = directory
+        self.threshold_ms = threshold_ms
+
+    def start(self):
+        """An enabled cProfile.Profile, or None if another profiler is already active."""
+        prof = cProfile.Profile()
+        try:
+            prof.enable()
+        except ValueError:
+            return None
+        return prof
+
+    def finish(self, prof, name, duration_ms):
+        """Stop prof and save it if the request was slow; returns the file's path or None."""
+        prof.disable()
+        if duration_ms < self.threshold_ms:
+            return None
+        os.makedirs(self.directory, exist_ok=True)
+        slug = re.sub(r'[^A-Za-z0-9_.-]+', '_', name).strip('_')[:80] or 'root'
+        path = os.path.join(self.directory,
+                            f'{time.strftime("%Y%m%d-%H%M%S")}-{duration_ms:.0f}ms-{slug}-{secrets.token_hex(3)}.prof')
+        prof.dump_stats(path)
+        return path
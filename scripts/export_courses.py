@@ -2,373 +2,1366 @@
 """Export courses into a static site suitable for GitHub Pages.
 
 This script will:
-- Unzip any .zip or .imscc files found in the courses directory (into sibling folders)
-- For each extracted course folder containing imsmanifest.xml, build a minimal
-  static export: copy wiki_content and web_resources into the output and write
-  a simple index.html listing pages, files and modules.
+- Find every course in the courses directory: folders containing imsmanifest.xml
+  and .imscc/.zip packages, which are read in place rather than extracted
+- For each course, build a minimal static export: copy wiki_content and
+  web_resources into the output and write a simple index.html listing pages,
+  files and modules.
 
 The output directory will contain one subfolder per course and a root index.html.
+Courses are independent, so --jobs N builds them in a pool of worker processes.
+Every build records input and output hashes in <output>/.build-manifest.json;
+--incremental uses it to skip unchanged courses and files.
 """
 import argparse
+import contextlib
+import cProfile
+import hashlib
+import io
+import json
 import os
+import re
 import shutil
-import zipfile
+import sys
+import threading
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from pathlib import Path
 
+from canvas_viewer.archive import ArchiveReader, extract_members, is_archive
+from canvas_viewer.copying import COPY_STRATEGIES, copy_files, temp_name
+from canvas_viewer.dedup import DEDUP_MODES, ContentStore
+from canvas_viewer.memory import AllocationTracer
 from canvas_viewer.parser import CanvasExport
+from canvas_viewer.refgraph import build_reference_graph
+from canvas_viewer.rendering import StaticLinks, render_page
+from canvas_viewer.search import page_text, tokenize
+from canvas_viewer.search_shards import SEARCH_DIR, ShardedIndexWriter
+from canvas_viewer.site_archive import SITE_ARCHIVE_FORMATS, SiteArchive, site_archive_format
+from canvas_viewer.templating import export_environment
 from lxml import html as lh
-import jinja2
+from markupsafe import Markup
 
+STATIC_SRC_DIR = Path(__file__).resolve().parents[1] / 'canvas_viewer' / 'static'
+COPY_DIRS = ('wiki_content', 'web_resources', 'course_settings')
+COPY_CHUNK = 1024 * 1024
+# inputs that feed the rendered index/pages/modules listings
+STRUCTURE_INPUTS = {'imsmanifest.xml', 'course_settings/course_settings.xml', 'course_settings/files_meta.xml'}
+RENDERED_OUTPUTS = ('index.html', 'pages.html', 'files.html', 'modules.html')
+# the course search index is replaced as a whole; the manifest tracks it through index.json
+SEARCH_INDEX = SEARCH_DIR + '/index.json'
+# pages are tokenized this many at a time, so the text of the whole course is never held at once
+SEARCH_BATCH = 64
+# pages are rendered this many at a time; courses with fewer than PAGE_POOL_MIN
+# pages to render skip the process pool, which costs more to start than it saves
+PAGE_BATCH = 256
+PAGE_POOL_MIN = 32
+# per-course input/output hashes from the last build, used by incremental builds
+BUILD_MANIFEST = '.build-manifest.json'
+# 2: pages are rendered into the viewer layout instead of only getting the CSS link
+BUILD_MANIFEST_VERSION = 2
+# content-addressed store shared by all courses when building with --dedup
+STORE_DIR = '_store'
+# the <head> tag must turn up this early for the byte-level CSS injection
+HEAD_SCAN_BYTES = 64 * 1024
+HEAD_RE = re.compile(rb'<head(?:\s[^>]*)?>', re.IGNORECASE)
+HEAD_CLOSE_RE = re.compile(rb'</head\s*>', re.IGNORECASE)
 
-def unzip_archives(courses_dir: Path):
-    for p in courses_dir.iterdir():
-        if p.is_file() and p.suffix.lower() in ('.zip', '.imscc'):
-            dest = courses_dir / p.stem
-            if dest.exists():
-                print(f"Skipping unzip; destination exists: {dest}")
-                continue
-            print(f"Unzipping {p} -> {dest}")
-            dest.mkdir(parents=True, exist_ok=True)
-            try:
-                with zipfile.ZipFile(p, 'r') as z:
-                    z.extractall(dest)
-            except zipfile.BadZipFile:
-                print(f"Warning: {p} is not a valid zip; skipping")
 
+def _map_threads(fn, items, workers=None):
+    """list(map(fn, items)), on a thread pool when there is more than one item."""
+    items = list(items)
+    workers = workers or min(8, (os.cpu_count() or 1) * 2)
+    if workers <= 1 or len(items) <= 1:
+        return [fn(item) for item in items]
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(fn, items))
+
+
+def _course_name(path: Path):
+    """Output folder name of a course: the folder's name, or a package's name without .imscc/.zip."""
+    return path.stem if is_archive(path) else path.name
+
+
+def find_courses(courses_dir: Path):
+    """Return the course folders and packages under courses_dir, sorted by course name.
+
+    A package wins over a folder of the same name (e.g. one left over from
+    extracting it by hand), so the build always reflects the package.
+    """
+    courses = {}
+    for p in sorted(courses_dir.iterdir()):
+        if p.is_dir() and (p / 'imsmanifest.xml').exists():
+            courses.setdefault(p.name, p)
+        elif p.is_file() and is_archive(p):
+            if p.stem in courses and courses[p.stem].is_dir():
+                print(f"Ignoring folder {courses[p.stem]}; building from {p}")
+            courses[p.stem] = p
+    return [courses[name] for name in sorted(courses)]
 
-def build_course(export_path: Path, out_path: Path):
-    try:
-        exp = CanvasExport(str(export_path))
-    except Exception as e:
-        print(f"Skipping {export_path}: failed to parse manifest: {e}")
-        return
 
-    name = exp.title or export_path.name
-    print(f"Building course '{name}' from {export_path}")
-    course_out = out_path / export_path.name
-    course_out.mkdir(parents=True, exist_ok=True)
+def _stat(path):
+    st = os.stat(path)
+    return [st.st_size, st.st_mtime_ns]
 
-    # copy wiki_content and web_resources if present
-    for sub in ('wiki_content', 'web_resources', 'course_settings'):
+
+def _file_sha256(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as fh:
+        for chunk in iter(lambda: fh.read(COPY_CHUNK), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _scan_inputs(export_path: Path, archive=None):
+    """Return {output relpath: source} for every file a course build copies.
+
+    Sources are paths, or for a package (archive is its ArchiveReader) member names.
+    """
+    sources = {}
+    if archive is not None:
+        for name in sorted(archive.members):
+            if name.split('/', 1)[0] in COPY_DIRS:
+                sources[name] = name
+    for sub in COPY_DIRS if archive is None else ():
         src = export_path / sub
-        if src.exists():
-            dst = course_out / sub
-            if dst.exists():
-                shutil.rmtree(dst)
-            print(f"Copying {src} -> {dst}")
-            shutil.copytree(src, dst)
-
-    # gather pages/files/modules for rendering the richer template below
-    pages = exp.list_pages()
-    files = exp.get_files()
-    modules = exp.get_modules()
-
-    # gather metadata for use in templates and return value
-    metadata = exp.get_course_metadata() or {}
-
-    # Render a richer static index using a small Jinja2 template that mimics
-    # the interactive viewer but uses local paths for static assets and pages.
+        if src.is_dir():
+            for f in sorted(src.rglob('*')):
+                if f.is_file():
+                    sources[f.relative_to(export_path).as_posix()] = f
+    if STATIC_SRC_DIR.is_dir():
+        for f in sorted(STATIC_SRC_DIR.rglob('*')):
+            if f.is_file():
+                sources['_static/' + f.relative_to(STATIC_SRC_DIR).as_posix()] = f
+    return sources
+
+
+def inject_css_bytes(raw: bytes, css_href: str):
+    """Return raw with a <link> to the viewer stylesheet inserted into its <head>.
+
+    Returns None when the head already links canvas_viewer.css.  Documents with
+    a plain <head> tag (no comment ahead of it that could hide a fake one) get
+    the link spliced in right after the tag, leaving every other byte as it
+    was; anything else is parsed and reserialized with lxml.
+    """
+    link = f'<link rel="stylesheet" href="{css_href}">'.encode('utf-8')
+    window = raw[:HEAD_SCAN_BYTES]
+    m = HEAD_RE.search(window)
+    if m and b'<!--' not in window[:m.start()]:
+        close = HEAD_CLOSE_RE.search(raw, m.end())
+        head = raw[m.end():close.start() if close else m.end() + HEAD_SCAN_BYTES]
+        if b'canvas_viewer.css' in head:
+            return None
+        return raw[:m.end()] + link + raw[m.end():]
+
+    doc = lh.document_fromstring(raw).getroottree()
+    head = doc.find('.//head')
+    if head is None:
+        head = lh.Element('head')
+        doc.getroot().insert(0, head)
+    if head.xpath("link[contains(@href, 'canvas_viewer.css')]"):
+        return None
+    head.insert(0, lh.Element('link', rel='stylesheet', href=css_href))
+    return lh.tostring(doc, encoding='utf-8', pretty_print=True, doctype='<!DOCTYPE html>')
+
+
+def inject_page_bytes(raw: bytes, css_href: str, rewrite=None, name=''):
+    """raw after rewrite (if given) and CSS injection; pages that cannot be parsed come back as they were."""
+    if rewrite is not None:
+        raw = rewrite(raw)
     try:
-        assets = []
-        # combine pages and files for a simplified asset listing
-        for p in exp.list_pages():
-            assets.append({'title': p.get('title') or p.get('href'), 'href': p.get('href'), 'type': 'page'})
-        for f in exp.get_files():
-            assets.append({'title': f.get('title') or f.get('href'), 'href': f.get('href'), 'type': 'file'})
+        data = inject_css_bytes(raw, css_href)
+    except Exception:
+        print(f"Warning: failed to inject CSS into {name}; copying as is")
+        data = None
+    return raw if data is None else data
 
-        external_tools = exp.detect_external_tools() or []
-        has_external_tools = bool(external_tools)
 
-        modules = exp.get_modules() or []
+def _write_atomic(path: Path, data: bytes):
+    """Write data to path through a temporary file, so readers never see a partial file."""
+    tmp = temp_name(path)
+    with open(tmp, 'wb') as fh:
+        fh.write(data)
+    os.replace(tmp, path)
+
+
+def _templates():
+    """The process-wide template environment; its bytecode cache honours CANVAS_CACHE_DIR."""
+    return export_environment(os.environ.get('CANVAS_CACHE_DIR'))
+
+
+class PageRenderer:
+    """Renders a course's pages the way the viewer's /page route does, with links relative to each page.
+
+    nav holds the navbar's section flags and sidebar the top level of the
+    module tree (export.tree_children(0)); the nav and sidebar fragments are
+    rendered once per page directory.  Instances are picklable, so each
+    process of a PagePool gets its own copy.
+    """
+
+    def __init__(self, nav, sidebar, syllabus=None):
+        self.nav = nav
+        self.sidebar = sidebar
+        self.syllabus = syllabus
+        self._fragments = {}
+
+    def __getstate__(self):
+        return {'nav': self.nav, 'sidebar': self.sidebar, 'syllabus': self.syllabus, '_fragments': {}}
+
+    def fragments(self, link):
+        if link.base not in self._fragments:
+            templates = _templates()
+            nav = Markup(templates.get_template('_nav.html').render(nav=self.nav, link=link))
+            sidebar = Markup(templates.get_template('_sidebar.html').render(items=self.sidebar, link=link)) \
+                if self.sidebar else Markup('')
+            self._fragments[link.base] = (nav, sidebar)
+        return self._fragments[link.base]
+
+    def __call__(self, rel, raw):
+        """The rendered page as bytes, or None if raw cannot be parsed."""
+        link = StaticLinks(rel, self.syllabus)
+        nav, sidebar = self.fragments(link)
+        out = render_page(_templates(), raw, rel, link, nav=self.nav,
+                          nav_fragment=lambda: nav, sidebar_fragment=lambda: sidebar)
+        return None if out is None else out.encode('utf-8')
+
+
+_page_renderer = None
+
+
+def _init_page_worker(renderer):
+    global _page_renderer
+    _page_renderer = renderer
+
+
+def _render_page_item(item):
+    return _page_renderer(*item)
+
+
+class PagePool:
+    """Maps a PageRenderer over (rel, raw) pairs on workers processes (in process for workers <= 1)."""
+
+    def __init__(self, renderer, workers=1):
+        self.renderer = renderer
+        self.workers = workers
+        self._pool = None
+        if workers > 1:
+            self._pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_page_worker,
+                                             initargs=(renderer,))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        if self._pool is not None:
+            self._pool.shutdown(cancel_futures=True)
+
+    def map(self, items):
+        """Rendered bytes (or None) per item, in order."""
+        items = list(items)
+        if self._pool is None:
+            return [self.renderer(rel, raw) for rel, raw in items]
+        chunksize = max(1, len(items) // (self.workers * 4))
+        return list(self._pool.map(_render_page_item, items, chunksize=chunksize))
 
-        nav = {
+
+class BuildProfile:
+    """Wall time, bytes written and files written per build stage."""
+
+    def __init__(self):
+        self.stages = {}
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        rec = self.stages.setdefault(name, {'seconds': 0.0, 'bytes': 0, 'files': 0})
+        t0 = time.perf_counter()
+        try:
+            yield rec
+        finally:
+            rec['seconds'] += time.perf_counter() - t0
+
+    def to_dict(self):
+        return {name: dict(rec, seconds=round(rec['seconds'], 6)) for name, rec in self.stages.items()}
+
+
+class CourseBuild:
+    """One course build, split into stages that each hand their results to the next.
+
+    scan    stat (and, where the stat moved, hash) the inputs; an untouched
+            course stops here on incremental builds.  Members of a package are
+            compared by size and CRC-32 instead, and hashed as they are written
+    parse   parse the manifest and course settings
+    graph   build the asset reference graph (only with only_referenced or refs_report)
+    copy    copy non-HTML files and delete outputs whose inputs are gone
+    inject  render each HTML page in the viewer's page layout, as the live
+            viewer's /page route would, with links made relative; pages that
+            cannot be parsed only get the viewer CSS link.  On page_workers
+            processes for courses with PAGE_POOL_MIN pages or more
+    render  compute the pages/files/modules views once and render the listings
+    search  stream the text of every exported page into the course's sharded
+            search index (only when search is on and a page changed)
+
+    Each stage is timed into self.profile along with the bytes and files it wrote.
+    """
+
+    def __init__(self, export_path: Path, out_path: Path, prev=None, copy_strategy='copy', copy_workers=None,
+                 dedup=None, only_referenced=False, refs_report=False, search=True, page_workers=1):
+        self.export_path = export_path
+        self.name = _course_name(export_path)
+        self.course_out = out_path / self.name
+        self.static_dst = self.course_out / '_static'
+        self.prev = prev or {}
+        self.prev_inputs = self.prev.get('inputs') or {}
+        self.prev_outputs = self.prev.get('outputs') or {}
+        self.copy_strategy = copy_strategy
+        self.copy_workers = copy_workers
+        # web_resources files go through the site's content store, and the outputs link to it
+        self.store = ContentStore(out_path / STORE_DIR, dedup) if dedup else None
+        # only_referenced leaves out web_resources files no page or module uses
+        self.only_referenced = only_referenced
+        self.refs_report = refs_report
+        self.search = search
+        self.page_workers = page_workers
+        self.graph = None
+        self.unreferenced = set()
+        self.stats = {'skipped': 0, 'copied': 0, 'rendered': 0, 'deleted': 0}
+        self.profile = BuildProfile()
+        self.sources = {}
+        self.inputs = {}
+        self.outputs = {}
+        self.changed = set()
+        self.archive = None
+        self.exp = None
+        self._views = None
+
+    def run(self):
+        try:
+            return self._run()
+        finally:
+            for archive in (self.archive, self.exp and self.exp.archive):
+                if archive is not None:
+                    archive.close()
+
+    def _run(self):
+        t0 = time.perf_counter()
+        with self.profile.stage('scan'):
+            unchanged = self.scan()
+        if unchanged:
+            print(f"Unchanged: {self.name}; skipping")
+            self.stats['skipped'] = len(self.prev_outputs)
+            if self.refs_report:
+                with self.profile.stage('graph'):
+                    self.exp = CanvasExport(str(self.export_path))
+                    self.build_graph()
+            return self._result(self.prev['meta'], self.prev_inputs, self.prev_outputs, t0)
+        with self.profile.stage('parse'):
+            meta = self.parse()
+        if self.only_referenced or self.refs_report:
+            with self.profile.stage('graph'):
+                self.build_graph()
+        with self.profile.stage('copy') as rec:
+            pages = self.copy(rec)
+        with self.profile.stage('inject') as rec:
+            self.inject(pages, rec)
+        with self.profile.stage('render') as rec:
+            self.render(meta['title'], meta['metadata'], rec)
+        if self.search:
+            with self.profile.stage('search') as rec:
+                self.index_pages(rec)
+        elif (self.course_out / SEARCH_DIR).exists():
+            # left over from a build with search on
+            shutil.rmtree(self.course_out / SEARCH_DIR)
+        print(f"{self.name}: {self.stats['copied']} copied, {self.stats['rendered']} rendered, "
+              f"{self.stats['skipped']} skipped, {self.stats['deleted']} deleted")
+        return self._result(meta, self.inputs, self.outputs, t0)
+
+    def _result(self, meta, inputs, outputs, t0):
+        # course metadata for the root index, the course's build-manifest entry and its profile
+        profile = {'seconds': round(time.perf_counter() - t0, 6), 'stages': self.profile.to_dict()}
+        result = dict(meta, build={'inputs': inputs, 'outputs': outputs}, stats=self.stats, profile=profile)
+        if self.refs_report:
+            result['refs'] = self.refs()
+        return result
+
+    def build_graph(self):
+        files = [rel for rel in self.sources if not rel.startswith('_static/')]
+        self.graph = build_reference_graph(self.exp, files, workers=self.copy_workers)
+        if self.only_referenced:
+            self.unreferenced = {rel for rel in self.graph.orphans() if rel.startswith('web_resources/')}
+            if self.unreferenced:
+                print(f"{self.name}: leaving out {len(self.unreferenced)} unreferenced files")
+
+    def refs(self):
+        """The course's orphan report: unreferenced files, broken links and which pages use each file."""
+        sizes = {rel: self.input_stat(src)[0] for rel, src in self.sources.items()}
+        orphans = [{'path': rel, 'bytes': sizes[rel]} for rel in self.graph.orphans()]
+        return {
+            'orphans': orphans,
+            'orphan_bytes': sum(o['bytes'] for o in orphans),
+            'missing': self.graph.missing(),
+            'used_by': {rel: self.graph.used_by(rel) for rel in sorted(self.graph.files)
+                        if rel.startswith('web_resources/') and self.graph.used_by(rel)},
+        }
+
+    def outputs_intact(self, records):
+        for rel, rec in records.items():
+            try:
+                if _stat(self.course_out / rel) != rec[:2]:
+                    return False
+            except OSError:
+                return False
+        return True
+
+    def record_output(self, rel, sha, rec):
+        self.outputs[rel] = _stat(self.course_out / rel) + [sha]
+        rec['bytes'] += self.outputs[rel][0]
+        rec['files'] += 1
+
+    def input_stat(self, src):
+        if isinstance(src, str):
+            info = self.archive.members[src]
+            return [info.file_size, info.CRC]
+        return _stat(src)
+
+    def scan(self):
+        """Return True if every input and output is as the previous build left it."""
+        if is_archive(self.export_path):
+            self.archive = ArchiveReader(self.export_path)
+            if 'imsmanifest.xml' not in self.archive:
+                raise FileNotFoundError(f"imsmanifest.xml not found in {self.export_path}")
+            manifest_file = 'imsmanifest.xml'
+        else:
+            manifest_file = self.export_path / 'imsmanifest.xml'
+        self.sources = _scan_inputs(self.export_path, self.archive)
+        current = {rel: self.input_stat(src) for rel, src in self.sources.items()}
+        current['imsmanifest.xml'] = self.input_stat(manifest_file)
+        prev_inputs = self.prev_inputs
+        if self.prev.get('meta') and set(current) == set(prev_inputs) \
+                and all(prev_inputs[rel][:2] == st for rel, st in current.items()) \
+                and self.outputs_intact(self.prev_outputs):
+            return True
+        # inputs whose size/mtime moved are re-hashed (in parallel); a touched but
+        # identical file still counts as unchanged
+        to_hash = []
+        for rel, st in current.items():
+            old = prev_inputs.get(rel)
+            if old and old[:2] == st:
+                self.inputs[rel] = old
+                continue
+            src = self.sources.get(rel, manifest_file)
+            if isinstance(src, str):
+                # a different size or CRC means different content; the hash is taken on extraction
+                self.inputs[rel] = st + [None]
+                self.changed.add(rel)
+                continue
+            to_hash.append((rel, src))
+        shas = _map_threads(lambda item: _file_sha256(item[1]), to_hash, self.copy_workers)
+        for (rel, src), sha in zip(to_hash, shas):
+            old = prev_inputs.get(rel)
+            self.inputs[rel] = current[rel] + [sha]
+            if not old or old[2] != sha:
+                self.changed.add(rel)
+        return False
+
+    def parse(self):
+        self.exp = CanvasExport(str(self.export_path))
+        name = self.exp.title or self.name
+        print(f"Building course '{name}' from {self.export_path}")
+        return {'name': self.name, 'title': name, 'metadata': self.exp.get_course_metadata() or {}}
+
+    def copy(self, rec):
+        """Copy changed non-HTML inputs and drop stale outputs; returns the HTML pages left for inject."""
+        self.course_out.mkdir(parents=True, exist_ok=True)
+        # rendered pages carry the nav and module sidebar, so they follow the structure like the listings
+        relayout = self.structure_changed()[0]
+        to_copy = []
+        for rel in self.sources:
+            if rel in self.unreferenced:
+                continue
+            prev = self.prev_outputs.get(rel)
+            if relayout and self.is_page(rel):
+                to_copy.append(rel)
+                continue
+            if rel not in self.changed and prev and self.outputs_intact({rel: prev}):
+                self.outputs[rel] = prev
+                self.stats['skipped'] += 1
+                continue
+            to_copy.append(rel)
+        pages = [rel for rel in to_copy if self.is_page(rel)]
+        page_set = set(pages)
+        rest = [rel for rel in to_copy if rel not in page_set]
+        stored = [rel for rel in rest if rel.startswith('web_resources/')] if self.store else []
+        if stored:
+            rest = [rel for rel in rest if not rel.startswith('web_resources/')]
+        others = [rel for rel in rest if not isinstance(self.sources[rel], str)]
+        members = [rel for rel in rest if isinstance(self.sources[rel], str)]
+        methods = copy_files(((self.sources[rel], self.course_out / rel) for rel in others),
+                             strategy=self.copy_strategy, workers=self.copy_workers)
+        for rel in others:
+            # copies are byte-identical, so the output hash is the input hash
+            self.record_output(rel, self.inputs[rel][2], rec)
+        # package members are streamed straight from the archive to their output
+        shas = extract_members(self.archive, ((rel, self.course_out / rel) for rel in members), workers=self.copy_workers)
+        for rel, sha in zip(members, shas):
+            self.record_output(rel, sha, rec)
+        if members:
+            methods['extract'] = len(members)
+        for rel, sha, method in _map_threads(self.store_file, stored, self.copy_workers):
+            self.record_output(rel, sha, rec)
+            methods['store-' + method] = methods.get('store-' + method, 0) + 1
+        self.stats['copied'] += len(others) + len(members) + len(stored)
+        if methods:
+            print(f"{self.name}: copied via " + ', '.join(f"{m}={n}" for m, n in sorted(methods.items())))
+
+        for rel in self.prev_outputs:
+            if rel not in self.outputs and rel not in page_set and rel not in RENDERED_OUTPUTS and rel != SEARCH_INDEX:
+                try:
+                    (self.course_out / rel).unlink()
+                    self.stats['deleted'] += 1
+                except OSError:
+                    pass
+        return pages
+
+    def store_file(self, rel):
+        """Put a web_resources file in the content store and link its output to the blob."""
+        src = self.sources[rel]
+        ext = os.path.splitext(rel)[1]
+        if isinstance(src, str):
+            with self.archive.open(src) as fin:
+                sha, blob = self.store.add_stream(fin, ext)
+        else:
+            sha = self.inputs[rel][2]
+            blob = self.store.add_file(src, sha, ext, strategy=self.copy_strategy)
+        return rel, sha, self.store.link(blob, self.course_out / rel)
+
+    @staticmethod
+    def is_page(rel):
+        return rel.lower().endswith('.html') and not rel.startswith('_static/')
+
+    def structure_changed(self):
+        """(structure changed, files changed): whether the listings, nav and sidebar and whether files.html are stale."""
+        # listings depend on the manifest and course settings; files.html also shows file dates
+        structure_changed = bool(self.changed & STRUCTURE_INPUTS) or set(self.inputs) != set(self.prev_inputs)
+        files_changed = structure_changed or any(rel.startswith('web_resources/') for rel in self.changed)
+        if self.only_referenced:
+            # an edited page can add or drop references, which changes the listed files
+            scanned = any(rel.lower().endswith(('.html', '.htm', '.xml')) for rel in self.changed)
+            structure_changed = structure_changed or scanned
+            files_changed = files_changed or scanned
+        return structure_changed, files_changed
+
+    def course_views(self):
+        """(pages, files, modules) as listed in this build, computed once."""
+        if self._views is None:
+            exp = self.exp
+            pages = exp.list_pages()
+            files = exp.get_files()
+            if self.unreferenced:
+                pages = [p for p in pages if p.get('href') not in self.unreferenced]
+                files = [f for f in files if f.get('href') not in self.unreferenced]
+            self._views = pages, files, exp.get_modules() or []
+        return self._views
+
+    def nav_flags(self):
+        pages, files, modules = self.course_views()
+        return {
             'home': True,
-            'syllabus': bool(exp.get_syllabus()),
+            'syllabus': bool(self.exp.get_syllabus()),
             'announcements': False,
             'modules': bool(modules),
-            'pages': bool(exp.list_pages()),
-            'files': bool(exp.get_files()),
+            'pages': bool(pages),
+            'files': bool(files),
             'quizzes': False,
             'discussions': False,
             'people': False,
         }
 
-        tmpl = jinja2.Template(r"""<!doctype html>
-<html lang="en">
-    <head>
-        <meta charset="utf-8" />
-        <meta name="viewport" content="width=device-width, initial-scale=1">
-        <title>{{ title }}</title>
-        <link href="https://cdn.jsdelivr.net/npm/bootstrap@5.3.2/dist/css/bootstrap.min.css" rel="stylesheet">
-        <link rel="stylesheet" href="./_static/canvas_viewer.css" />
-    </head>
-    <body>
-        <nav class="navbar navbar-expand-lg navbar-light bg-light mb-3">
-            <div class="container-fluid">
-                <a class="navbar-brand" href="../index.html">Canvas Viewer</a>
-                <div class="collapse navbar-collapse">
-                    <ul class="navbar-nav me-auto mb-2 mb-lg-0">
-                        {% if nav.home %}<li class="nav-item"><a class="nav-link" href="./index.html">Home</a></li>{% endif %}
-                        {% if nav.syllabus %}<li class="nav-item"><a class="nav-link" href="./course_settings/syllabus.html">Syllabus</a></li>{% endif %}
-                        {% if nav.modules %}<li class="nav-item"><a class="nav-link" href="./index.html#modules">Modules</a></li>{% endif %}
-                        {% if nav.pages %}<li class="nav-item"><a class="nav-link" href="./wiki_content/homepage.html">Pages</a></li>{% endif %}
-                        {% if nav.files %}<li class="nav-item"><a class="nav-link" href="./index.html#files">Files</a></li>{% endif %}
-                    </ul>
-                </div>
-            </div>
-        </nav>
-
-        <main class="container">
-            <div class="row">
-                <section class="col-12">
-                    <div class="card mb-3">
-                        <div class="card-body d-flex">
-                            <div class="me-3">
-                                {% if metadata.image_href %}
-                                    <img src="./{{ metadata.image_href }}" alt="Course image" style="max-width:150px; height:auto;"/>
-                                {% endif %}
-                            </div>
-                            <div>
-                                <h2 class="h5">{{ metadata.title or title }}</h2>
-                                <p class="mb-1"><strong>Course code:</strong> {{ metadata.course_code or '—' }}</p>
-                                <p class="mb-1"><strong>Start:</strong> {{ metadata.start_at or '—' }} <strong>End:</strong> {{ metadata.conclude_at or '—' }}</p>
-                                <p class="mb-0"><strong>License:</strong> {{ metadata.license or '—' }} <strong>Storage:</strong> {{ metadata.storage_quota or '—' }}</p>
-                            </div>
-                        </div>
-                    </div>
-
-                    <div class="card">
-                        <div class="card-header">All Assets</div>
-                        {% if has_external_tools %}
-                            <div class="card-body">
-                                <div class="alert alert-warning mb-0">
-                                    <strong>Warning:</strong> This export references external tool integrations that may host course content outside the export. Detected: {{ external_tools | join(', ') }}
-                                </div>
-                            </div>
-                        {% endif %}
-                        <div class="table-responsive">
-                            <table class="table table-striped table-hover mb-0">
-                                <thead><tr><th>Name</th><th>Path</th></tr></thead>
-                                <tbody>
-                                    {% for a in assets %}
-                                        <tr>
-                                            <td>{{ a.title or a.href }}</td>
-                                            <td>
-                                                {% if a.type == 'page' %}
-                                                    <a href="./{{ a.href }}">{{ a.href }}</a>
-                                                {% else %}
-                                                    <a href="./{{ a.href }}">{{ a.href }}</a>
-                                                {% endif %}
-                                            </td>
-                                        </tr>
-                                    {% endfor %}
-                                </tbody>
-                            </table>
-                        </div>
-                    </div>
-                </section>
-            </div>
-        </main>
-
-        <script src="https://cdn.jsdelivr.net/npm/bootstrap@5.3.2/dist/js/bootstrap.bundle.min.js"></script>
-    </body>
-</html>""")
-
-        rendered = tmpl.render(title=name, metadata=metadata, assets=assets, external_tools=external_tools, has_external_tools=has_external_tools, nav=nav, modules=modules)
-        with open(course_out / 'index.html', 'w', encoding='utf-8') as fh:
-            fh.write(rendered)
-    except Exception as e:
-        print(f"Warning: failed to render rich index for {course_out}: {e}")
-
-    # Copy the viewer's CSS into the course output so the static site can use
-    # the same styling as the interactive viewer. We place it in a _static
-    # folder inside the course output and inject a link tag into each HTML
-    # file under the course (wiki pages, index, etc.) so the pages pick up
-    # the styling when served from GitHub Pages.
-    try:
-        static_src_dir = Path(__file__).resolve().parents[1] / 'canvas_viewer' / 'static'
-        if static_src_dir.exists() and static_src_dir.is_dir():
-            static_dst = course_out / '_static'
-            # Remove old static if present
-            if static_dst.exists():
-                shutil.rmtree(static_dst)
-            shutil.copytree(static_src_dir, static_dst)
-
-            # Inject link tag into all HTML files under the course_out if missing
-            for html_file in course_out.rglob('*.html'):
-                try:
-                    doc = lh.parse(str(html_file))
-                    head = doc.find('.//head')
-                    if head is None:
-                        root = doc.getroot()
-                        head = lh.Element('head')
-                        root.insert(0, head)
-                    # Compute a relative path from the HTML file to the course _static directory
-                    # so nested pages correctly resolve the CSS file.
-                    relpath = os.path.relpath(static_dst, start=html_file.parent)
-                    css_href = os.path.join(relpath, 'canvas_viewer.css').replace(os.path.sep, '/')
-                    existing = head.xpath("link[contains(@href, 'canvas_viewer.css')]")
-                    if not existing:
-                        link = lh.Element('link', rel='stylesheet', href=css_href)
-                        if len(head):
-                            head.insert(0, link)
-                        else:
-                            head.append(link)
-
-                        with open(html_file, 'wb') as fh:
-                            fh.write(lh.tostring(doc, encoding='utf-8', pretty_print=True, doctype='<!DOCTYPE html>'))
-                except Exception:
-                    print(f"Warning: failed to inject CSS into {html_file}; skipping")
-    except Exception as e:
-        print(f"Warning: failed to copy/inject viewer static assets: {e}")
-
-    # Generate static section pages: pages.html (wiki pages), files.html, modules.html
+    def page_renderer(self):
+        syllabus = self.exp.get_syllabus()
+        return PageRenderer(self.nav_flags(), self.exp.tree_children(0), syllabus and syllabus.get('href'))
+
+    def render_pages(self, pages):
+        """Yield (rel, bytes) for each page, rendered PAGE_BATCH at a time; logs the rate."""
+        if not pages:
+            return
+        workers = self.page_workers if len(pages) >= PAGE_POOL_MIN else 1
+        t0 = time.perf_counter()
+        with PagePool(self.page_renderer(), workers) as pool:
+            for i in range(0, len(pages), PAGE_BATCH):
+                batch = pages[i:i + PAGE_BATCH]
+                raws = _map_threads(self.read_source, batch, self.copy_workers)
+                for rel, raw, data in zip(batch, raws, pool.map(zip(batch, raws))):
+                    if data is None:
+                        # not something lxml can parse; it still gets the stylesheet
+                        css_href = '../' * rel.count('/') + '_static/canvas_viewer.css'
+                        data = inject_page_bytes(raw, css_href, name=f'{self.name}/{rel}')
+                    yield rel, data
+        seconds = time.perf_counter() - t0
+        print(f"{self.name}: rendered {len(pages)} pages in {seconds:.2f}s "
+              f"({len(pages) / max(seconds, 1e-9):.0f} pages/s, {workers} worker{'s' if workers > 1 else ''})")
+
+    def inject(self, pages, rec):
+        # pages are read once, rendered into the viewer layout (so they keep the
+        # nav, sidebar and styling when served from GitHub Pages) and written straight to the output
+        for rel, data in self.render_pages(pages):
+            dst = self.course_out / rel
+            dst.parent.mkdir(parents=True, exist_ok=True)
+            _write_atomic(dst, data)
+            self.record_output(rel, hashlib.sha256(data).hexdigest(), rec)
+        self.stats['copied'] += len(pages)
+
+    def render(self, name, metadata, rec):
+        structure_changed, files_changed = self.structure_changed()
+        needed = {'index.html': structure_changed, 'pages.html': structure_changed,
+                  'files.html': files_changed, 'modules.html': structure_changed}
+        for rel, depends_changed in list(needed.items()):
+            prev = self.prev_outputs.get(rel)
+            if not depends_changed and prev and self.outputs_intact({rel: prev}):
+                self.outputs[rel] = prev
+                self.stats['skipped'] += 1
+                del needed[rel]
+        if not needed:
+            return
+        for rel, data in self.render_listings(name, metadata, needed).items():
+            _write_atomic(self.course_out / rel, data)
+            self.stats['rendered'] += 1
+            self.record_output(rel, hashlib.sha256(data).hexdigest(), rec)
+
+    def render_listings(self, name, metadata, needed=RENDERED_OUTPUTS):
+        """Render the listings named in needed; returns {rel: bytes}."""
+        exp = self.exp
+        pages, files, modules = self.course_views()
+        external_tools = exp.detect_external_tools() or []
+        # the course index mimics the interactive viewer but uses local paths for static assets and pages
+        assets = [{'title': p.get('title') or p.get('href'), 'href': p.get('href'), 'type': 'page'} for p in pages]
+        assets += [{'title': f.get('title') or f.get('href'), 'href': f.get('href'), 'type': 'file'} for f in files]
+        nav = self.nav_flags()
+        # listings sit in the course root, next to _static
+        css_href = './_static/canvas_viewer.css'
+        contexts = {
+            'index.html': ('export/course_index.html', dict(
+                title=name, metadata=metadata, assets=assets, external_tools=external_tools,
+                has_external_tools=bool(external_tools), nav=nav, modules=modules, search=self.search)),
+            'pages.html': ('export/pages.html', dict(
+                title=name, pages=exp.get_pages_by_folder('wiki_content'), css_href=css_href)),
+            'files.html': ('export/files.html', dict(title=name, files=files, css_href=css_href)),
+            'modules.html': ('export/modules.html', dict(title=name, modules=modules, css_href=css_href)),
+        }
+        templates = _templates()
+        return {rel: templates.get_template(contexts[rel][0]).render(**contexts[rel][1]).encode('utf-8')
+                for rel in needed}
+
+    def read_source(self, rel):
+        src = self.sources[rel]
+        return self.archive.read(src) if isinstance(src, str) else src.read_bytes()
+
+    def search_pages(self):
+        return sorted(rel for rel in self.sources if rel.lower().endswith(('.html', '.htm'))
+                      and not rel.startswith('_static/') and rel not in self.unreferenced)
+
+    def page_texts(self, pages):
+        """Yield (rel, title, tokens) per page, extracting SEARCH_BATCH pages at a time on threads."""
+        def extract(rel):
+            title, text = page_text(self.read_source(rel))
+            return rel, title or os.path.basename(rel), tokenize(text)
+
+        for i in range(0, len(pages), SEARCH_BATCH):
+            yield from _map_threads(extract, pages[i:i + SEARCH_BATCH], self.copy_workers)
+
+    def index_pages(self, rec):
+        """Rebuild the course's search index from the exported pages if any of them changed."""
+        pages = self.search_pages()
+        prev = self.prev_outputs.get(SEARCH_INDEX)
+        prev_pages = sorted(rel for rel in self.prev_outputs if rel.lower().endswith(('.html', '.htm'))
+                            and not rel.startswith('_static/') and rel not in RENDERED_OUTPUTS)
+        if prev and pages == prev_pages and not any(rel in self.changed for rel in pages) \
+                and self.outputs_intact({SEARCH_INDEX: prev}):
+            self.outputs[SEARCH_INDEX] = prev
+            return
+
+        writer = ShardedIndexWriter(self.course_out / SEARCH_DIR)
+        try:
+            for rel, title, tokens in self.page_texts(pages):
+                writer.add_tokens(rel, title, tokens)
+        except BaseException:
+            writer.discard()
+            raise
+        stats = writer.finish()
+        self.record_output(SEARCH_INDEX, _file_sha256(self.course_out / SEARCH_INDEX), rec)
+        rec['bytes'] += stats['bytes'] - self.outputs[SEARCH_INDEX][0]
+        rec['files'] += stats['shards']
+
+
+class ArchiveCourseBuild(CourseBuild):
+    """A course build streamed into a SiteArchive instead of written out as a tree.
+
+    Outputs go into the archive under <course>/ in path order: copies straight
+    from their source, pages and listings from memory.  Nothing is written to
+    disk per file (the search index spools postings per shard, not per page),
+    and as there is no previous build nothing is hashed or skipped.  The
+    pages' text is also fed to site_index, the site-wide ShardedIndexWriter.
+
+    scan    list the inputs
+    parse   parse the manifest and course settings
+    graph   as in CourseBuild
+    render  render the listings
+    search  tokenize every page into the course (and site) index
+    write   stream every output into the archive, rendering pages as in
+            CourseBuild.inject
+    """
+
+    def __init__(self, export_path: Path, sink: SiteArchive, site_index=None, **opts):
+        super().__init__(export_path, Path(), **opts)
+        self.sink = sink
+        self.site_index = site_index
+        self.course_out = self.static_dst = None
+
+    def _run(self):
+        t0 = time.perf_counter()
+        with self.profile.stage('scan'):
+            self.scan()
+        with self.profile.stage('parse'):
+            meta = self.parse()
+        if self.only_referenced or self.refs_report:
+            with self.profile.stage('graph'):
+                self.build_graph()
+        with self.profile.stage('render'):
+            listings = self.render_listings(meta['title'], meta['metadata'])
+        index = None
+        try:
+            if self.search:
+                with self.profile.stage('search'):
+                    index = self.index_archive()
+            with self.profile.stage('write') as rec:
+                self.write(listings, index, rec)
+        finally:
+            if index is not None:
+                index.discard()
+        print(f"{self.name}: {self.stats['copied']} files and {self.stats['rendered']} listings written to the archive")
+        return self._result(meta, {}, {}, t0)
+
+    def scan(self):
+        if is_archive(self.export_path):
+            self.archive = ArchiveReader(self.export_path)
+        self.sources = _scan_inputs(self.export_path, self.archive)
+
+    def index_archive(self):
+        index = ShardedIndexWriter()
+        for rel, title, tokens in self.page_texts(self.search_pages()):
+            index.add_tokens(rel, title, tokens)
+            if self.site_index is not None:
+                self.site_index.add_tokens(self.name + '/' + rel, title, tokens)
+        return index
+
+    def write(self, listings, index, rec):
+        prefix = self.name + '/'
+
+        def add_bytes(rel, data):
+            self.sink.add_bytes(prefix + rel, data)
+            rec['bytes'] += len(data)
+            rec['files'] += 1
+
+        def add_index():
+            for name, data in index.files():
+                add_bytes(SEARCH_DIR + '/' + name, data)
+
+        rels = sorted([rel for rel in self.sources if rel not in self.unreferenced] + list(listings))
+        # pages come out of render_pages in the same (path) order they are written in
+        pages = [rel for rel in rels if rel in self.sources and self.is_page(rel)]
+        with contextlib.closing(self.render_pages(pages)) as rendered:
+            for rel in rels:
+                if index is not None and rel > SEARCH_DIR + '/':
+                    # the index's files sort between _search/ and the next path
+                    add_index()
+                    index = None
+                if rel in listings:
+                    add_bytes(rel, listings[rel])
+                    self.stats['rendered'] += 1
+                    continue
+                if rel in self.sources and self.is_page(rel):
+                    add_bytes(rel, next(rendered)[1])
+                else:
+                    src = self.sources[rel]
+                    if isinstance(src, str):
+                        size = self.archive.members[src].file_size
+                        with self.archive.open(src) as fin:
+                            self.sink.add_stream(prefix + rel, fin, size)
+                    else:
+                        size = os.path.getsize(src)
+                        self.sink.add_file(prefix + rel, src)
+                    rec['bytes'] += size
+                    rec['files'] += 1
+                self.stats['copied'] += 1
+            # runs render_pages to its end, which closes the pool and logs the rate
+            next(rendered, None)
+        if index is not None:
+            add_index()
+
+
+def build_course(export_path: Path, out_path: Path, prev=None, copy_strategy='copy', copy_workers=None,
+                 cprofile_dir=None, dedup=None, only_referenced=False, refs_report=False, search=True,
+                 sink=None, site_index=None, page_workers=1):
+    """Build one course into out_path/<course folder>.
+
+    prev is the course's entry from the previous build manifest (incremental
+    builds): unchanged courses are skipped outright, unchanged files are not
+    copied again, outputs whose inputs disappeared are deleted, and the index,
+    pages, files and modules listings are only re-rendered when their inputs
+    changed.  Returns the course metadata plus its new manifest entry, stats
+    and per-stage profile; errors propagate to the caller.
+
+    With cprofile_dir set the build runs under cProfile and its stats are
+    written to cprofile_dir/<course folder>.prof.  dedup (one of
+    canvas_viewer.dedup.DEDUP_MODES) stores web_resources files once in
+    out_path/_store and links the course's outputs to them.  only_referenced
+    leaves out web_resources files that no page, module or resource uses;
+    refs_report adds the course's orphan report (see CourseBuild.refs).
+    search writes the course's sharded search index to <course>/_search.
+    Pages are rendered on page_workers processes (see CourseBuild.inject).
+
+    With sink (a SiteArchive) the course is streamed into the archive instead
+    (see ArchiveCourseBuild; out_path, prev, copy_strategy and dedup do not
+    apply) and its pages are also added to site_index.
+    """
+    if sink is not None:
+        build = ArchiveCourseBuild(export_path, sink, site_index, copy_workers=copy_workers,
+                                   only_referenced=only_referenced, refs_report=refs_report, search=search,
+                                   page_workers=page_workers)
+    else:
+        build = CourseBuild(export_path, out_path, prev, copy_strategy=copy_strategy, copy_workers=copy_workers,
+                            dedup=dedup, only_referenced=only_referenced, refs_report=refs_report, search=search,
+                            page_workers=page_workers)
+    if not cprofile_dir:
+        return build.run()
+    prof = cProfile.Profile()
     try:
-        # pages.html
-        pages_list = exp.get_pages_by_folder('wiki_content')
-        pages_tmpl = jinja2.Template(r"""<!doctype html>
-<html lang="en">
-    <head>
-        <meta charset="utf-8" />
-        <meta name="viewport" content="width=device-width, initial-scale=1">
-        <title>{{ title }} - Pages</title>
-        <link href="https://cdn.jsdelivr.net/npm/bootstrap@5.3.2/dist/css/bootstrap.min.css" rel="stylesheet">
-        <link rel="stylesheet" href="{{ css_href }}" />
-    </head>
-    <body>
-        <main class="container mt-3">
-            <h1>Pages</h1>
-            <ul>
-            {% for p in pages %}
-                <li><a href="./{{ p.href }}">{{ p.title or p.href }}</a></li>
-            {% endfor %}
-            </ul>
-            <p><a href="./index.html">Back to course</a></p>
-        </main>
-    </body>
-</html>""")
-        # compute css href relative to course root (index is in course root)
-        css_href_root = './_static/canvas_viewer.css'
-        with open(course_out / 'pages.html', 'w', encoding='utf-8') as fh:
-            fh.write(pages_tmpl.render(title=name, pages=pages_list, css_href=css_href_root))
-
-        # files.html
-        files_list = exp.get_files()
-        files_tmpl = jinja2.Template(r"""<!doctype html>
-<html><head>
-<meta charset="utf-8"><title>{{ title }} - Files</title>
-<link href="https://cdn.jsdelivr.net/npm/bootstrap@5.3.2/dist/css/bootstrap.min.css" rel="stylesheet">
-<link rel="stylesheet" href="{{ css_href }}" />
-</head><body>
-<main class="container mt-3">
-<h1>Files</h1>
-<ul>
-{% for f in files %}
-    <li><a href="./{{ f.href }}">{{ f.title }}</a> {% if f.date %}({{ f.date }}){% endif %}</li>
-{% endfor %}
-</ul>
-<p><a href="./index.html">Back to course</a></p>
-</main></body></html>""")
-        with open(course_out / 'files.html', 'w', encoding='utf-8') as fh:
-            fh.write(files_tmpl.render(title=name, files=files_list, css_href=css_href_root))
-
-        # modules.html
-        modules_list = exp.get_modules()
-        modules_tmpl = jinja2.Template(r"""<!doctype html>
-<html><head>
-<meta charset="utf-8"><title>{{ title }} - Modules</title>
-<link href="https://cdn.jsdelivr.net/npm/bootstrap@5.3.2/dist/css/bootstrap.min.css" rel="stylesheet">
-<link rel="stylesheet" href="{{ css_href }}" />
-</head><body>
-<main class="container mt-3">
-<h1>Modules</h1>
-{% for m in modules %}
-    <h2>{{ m.title }}</h2>
-    <ul>
-    {% for it in m.items %}
-        <li><a href="./{{ it.href }}">{{ it.title }}</a></li>
-    {% endfor %}
-    </ul>
-{% endfor %}
-<p><a href="./index.html">Back to course</a></p>
-</main></body></html>""")
-        with open(course_out / 'modules.html', 'w', encoding='utf-8') as fh:
-            fh.write(modules_tmpl.render(title=name, modules=modules_list, css_href=css_href_root))
-    except Exception as e:
-        print(f"Warning: failed to render static section pages for {course_out}: {e}")
-
-    # Return course metadata for use by build_site when rendering root index
-    return {'name': export_path.name, 'title': name, 'metadata': metadata}
-
-
-def build_site(courses_dir: Path, out_dir: Path):
-    # ensure out_dir is clean
-    if out_dir.exists():
-        shutil.rmtree(out_dir)
-    out_dir.mkdir(parents=True)
-
-    # first unzip any archives
-    unzip_archives(courses_dir)
+        return prof.runcall(build.run)
+    finally:
+        os.makedirs(cprofile_dir, exist_ok=True)
+        prof.dump_stats(os.path.join(cprofile_dir, _course_name(export_path) + '.prof'))
+
+
+def _build_course_captured(export_path: Path, out_path: Path, prev=None, course_opts=None):
+    """Run build_course in a worker process, capturing its log output.
 
+    Returns (course metadata or None, log text, error text or None) so one
+    failing course never takes down the rest of the build.
+    """
+    buf = io.StringIO()
+    with contextlib.redirect_stdout(buf), contextlib.redirect_stderr(buf):
+        try:
+            return build_course(export_path, out_path, prev, **(course_opts or {})), buf.getvalue(), None
+        except Exception:
+            return None, buf.getvalue(), traceback.format_exc()
+
+
+def build_courses(course_dirs, out_dir: Path, jobs: int = 1, prev_courses=None, **course_opts):
+    """Build each course (folder or package) into out_dir.
+
+    prev_courses maps course folder names to their previous build-manifest
+    entries; course_opts are passed through to build_course.  Returns the
+    built courses' metadata in input order and {course folder: error text}
+    for the courses that failed.
+    """
+    prev_courses = prev_courses or {}
     course_meta = []
-    for p in sorted(courses_dir.iterdir()):
-        if p.is_dir() and (p / 'imsmanifest.xml').exists():
-            cm = build_course(p, out_dir)
+    failed = {}
+    if jobs <= 1 or len(course_dirs) <= 1:
+        for p in course_dirs:
+            try:
+                course_meta.append(build_course(p, out_dir, prev_courses.get(_course_name(p)), **course_opts))
+            except Exception:
+                failed[_course_name(p)] = traceback.format_exc()
+                print(f"Error: building {p} failed:\n{failed[_course_name(p)]}")
+        return course_meta, failed
+
+    print(f"Building {len(course_dirs)} courses with {jobs} worker processes")
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        futures = [pool.submit(_build_course_captured, p, out_dir, prev_courses.get(_course_name(p)), course_opts) for p in course_dirs]
+        # results (and their logs) are consumed in submission order so output is deterministic
+        for p, fut in zip(course_dirs, futures):
+            try:
+                cm, log, error = fut.result()
+            except Exception as e:
+                # the worker process itself died (e.g. killed or out of memory)
+                cm, log, error = None, '', f'{type(e).__name__}: {e}'
+            print(f"----- {_course_name(p)} -----")
+            if log:
+                print(log, end='' if log.endswith('\n') else '\n')
+            if error:
+                failed[_course_name(p)] = error
+                print(f"Error: building {p} failed:\n{error}")
             if cm:
                 course_meta.append(cm)
+    return course_meta, failed
+
+
+def _load_build_manifest(out_dir: Path, dedup=None, only_referenced=False, search=True):
+    """Return the previous build's course entries, or {} if they cannot be reused."""
+    try:
+        with open(out_dir / BUILD_MANIFEST, 'r', encoding='utf-8') as fh:
+            data = json.load(fh)
+    except (OSError, ValueError):
+        return {}
+    # outputs made with other --dedup/--only-referenced/--no-search settings would not match this build's layout
+    if data.get('version') != BUILD_MANIFEST_VERSION or data.get('dedup') != dedup \
+            or data.get('only_referenced', False) != only_referenced or data.get('search', False) != search:
+        return {}
+    return data.get('courses') or {}
+
+
+def _store_report(out_dir: Path, store: ContentStore, courses):
+    """Prune blobs no course output uses any more; returns the content store's savings."""
+    keep = set()
+    logical = files = 0
+    for entry in courses.values():
+        for rel, rec in (entry.get('outputs') or {}).items():
+            keep.add(rec[2])
+            if rel.startswith('web_resources/') and not rel.lower().endswith('.html'):
+                files += 1
+                logical += rec[0]
+    pruned, freed = store.prune(keep)
+    blobs, stored = store.usage()
+    return {'files': files, 'blobs': blobs, 'logical_bytes': logical, 'stored_bytes': stored,
+            'saved_bytes': logical - stored, 'pruned': pruned, 'pruned_bytes': freed}
 
-    # write root index.html
-        # Render a styled root index.html that lists courses
-        try:
-                root_tmpl = jinja2.Template(r"""<!doctype html>
-<html lang="en">
-    <head>
-        <meta charset="utf-8" />
-        <meta name="viewport" content="width=device-width, initial-scale=1">
-        <title>Courses</title>
-        <link href="https://cdn.jsdelivr.net/npm/bootstrap@5.3.2/dist/css/bootstrap.min.css" rel="stylesheet">
-        <link rel="stylesheet" href="./_static/canvas_viewer.css" />
-    </head>
-    <body>
-        <main class="container mt-3">
-            <h1>Courses</h1>
-            <div class="list-group">
-                {% for c in courses %}
-                    <a class="list-group-item list-group-item-action" href="./{{ c.name }}/index.html">{{ c.title or c.name }}</a>
-                {% endfor %}
-            </div>
-        </main>
-    </body>
-</html>""")
-                # ensure top-level _static exists and contains viewer assets
-                static_src_dir = Path(__file__).resolve().parents[1] / 'canvas_viewer' / 'static'
-                if static_src_dir.exists() and static_src_dir.is_dir():
-                        top_static = out_dir / '_static'
-                        if top_static.exists():
-                                shutil.rmtree(top_static)
-                        shutil.copytree(static_src_dir, top_static)
-
-                with open(out_dir / 'index.html', 'w', encoding='utf-8') as fh:
-                        fh.write(root_tmpl.render(courses=course_meta))
-        except Exception as e:
-                print(f"Warning: failed to render root index: {e}")
+
+def _write_profile(path: Path, site: BuildProfile, course_meta, failed, jobs, seconds, cprofile_dir=None, cprofile_top=3):
+    """Write the --profile report and keep only the slowest courses' cProfile dumps."""
+    courses = sorted(({'name': cm['name'], 'seconds': cm['profile']['seconds'], 'stages': cm['profile']['stages'],
+                       'stats': cm['stats']} for cm in course_meta), key=lambda c: c['seconds'], reverse=True)
+    course_stages = {}
+    for c in courses:
+        for name, rec in c['stages'].items():
+            total = course_stages.setdefault(name, {'seconds': 0.0, 'bytes': 0, 'files': 0})
+            for k in total:
+                total[k] += rec[k]
+    report = {
+        'seconds': round(seconds, 6),
+        'jobs': jobs,
+        'stages': site.to_dict(),
+        'course_stages': {name: dict(rec, seconds=round(rec['seconds'], 6)) for name, rec in course_stages.items()},
+        'courses': courses,
+        'failed': sorted(failed),
+    }
+    if cprofile_dir:
+        keep = {c['name'] for c in courses[:cprofile_top]}
+        dumps = []
+        for name in [c['name'] for c in courses] + sorted(failed):
+            dump = Path(cprofile_dir) / (name + '.prof')
+            if name in keep:
+                dumps.append(str(dump))
+            else:
+                with contextlib.suppress(OSError):
+                    dump.unlink()
+        report['cprofile'] = dumps
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as fh:
+        json.dump(report, fh, indent=1)
+    print(f"Wrote build profile to {path}")
+
+
+def _write_orphan_report(path: Path, course_meta):
+    report = {cm['name']: cm['refs'] for cm in course_meta}
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as fh:
+        json.dump(report, fh, indent=1)
+    print(f"Orphan report: {sum(len(r['orphans']) for r in report.values())} unreferenced files "
+          f"({sum(r['orphan_bytes'] for r in report.values()) / 1e6:.1f}MB), "
+          f"{sum(len(r['missing']) for r in report.values())} missing; written to {path}")
+
+
+def build_site(courses_dir: Path, out_dir: Path, jobs: int = 1, incremental: bool = False,
+               copy_strategy: str = 'copy', copy_workers=None, profile=None, cprofile_dir=None, cprofile_top=3,
+               dedup=None, only_referenced=False, orphan_report=None, search=True, only=None, page_workers=1):
+    """Build every course under courses_dir into out_dir.
+
+    With incremental=True the existing output and its build manifest are
+    reused: unchanged courses and files are skipped and only affected listings
+    are re-rendered.  Otherwise out_dir is wiped and rebuilt from scratch.
+    copy_strategy is one of canvas_viewer.copying.COPY_STRATEGIES; copies
+    within a course run on copy_workers threads.
+
+    profile is a path to write per-stage and per-course timings to as JSON;
+    with cprofile_dir every course is also run under cProfile and the dumps
+    of the cprofile_top slowest courses are kept there.
+
+    dedup ('hardlink' or 'symlink') writes each unique web_resources file
+    once to out_dir/_store and makes the course outputs links to it; unused
+    blobs are pruned after the build.  only_referenced leaves out
+    web_resources files nothing in the course refers to; orphan_report is a
+    path to write each course's unreferenced files, broken links and
+    file -> pages lookup to as JSON.  search builds a sharded search index
+    per course and a site-wide one in out_dir/_search, merged from the
+    course indexes shard by shard.  Returns the build totals, including the
+    names of failed courses and, with dedup, the bytes saved.
+
+    only (incremental builds) is a set of course names to build; the other
+    courses keep their output and manifest entry as they are.  Each course
+    renders its pages on page_workers processes.
+    """
+    if only is not None and not incremental:
+        raise ValueError('only= needs an incremental build')
+    t0 = time.perf_counter()
+    site = BuildProfile()
+    with site.stage('prepare'):
+        prev_courses = _load_build_manifest(out_dir, dedup, only_referenced, search) if incremental else {}
+        # ensure out_dir is clean
+        if out_dir.exists() and not incremental:
+            shutil.rmtree(out_dir)
+        out_dir.mkdir(parents=True, exist_ok=True)
+
+    with site.stage('courses') as rec:
+        course_dirs = find_courses(courses_dir)
+        if only is not None:
+            course_dirs = [p for p in course_dirs if _course_name(p) in only]
+        course_meta, failed = build_courses(course_dirs, out_dir, jobs=jobs, prev_courses=prev_courses,
+                                            copy_strategy=copy_strategy, copy_workers=copy_workers,
+                                            cprofile_dir=cprofile_dir, dedup=dedup, only_referenced=only_referenced,
+                                            refs_report=bool(orphan_report), search=search,
+                                            page_workers=page_workers)
+        for cm in course_meta:
+            for stage in cm['profile']['stages'].values():
+                rec['bytes'] += stage['bytes']
+                rec['files'] += stage['files']
+
+        # remove output of courses that no longer exist
+        found = {_course_name(p) for p in find_courses(courses_dir)} if only is not None else \
+            {_course_name(p) for p in course_dirs}
+        built = {_course_name(p) for p in course_dirs}
+        # courses left out by only are listed (and indexed) as the previous build left them
+        kept = [prev_courses[name]['meta'] for name in sorted(found - built) if name in prev_courses]
+        listed = sorted(course_meta + kept, key=lambda cm: cm['name'])
+        for name in prev_courses:
+            if name not in found:
+                print(f"Removing output of deleted course {name}")
+                shutil.rmtree(out_dir / name, ignore_errors=True)
+
+    with site.stage('index') as rec:
+        # ensure top-level _static exists and contains viewer assets
+        if STATIC_SRC_DIR.is_dir():
+            # replaced file by file rather than wiped, so the site stays servable while --watch rebuilds it
+            top_static = out_dir / '_static'
+            assets = {f.relative_to(STATIC_SRC_DIR): f for f in STATIC_SRC_DIR.rglob('*') if f.is_file()}
+            copy_files((src, top_static / rel) for rel, src in assets.items())
+            for f in list(top_static.rglob('*')):
+                if f.is_file() and f.relative_to(top_static) not in assets:
+                    f.unlink()
+        # a styled root index.html that lists courses
+        data = _templates().get_template('export/root_index.html').render(courses=listed, search=search).encode('utf-8')
+        _write_atomic(out_dir / 'index.html', data)
+
+        if search:
+            # the site index covers the courses listed on the root page
+            writer = ShardedIndexWriter(out_dir / SEARCH_DIR)
+            for cm in listed:
+                writer.merge(out_dir / cm['name'] / SEARCH_DIR, url_prefix=cm['name'] + '/')
+            search_stats = writer.finish()
+            rec['bytes'] += search_stats['bytes']
+            rec['files'] += search_stats['shards'] + 1
+        elif (out_dir / SEARCH_DIR).exists():
+            shutil.rmtree(out_dir / SEARCH_DIR)
+
+        manifest = {'version': BUILD_MANIFEST_VERSION, 'dedup': dedup, 'only_referenced': only_referenced,
+                    'search': search, 'courses': {}}
+        for cm in course_meta:
+            manifest['courses'][cm['name']] = dict(cm['build'], meta={k: cm[k] for k in ('name', 'title', 'metadata')})
+        # failed courses keep their previous entry so the next incremental build retries them,
+        # as do the courses left out of this build
+        for name in list(failed) + [cm['name'] for cm in kept]:
+            if name in prev_courses:
+                manifest['courses'][name] = prev_courses[name]
+        text = json.dumps(manifest, indent=1, sort_keys=True)
+        _write_atomic(out_dir / BUILD_MANIFEST, text.encode('utf-8'))
+        rec['bytes'] += len(data) + len(text)
+        rec['files'] += 2
+        if dedup:
+            store_stats = _store_report(out_dir, ContentStore(out_dir / STORE_DIR, dedup), manifest['courses'])
+
+    totals = {'skipped': 0, 'copied': 0, 'rendered': 0, 'deleted': 0}
+    for cm in course_meta:
+        for k in totals:
+            totals[k] += cm['stats'][k]
+    totals['failed'] = sorted(failed)
+    print(f"Built {len(course_meta)} courses: {totals['copied']} files copied, {totals['rendered']} rendered, "
+          f"{totals['skipped']} skipped, {totals['deleted']} deleted")
+    if dedup:
+        totals['dedup'] = store_stats
+        print(f"Content store: {store_stats['files']} files in {store_stats['blobs']} blobs, "
+              f"{store_stats['stored_bytes'] / 1e6:.1f}MB stored for {store_stats['logical_bytes'] / 1e6:.1f}MB; "
+              f"saved {store_stats['saved_bytes'] / 1e6:.1f}MB")
+    if search:
+        totals['search'] = search_stats
+        print(f"Search index: {search_stats['docs']} pages, {search_stats['terms']} terms in "
+              f"{search_stats['shards']} shards ({search_stats['bytes'] / 1e6:.1f}MB)")
+    if orphan_report:
+        _write_orphan_report(Path(orphan_report), course_meta)
+    if failed:
+        print(f"Failed: {', '.join(sorted(failed))}")
+    if profile:
+        _write_profile(Path(profile), site, course_meta, failed, jobs, time.perf_counter() - t0,
+                       cprofile_dir=cprofile_dir, cprofile_top=cprofile_top)
+    return totals
+
+
+def build_site_archive(courses_dir: Path, archive_path: Path, threads=None, copy_workers=None, profile=None,
+                       cprofile_dir=None, cprofile_top=3, only_referenced=False, orphan_report=None, search=True,
+                       page_workers=1):
+    """Build every course under courses_dir straight into one archive (see canvas_viewer.site_archive).
+
+    The archive holds the same files build_site would write, courses first
+    (each in path order), then _search, _static and index.html, all with
+    the same fixed timestamp.  threads is the compressor's thread count.
+    Courses are built one after another, as they share the archive stream;
+    if one fails no archive is written.  Returns the build totals plus the
+    archive's size.
+    """
+    t0 = time.perf_counter()
+    site = BuildProfile()
+    course_dirs = find_courses(courses_dir)
+    course_meta = []
+    failed = {}
+    current = None
+    try:
+        with SiteArchive(archive_path, threads=threads) as sink:
+            site_index = ShardedIndexWriter() if search else None
+            with site.stage('courses') as rec:
+                for current in course_dirs:
+                    course_meta.append(build_course(current, None, copy_workers=copy_workers, cprofile_dir=cprofile_dir,
+                                                    only_referenced=only_referenced, refs_report=bool(orphan_report),
+                                                    search=search, sink=sink, site_index=site_index,
+                                                    page_workers=page_workers))
+                current = None
+                rec['bytes'] = sink.bytes
+                rec['files'] = sink.files
+            with site.stage('index') as rec:
+                if site_index is not None:
+                    for name, data in site_index.files():
+                        sink.add_bytes(SEARCH_DIR + '/' + name, data)
+                if STATIC_SRC_DIR.is_dir():
+                    for f in sorted(STATIC_SRC_DIR.rglob('*')):
+                        if f.is_file():
+                            sink.add_file('_static/' + f.relative_to(STATIC_SRC_DIR).as_posix(), f)
+                data = _templates().get_template('export/root_index.html').render(courses=course_meta, search=search)
+                sink.add_bytes('index.html', data.encode('utf-8'))
+                rec['bytes'] = sink.bytes - site.stages['courses']['bytes']
+                rec['files'] = sink.files - site.stages['courses']['files']
+    except Exception:
+        if current is None:
+            raise
+        failed[_course_name(current)] = traceback.format_exc()
+        print(f"Error: building {current} failed; no archive written:\n{failed[_course_name(current)]}")
+
+    totals = {'skipped': 0, 'copied': 0, 'rendered': 0, 'deleted': 0}
+    for cm in course_meta:
+        for k in totals:
+            totals[k] += cm['stats'][k]
+    totals['failed'] = sorted(failed)
+    if not failed:
+        size = os.path.getsize(archive_path)
+        totals['archive'] = {'path': str(archive_path), 'format': sink.format, 'compressor': sink.compressor,
+                             'files': sink.files, 'bytes': sink.bytes, 'archive_bytes': size}
+        print(f"Built {len(course_meta)} courses into {archive_path}: {sink.files} files, "
+              f"{sink.bytes / 1e6:.1f}MB -> {size / 1e6:.1f}MB ({sink.compressor})")
+        if orphan_report:
+            _write_orphan_report(Path(orphan_report), course_meta)
+    if profile:
+        _write_profile(Path(profile), site, course_meta, failed, 1, time.perf_counter() - t0,
+                       cprofile_dir=cprofile_dir, cprofile_top=cprofile_top)
+    return totals
+
+
+def _course_snapshot(courses_dir: Path):
+    """{entry name: {relpath: [size, mtime_ns]}} for every course folder and package under courses_dir."""
+    snap = {}
+    for p in sorted(courses_dir.iterdir()):
+        with contextlib.suppress(OSError):
+            if p.is_file() and is_archive(p):
+                snap[p.name] = {'': _stat(p)}
+            elif p.is_dir() and (p / 'imsmanifest.xml').exists():
+                files = {'imsmanifest.xml': _stat(p / 'imsmanifest.xml')}
+                for sub in COPY_DIRS:
+                    for root, dirs, names in os.walk(p / sub):
+                        for name in names:
+                            path = os.path.join(root, name)
+                            with contextlib.suppress(OSError):
+                                files[os.path.relpath(path, p)] = _stat(path)
+                snap[p.name] = files
+    return snap
+
+
+class SiteWatcher:
+    """Polls courses_dir and rebuilds the courses that changed (--watch).
+
+    Every course folder is stat'ed on each poll (no platform file-watching
+    API is needed), as is every .imscc/.zip package, so new, edited and
+    deleted courses are all noticed.  A change is only acted on once nothing
+    has changed for `debounce` seconds, so an editor saving several files or a
+    package still being copied in triggers one rebuild.  Rebuilds are
+    incremental builds of the changed courses only (build_site(only=...)):
+    an edited page is copied and injected again, a changed web_resources file
+    re-renders files.html, a changed manifest re-renders all listings.  Every
+    output is replaced by a rename, so the output directory can be served
+    throughout.
+    """
+
+    def __init__(self, courses_dir: Path, out_dir: Path, debounce=0.5, **build_opts):
+        self.courses_dir = courses_dir
+        self.out_dir = out_dir
+        self.debounce = debounce
+        self.build_opts = build_opts
+        self.snapshot = {}
+
+    def changes(self):
+        """Course names whose files changed since the last call (or since build())."""
+        snap = _course_snapshot(self.courses_dir)
+        names = {name for name in set(snap) | set(self.snapshot) if snap.get(name) != self.snapshot.get(name)}
+        self.snapshot = snap
+        return {_course_name(self.courses_dir / name) for name in names}
+
+    def build(self):
+        """Build the whole site (incrementally, reusing whatever output is already there)."""
+        self.snapshot = _course_snapshot(self.courses_dir)
+        return build_site(self.courses_dir, self.out_dir, incremental=True, **self.build_opts)
+
+    def rebuild(self, names):
+        print(f"Changed: {', '.join(sorted(names))}; rebuilding")
+        t0 = time.perf_counter()
+        totals = build_site(self.courses_dir, self.out_dir, incremental=True, only=set(names), **self.build_opts)
+        print(f"Rebuilt in {time.perf_counter() - t0:.2f}s; watching {self.courses_dir} for changes")
+        return totals
+
+    def run(self, interval=1.0, stop=None):
+        """Build, then poll every interval seconds and rebuild on changes until stop (an Event) is set."""
+        stop = stop or threading.Event()
+        self.build()
+        print(f"Watching {self.courses_dir} for changes (Ctrl-C to stop)")
+        while not stop.wait(interval):
+            names = self.changes()
+            if not names:
+                continue
+            # wait for the courses to settle before rebuilding
+            while not stop.wait(self.debounce):
+                more = self.changes()
+                if not more:
+                    break
+                names |= more
+            if stop.is_set():
+                break
+            try:
+                self.rebuild(names)
+            except Exception:
+                # keep watching; the next change retries
+                print(f"Error: rebuilding {', '.join(sorted(names))} failed:\n{traceback.format_exc()}")
+
+
+@contextlib.contextmanager
+def _allocation_report(top):
+    """Trace allocations made in the block and print the top lines they grew by (top=0: no tracing)."""
+    if not top:
+        yield
+        return
+    tracer = AllocationTracer()
+    tracer.start()
+    tracer.snapshot(limit=1)
+    try:
+        yield
+    finally:
+        snap = tracer.snapshot('line', top)
+        tracer.stop()
+        print(f"Allocations: {snap['traced_bytes'] / 1e6:.1f}MB still held, peak {snap['peak_bytes'] / 1e6:.1f}MB; "
+              f"top {top} lines by growth:")
+        for entry in snap['diff']:
+            print(f"  {entry['bytes_diff'] / 1e3:+10.1f}KB {entry['count_diff']:+9d} blocks  {entry['where']}")
 
 
 def main():
     ap = argparse.ArgumentParser()
     ap.add_argument('--courses-dir', default='courses', help='Directory containing course exports')
     ap.add_argument('--output-dir', default='public', help='Directory to write the static site')
+    ap.add_argument('--jobs', '-j', type=int, default=1, help='Number of courses to build in parallel (0 = one per CPU)')
+    ap.add_argument('--incremental', action='store_true', help='Reuse the existing output and only rebuild what changed')
+    ap.add_argument('--copy-strategy', choices=COPY_STRATEGIES, default='copy',
+                    help='How course files are copied: copy, reflink (copy-on-write when supported) or hardlink; falls back automatically')
+    ap.add_argument('--copy-workers', type=int, default=None, help='Threads used for file copies within a course')
+    ap.add_argument('--page-workers', type=int, default=0,
+                    help='Processes each course renders its pages on (0 = the CPUs left per --jobs worker)')
+    ap.add_argument('--dedup', choices=DEDUP_MODES, default=None,
+                    help='Store each unique web_resources file once in <output>/_store and hard-link or symlink course files to it')
+    ap.add_argument('--only-referenced', action='store_true',
+                    help='Leave out web_resources files that no page, module or resource refers to')
+    ap.add_argument('--orphan-report', metavar='PATH', default=None,
+                    help='Write unreferenced files, broken links and which pages use each file to PATH as JSON')
+    ap.add_argument('--no-search', dest='search', action='store_false',
+                    help='Do not build the client-side search index (<course>/_search and <output>/_search)')
+    ap.add_argument('--output-archive', metavar='PATH', default=None,
+                    help='Stream the site into one archive instead of --output-dir (' + ', '.join(SITE_ARCHIVE_FORMATS) + ')')
+    ap.add_argument('--archive-threads', type=int, default=1,
+                    help='Compressor threads for --output-archive (zstd or pigz; 0 = one per CPU)')
+    ap.add_argument('--watch', action='store_true',
+                    help='After building, keep watching --courses-dir and rebuild the courses that change')
+    ap.add_argument('--watch-interval', type=float, default=1.0, help='Seconds between polls in --watch mode')
+    ap.add_argument('--debounce', type=float, default=0.5,
+                    help='Seconds without further changes before --watch rebuilds')
+    ap.add_argument('--profile', metavar='PATH', default=None,
+                    help='Write per-stage and per-course wall time, bytes and file counts to PATH as JSON')
+    ap.add_argument('--cprofile-dir', metavar='DIR', default=None,
+                    help='Run each course under cProfile and keep the slowest courses\' dumps in DIR')
+    ap.add_argument('--cprofile-top', type=int, default=3, help='Number of slowest courses whose cProfile dumps are kept')
+    ap.add_argument('--tracemalloc', metavar='N', type=int, default=0,
+                    help='Trace allocations during the build and print the N source lines holding the most new '
+                         'memory (worker processes are not traced: use --jobs 1 --page-workers 1)')
     args = ap.parse_args()
 
+    if args.tracemalloc and args.watch:
+        ap.error('--tracemalloc cannot be combined with --watch')
+    if args.output_archive:
+        if site_archive_format(args.output_archive) is None:
+            ap.error('--output-archive must end in one of ' + ', '.join(SITE_ARCHIVE_FORMATS))
+        if args.incremental or args.dedup or args.watch:
+            ap.error('--output-archive cannot be combined with --incremental, --dedup or --watch')
+
     courses_dir = Path(args.courses_dir)
     out_dir = Path(args.output_dir)
+    jobs = args.jobs or os.cpu_count() or 1
+    # course workers and page workers share the CPUs; archive builds run one course at a time
+    page_workers = args.page_workers or max(1, (os.cpu_count() or 1) // (1 if args.output_archive else jobs))
 
     if not courses_dir.exists():
         print(f"Courses directory not found: {courses_dir}")
-        return
+        return 1
+
+    if args.output_archive:
+        if args.jobs != 1:
+            print("Note: courses are built one at a time into an archive; --jobs is ignored")
+        with _allocation_report(args.tracemalloc):
+            totals = build_site_archive(courses_dir, Path(args.output_archive),
+                                        threads=args.archive_threads or os.cpu_count() or 1,
+                                        copy_workers=args.copy_workers, profile=args.profile,
+                                        cprofile_dir=args.cprofile_dir, cprofile_top=args.cprofile_top,
+                                        only_referenced=args.only_referenced, orphan_report=args.orphan_report,
+                                        search=args.search, page_workers=page_workers)
+        return 1 if totals['failed'] else 0
+
+    if args.watch:
+        watcher = SiteWatcher(courses_dir, out_dir, debounce=args.debounce, jobs=jobs,
+                              copy_strategy=args.copy_strategy, copy_workers=args.copy_workers, dedup=args.dedup,
+                              only_referenced=args.only_referenced, search=args.search, page_workers=page_workers)
+        try:
+            watcher.run(interval=args.watch_interval)
+        except KeyboardInterrupt:
+            pass
+        return 0
 
-    build_site(courses_dir, out_dir)
+    with _allocation_report(args.tracemalloc):
+        totals = build_site(courses_dir, out_dir, jobs=jobs, incremental=args.incremental,
+                            copy_strategy=args.copy_strategy, copy_workers=args.copy_workers, profile=args.profile,
+                            cprofile_dir=args.cprofile_dir, cprofile_top=args.cprofile_top, dedup=args.dedup,
+                            only_referenced=args.only_referenced, orphan_report=args.orphan_report,
+                            search=args.search, page_workers=page_workers)
+    return 1 if totals['failed'] else 0
 
 
 if __name__ == '__main__':
-    main()
+    sys.exit(main())
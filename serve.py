@@ -1,9 +1,12 @@
 import click
+import json
 import os
 import shutil
 from pathlib import Path
-from canvas_viewer.app import create_app
+from canvas_viewer.app import WARM_MODES, create_app
+from canvas_viewer.archive import is_archive
 from canvas_viewer.parser import CanvasExport
+from canvas_viewer.copying import COPY_STRATEGIES, copy_tree
 import socket
 
 
@@ -12,11 +15,18 @@ import socket
 @click.option('--export', 'export_out', default=None, help='If provided, write a static export of the course to this directory and exit')
 @click.option('--host', default='127.0.0.1')
 @click.option('--port', default=5001)
+@click.option('--copy-strategy', type=click.Choice(COPY_STRATEGIES), default='copy', help='How --export copies files: copy, reflink (copy-on-write when supported) or hardlink')
 @click.option('--canvas-base-domain', 'canvas_base_domain', default=None, help='Comma-separated base domain(s) to treat as internal (overrides CANVAS_BASE_DOMAIN env var)')
-def serve(src_path, export_out, host, port, canvas_base_domain):
+@click.option('--memory-report', is_flag=True, help='Load the export, print the approximate size of its structures and caches as JSON and exit')
+@click.option('--warm', type=click.Choice(WARM_MODES), default=None, help='Precompute derived views and render the key pages (or all pages) in the background; /ready answers 503 until done')
+@click.option('--warm-wait', is_flag=True, help='With --warm, finish the warm-up before opening the socket')
+def serve(src_path, export_out, host, port, copy_strategy, canvas_base_domain, memory_report, warm, warm_wait):
     src_path = os.path.abspath(src_path)
     if not os.path.exists(src_path):
         raise click.ClickException(f'Source path not found: {src_path}')
+    if is_archive(src_path) and os.path.isfile(src_path):
+        raise click.ClickException(f'{src_path} is a course package; extract it first and pass the folder '
+                                   '(scripts/export_courses.py builds packages in place)')
 
     # If user requested a static export, write files and exit
     if export_out:
@@ -30,7 +40,7 @@ def serve(src_path, export_out, host, port, canvas_base_domain):
                 dst = out_dir / sub
                 if dst.exists():
                     shutil.rmtree(dst)
-                shutil.copytree(src, dst)
+                copy_tree(src, dst, strategy=copy_strategy)
 
         # build a minimal index.html matching the app's summaries
         try:
@@ -77,6 +87,11 @@ def serve(src_path, export_out, host, port, canvas_base_domain):
         click.echo(f'Wrote static export to {out_dir}')
         return
 
+    if memory_report:
+        app = create_app(src_path)
+        click.echo(json.dumps(app.extensions['canvas_memory'](), indent=2))
+        return
+
     # find an available port starting at `port`
     def _port_available(p):
         with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
@@ -105,7 +120,14 @@ def serve(src_path, export_out, host, port, canvas_base_domain):
     if canvas_base_domain:
         os.environ['CANVAS_BASE_DOMAIN'] = canvas_base_domain
 
-    app = create_app(src_path)
+    app = create_app(src_path, warm=warm)
+    if warm and warm_wait:
+        click.echo(f'Warming up ({warm})...')
+        job = app.extensions['canvas_warmup']
+        job.wait()
+        if job.status == 'failed':
+            # /ready would answer 503 for good
+            raise click.ClickException(f'Warm-up failed: {job.error}')
     click.echo(f'Serving {src_path} at http://{host}:{chosen}')
     app.run(host=host, port=chosen)
 
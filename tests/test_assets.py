@@ -0,0 +1,62 @@
+import base64
+import hashlib
+
+from benchmarks.synthetic import make_course
+from canvas_viewer.app import create_app
+from canvas_viewer.assets import AssetStore
+from canvas_viewer.rendering import rewrite_page, viewer_link
+
+IMAGE = b'\x89PNG\r\n\x1a\n' + bytes(range(256)) * 16
+URI = 'data:image/png;base64,' + base64.b64encode(IMAGE).decode('ascii')
+PAGE = f'''<html><body><p>Screenshot:</p><img src="{URI}">
+<img src="data:image/gif;base64,R0lGODlhAQABAAAAACw=">
+<img src="data:image/png;base64,{'!' * 4000}">
+</body></html>'''.encode('utf-8')
+
+
+def _srcs(out):
+    from lxml import html
+    return [img.get('src') for img in html.fromstring(out).iter('img')]
+
+
+def test_data_uris_are_stored_by_content_hash(tmp_path):
+    assets = AssetStore(tmp_path / 'assets')
+    out = rewrite_page(PAGE, 'wiki_content/shot.html', viewer_link, assets)
+    name = hashlib.sha256(IMAGE).hexdigest() + '.png'
+    srcs = _srcs(out)
+    assert srcs[0] == '/asset/' + name
+    assert (tmp_path / 'assets' / name).read_bytes() == IMAGE
+    # tiny images and undecodable URIs stay inline
+    assert srcs[1].startswith('data:image/gif') and srcs[2].startswith('data:image/png')
+    assert assets.extracted == 1 and len(out) < len(PAGE) - len(URI) + 100
+
+    # without a store data URIs are left alone instead of being taken for export paths
+    assert _srcs(rewrite_page(PAGE, 'wiki_content/shot.html', viewer_link))[0] == URI
+    assert assets.path('../' + name) is None and assets.path(name.replace('.png', '.exe')) is None
+
+
+def test_assets_are_served_immutable(tmp_path, monkeypatch):
+    course = make_course(tmp_path / 'course', pages=2, files=0, modules=1, data_uri_kb=4)
+    monkeypatch.setenv('CANVAS_CACHE_DIR', str(tmp_path / 'cache'))
+    client = create_app(str(course)).test_client()
+    page = client.get('/page/wiki_content/page-00000.html')
+    assert page.status_code == 200 and b'data:image' not in page.data
+    src = next(s for s in _srcs(page.data) if s.startswith('/asset/'))
+    r = client.get(src)
+    assert r.status_code == 200 and r.mimetype == 'image/png' and r.data.startswith(b'\x89PNG')
+    assert r.cache_control.immutable and r.cache_control.max_age == 365 * 24 * 3600
+    assert client.get(src, headers={'If-None-Match': r.headers['ETag']}).status_code == 304
+    assert client.get('/asset/' + '0' * 64 + '.png').status_code == 404
+
+
+def test_unwritable_cache_leaves_data_uris_inline(tmp_path, monkeypatch, capsys):
+    # the cache "directory" is a file, so nothing can be created under it
+    (tmp_path / 'notadir').write_text('')
+    monkeypatch.setenv('CANVAS_CACHE_DIR', str(tmp_path / 'notadir'))
+    course = make_course(tmp_path / 'course', pages=2, files=0, modules=1, data_uri_kb=4)
+    client = create_app(str(course)).test_client()
+    for i in range(2):
+        r = client.get(f'/page/wiki_content/page-{i:05d}.html')
+        assert r.status_code == 200
+        assert [src[:15] for src in _srcs(r.data)] == ['data:image/png;']
+    assert capsys.readouterr().out.count('cannot store assets') == 1
@@ -0,0 +1,131 @@
+import threading
+import time
+
+import pytest
+
+from canvas_viewer.cache import CacheTimeout, GenerationCache
+
+THREADS = 16
+
+
+def _contend(cache, key, generation, compute, **kwargs):
+    """Call get_or_compute from THREADS threads released at once; returns their results."""
+    barrier = threading.Barrier(THREADS)
+    results = [None] * THREADS
+
+    def worker(i):
+        barrier.wait()
+        try:
+            results[i] = cache.get_or_compute(key, generation, compute, **kwargs)
+        except Exception as e:
+            results[i] = e
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(THREADS)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(10)
+    return results
+
+
+def _slow(calls, value, delay=0.2):
+    def compute():
+        calls.append(threading.get_ident())
+        time.sleep(delay)
+        return value
+    return compute
+
+
+def test_concurrent_misses_compute_once_per_key():
+    cache = GenerationCache('test')
+    calls = []
+    assert _contend(cache, 'page', 1, _slow(calls, 'html')) == ['html'] * THREADS
+    assert len(calls) == 1
+    assert cache.misses == 1 and cache.hits + cache.coalesced == THREADS - 1
+
+    # keys do not wait for each other
+    other = []
+    results = {}
+    threads = [threading.Thread(target=lambda k=k: results.update({k: cache.get_or_compute(k, 1, _slow(other, k))}))
+               for k in ('a', 'b', 'c')]
+    t0 = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(10)
+    assert results == {'a': 'a', 'b': 'b', 'c': 'c'} and len(other) == 3
+    assert time.perf_counter() - t0 < 0.5
+
+
+def test_waiters_share_the_exception_and_the_next_miss_retries():
+    cache = GenerationCache('test')
+    calls = []
+
+    def fail():
+        calls.append(1)
+        time.sleep(0.1)
+        raise ValueError('broken page')
+
+    results = _contend(cache, 'page', 1, fail)
+    assert len(calls) == 1 and all(isinstance(r, ValueError) for r in results)
+    assert cache.get_or_compute('page', 1, lambda: 'fixed') == 'fixed'
+
+
+def test_waiting_times_out():
+    cache = GenerationCache('test', timeout=0.05)
+    started = threading.Event()
+
+    def slow():
+        started.set()
+        time.sleep(0.5)
+        return 'late'
+
+    leader = threading.Thread(target=cache.get_or_compute, args=('k', 1, slow))
+    leader.start()
+    started.wait(5)
+    with pytest.raises(CacheTimeout):
+        cache.get_or_compute('k', 1, slow)
+    leader.join(5)
+    assert cache.get_or_compute('k', 1, slow) == 'late'
+
+
+def test_stale_entry_is_served_while_one_thread_revalidates():
+    cache = GenerationCache('test', stale=True)
+    cache.get_or_compute('graph', 1, lambda: 'old')
+    calls = []
+    results = _contend(cache, 'graph', 2, _slow(calls, 'new'))
+    # every request is answered at once with the previous generation's entry
+    assert results == ['old'] * THREADS and cache.stale_hits == THREADS
+    deadline = time.monotonic() + 5
+    while len(cache.values()) != 1 or cache.values() != ['new']:
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+    assert len(calls) == 1
+    assert cache.get_or_compute('graph', 2, _slow(calls, 'again')) == 'new'
+
+    # without an older entry there is nothing to serve: misses wait for the computation
+    assert _contend(cache, 'other', 2, _slow(calls, 'x')) == ['x'] * THREADS
+    assert len(calls) == 2
+
+
+def test_new_version_replaces_the_entry():
+    cache = GenerationCache('test')
+    assert cache.get_or_compute('page', 1, lambda: 'v1', version=(1, 10)) == 'v1'
+    assert cache.get_or_compute('page', 1, lambda: 'unused', version=(1, 10)) == 'v1'
+    assert cache.get_or_compute('page', 1, lambda: 'v2', version=(2, 12)) == 'v2'
+    assert len(cache) == 1 and cache.values() == ['v2']
+
+
+def test_byte_cap_drops_least_recently_used():
+    cache = GenerationCache('test', max_bytes=10)
+    for key in 'abc':
+        cache.get_or_compute(key, 1, lambda: 'xxxx')
+    # 'a' went to make room for 'c'; a hit makes 'b' the most recently used
+    assert len(cache) == 2 and cache.bytes == 8 and cache.evictions == 1
+    cache.get_or_compute('b', 1, lambda: 'unused')
+    cache.get_or_compute('d', 1, lambda: 'xxxx')
+    assert cache.get_or_compute('b', 1, lambda: 'miss') == 'xxxx'
+    assert cache.get_or_compute('c', 1, lambda: 'miss') == 'miss'
+    # larger than the whole cache: returned, never kept
+    assert cache.get_or_compute('big', 1, lambda: 'x' * 11) == 'x' * 11
+    assert 'x' * 11 not in cache.values() and cache.bytes <= 10
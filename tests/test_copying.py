@@ -0,0 +1,52 @@
+import os
+import shutil
+from pathlib import Path
+
+import pytest
+
+from canvas_viewer.copying import COPY_STRATEGIES, copy_file, copy_tree
+
+
+@pytest.mark.parametrize('strategy', COPY_STRATEGIES)
+def test_copy_strategies_produce_identical_files(tmp_path, strategy):
+    src = tmp_path / 'src' / 'a' / 'file.bin'
+    src.parent.mkdir(parents=True)
+    src.write_bytes(os.urandom(300000))
+    counts = copy_tree(tmp_path / 'src', tmp_path / 'dst', strategy=strategy, workers=2)
+    dst = tmp_path / 'dst' / 'a' / 'file.bin'
+    assert dst.read_bytes() == src.read_bytes()
+    assert sum(counts.values()) == 1
+    if strategy == 'hardlink':
+        assert os.path.samefile(src, dst)
+    else:
+        assert not os.path.samefile(src, dst)
+
+
+def test_copy_over_hardlinked_output_leaves_source_alone(tmp_path):
+    src = tmp_path / 'src.txt'
+    src.write_text('original')
+    dst = tmp_path / 'out.txt'
+    assert copy_file(src, dst, 'hardlink') == 'hardlink'
+    other = tmp_path / 'other.txt'
+    other.write_text('replacement')
+    copy_file(other, dst, 'copy')
+    assert src.read_text() == 'original'
+    assert dst.read_text() == 'replacement'
+    # copies land under a temporary name first and are renamed over dst
+    assert sorted(p.name for p in tmp_path.iterdir()) == ['other.txt', 'out.txt', 'src.txt']
+
+
+def test_hardlink_export_does_not_modify_sources(tmp_path):
+    from scripts.export_courses import build_site
+
+    src = Path(__file__).resolve().parents[1] / 'courses' / 'minimal-course-export'
+    courses = tmp_path / 'courses'
+    shutil.copytree(src, courses / 'minimal')
+    page = courses / 'minimal' / 'wiki_content' / 'homepage.html'
+    before = page.read_bytes()
+    out = tmp_path / 'public'
+    build_site(courses, out, copy_strategy='hardlink')
+    assert page.read_bytes() == before
+    assert 'canvas_viewer.css' in (out / 'minimal' / 'wiki_content' / 'homepage.html').read_text()
+    assert os.path.samefile(courses / 'minimal' / 'web_resources' / 'sample.txt',
+                            out / 'minimal' / 'web_resources' / 'sample.txt')
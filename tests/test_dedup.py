@@ -0,0 +1,73 @@
+import hashlib
+import os
+import shutil
+from pathlib import Path
+
+import pytest
+
+from scripts.export_courses import build_site
+
+SRC = Path(__file__).resolve().parents[1] / 'courses' / 'minimal-course-export'
+
+
+def _sha(path):
+    return hashlib.sha256(Path(path).read_bytes()).hexdigest()
+
+
+def _courses(tmp_path, n=3):
+    courses = tmp_path / 'courses'
+    for i in range(n):
+        shutil.copytree(SRC, courses / f'course-{i}', ignore=shutil.ignore_patterns('.canvas_viewer'))
+        (courses / f'course-{i}' / 'web_resources' / 'big.bin').write_bytes(b'\x01' * 100_000)
+    # one course has a file of its own
+    (courses / 'course-0' / 'web_resources' / 'own.bin').write_bytes(b'\x02' * 5_000)
+    return courses
+
+
+def _verify(courses, out):
+    """Every output file matches its source byte for byte."""
+    for src in courses.rglob('*'):
+        rel = src.relative_to(courses)
+        if src.is_file() and rel.parts[1] == 'web_resources':
+            assert _sha(out / rel) == _sha(src), rel
+
+
+@pytest.mark.parametrize('mode', ['hardlink', 'symlink'])
+def test_dedup_stores_each_file_once_and_outputs_verify(tmp_path, mode):
+    courses = _courses(tmp_path)
+    out = tmp_path / 'public'
+    totals = build_site(courses, out, dedup=mode, jobs=2)
+
+    _verify(courses, out)
+    blobs = sorted(p for p in (out / '_store').rglob('*') if p.is_file())
+    # big.bin, own.bin and sample.txt
+    assert len(blobs) == 3
+    for blob in blobs:
+        assert blob.name.split('.')[0] == _sha(blob)
+    stats = totals['dedup']
+    assert stats['files'] == 7 and stats['blobs'] == 3
+    assert stats['saved_bytes'] == 2 * (100_000 + (SRC / 'web_resources' / 'sample.txt').stat().st_size)
+
+    big = [out / f'course-{i}' / 'web_resources' / 'big.bin' for i in range(3)]
+    if mode == 'hardlink':
+        assert len({os.stat(p).st_ino for p in big}) == 1
+    else:
+        assert all(p.is_symlink() and not os.path.isabs(os.readlink(p)) for p in big)
+
+
+def test_dedup_incremental_build_prunes_unused_blobs(tmp_path):
+    courses = _courses(tmp_path)
+    out = tmp_path / 'public'
+    build_site(courses, out, dedup='hardlink')
+
+    (courses / 'course-1' / 'web_resources' / 'big.bin').write_bytes(b'\x03' * 100_000)
+    shutil.rmtree(courses / 'course-0')
+    totals = build_site(courses, out, incremental=True, dedup='hardlink')
+
+    _verify(courses, out)
+    # own.bin is gone with course-0; big.bin now exists in two versions
+    assert totals['dedup']['blobs'] == 3 and totals['dedup']['pruned'] == 1
+    # switching modes rebuilds every course rather than mixing layouts
+    assert build_site(courses, out, incremental=True, dedup='symlink')['copied'] > 0
+    _verify(courses, out)
+    assert (out / 'course-1' / 'web_resources' / 'big.bin').is_symlink()
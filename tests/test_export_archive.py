@@ -0,0 +1,89 @@
+import shutil
+import zipfile
+import os
+from pathlib import Path
+
+import pytest
+
+from canvas_viewer.app import create_app
+from canvas_viewer.parser import CanvasExport
+from scripts.export_courses import build_site
+
+SRC = Path(__file__).resolve().parents[1] / 'courses' / 'minimal-course-export'
+
+
+def _package(dest, replace=None, extra=None):
+    """Zip the minimal course into dest, optionally replacing or adding members."""
+    replace = replace or {}
+    with zipfile.ZipFile(dest, 'w', zipfile.ZIP_DEFLATED) as z:
+        for f in sorted(SRC.rglob('*')):
+            if f.is_file() and '.canvas_viewer' not in f.parts:
+                name = f.relative_to(SRC).as_posix()
+                z.writestr(name, replace.get(name, f.read_bytes()))
+        for name, data in (extra or {}).items():
+            z.writestr(name, data)
+    return dest
+
+
+def _tree(root):
+    return {p.relative_to(root).as_posix(): p.read_bytes() for p in root.rglob('*') if p.is_file()}
+
+
+def test_package_builds_like_its_folder_without_extracting(tmp_path):
+    from_dir = tmp_path / 'dir-courses'
+    shutil.copytree(SRC, from_dir / 'minimal')
+    shutil.rmtree(from_dir / 'minimal' / '.canvas_viewer', ignore_errors=True)
+    from_pkg = tmp_path / 'pkg-courses'
+    from_pkg.mkdir()
+    _package(from_pkg / 'minimal.imscc', extra={'../evil.txt': b'x', 'web_resources/../../evil2.txt': b'x'})
+
+    build_site(from_dir, tmp_path / 'out-dir')
+    totals = build_site(from_pkg, tmp_path / 'out-pkg')
+
+    assert totals['failed'] == []
+    assert [p.name for p in from_pkg.iterdir()] == ['minimal.imscc']
+    a = _tree(tmp_path / 'out-dir' / 'minimal')
+    b = _tree(tmp_path / 'out-pkg' / 'minimal')
+    # file dates come from mtimes
+    a.pop('files.html')
+    b.pop('files.html')
+    assert a == b
+    assert not (tmp_path / 'evil.txt').exists() and not (tmp_path / 'out-pkg' / 'evil2.txt').exists()
+
+
+def test_package_wins_over_stale_folder_and_rebuilds_incrementally(tmp_path, capsys):
+    courses = tmp_path / 'courses'
+    shutil.copytree(SRC, courses / 'minimal')
+    (courses / 'minimal' / 'wiki_content' / 'homepage.html').write_text('<html><head></head><body>stale</body></html>')
+    _package(courses / 'minimal.imscc')
+    out = tmp_path / 'public'
+
+    build_site(courses, out)
+    assert 'building from' in capsys.readouterr().out
+    assert 'stale' not in (out / 'minimal' / 'wiki_content' / 'homepage.html').read_text()
+
+    assert build_site(courses, out, incremental=True)['copied'] == 0
+
+    page = (SRC / 'wiki_content' / 'homepage.html').read_text().replace('Minimal Course', 'Edited Course')
+    _package(courses / 'minimal.imscc', replace={'wiki_content/homepage.html': page.encode()})
+    edited = build_site(courses, out, incremental=True)
+    assert edited['copied'] == 1 and edited['rendered'] == 0
+    assert 'Edited Course' in (out / 'minimal' / 'wiki_content' / 'homepage.html').read_text()
+
+
+def test_reload_closes_the_previous_package_reader(tmp_path):
+    pkg = _package(tmp_path / 'minimal.imscc')
+    export = CanvasExport(str(pkg))
+    old = export.archive
+    export.read('wiki_content/homepage.html')
+    assert old._handles
+    _package(pkg, replace={'course_settings/course_settings.xml': b'<course><title>Renamed</title></course>'})
+    os.utime(pkg, ns=(1, 1))
+    assert export.reload_if_changed()
+    assert old._handles == [] and export.archive is not old
+    assert export.read('wiki_content/homepage.html')
+
+
+def test_viewer_rejects_a_package(tmp_path):
+    with pytest.raises(ValueError, match='course package'):
+        create_app(str(_package(tmp_path / 'minimal.imscc')))
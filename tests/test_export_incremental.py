@@ -0,0 +1,59 @@
+import os
+import shutil
+from pathlib import Path
+
+from scripts.export_courses import build_site
+
+
+def _courses(tmp_path):
+    src = Path(__file__).resolve().parents[1] / 'courses' / 'minimal-course-export'
+    courses = tmp_path / 'courses'
+    shutil.copytree(src, courses / 'minimal')
+    return courses
+
+
+def test_incremental_build_skips_copies_and_deletes(tmp_path):
+    courses = _courses(tmp_path)
+    out = tmp_path / 'public'
+    course = courses / 'minimal'
+
+    first = build_site(courses, out)
+    assert first['copied'] > 0 and first['rendered'] == 4
+    assert (out / '.build-manifest.json').exists()
+
+    again = build_site(courses, out, incremental=True)
+    assert again['copied'] == 0 and again['rendered'] == 0 and again['skipped'] > 0
+
+    # a page edit copies (and re-injects) that one page; listings are untouched
+    page = course / 'wiki_content' / 'homepage.html'
+    page.write_text(page.read_text().replace('Minimal Course', 'Edited Course'))
+    edited = build_site(courses, out, incremental=True)
+    assert edited['copied'] == 1 and edited['rendered'] == 0
+    html = (out / 'minimal' / 'wiki_content' / 'homepage.html').read_text()
+    assert 'Edited Course' in html and 'canvas_viewer.css' in html
+
+    # touching a file without changing it is detected by its hash
+    os.utime(page, ns=(1, 1))
+    assert build_site(courses, out, incremental=True)['copied'] == 0
+
+    # removing a file deletes its output and re-renders the files listing
+    (course / 'web_resources' / 'sample.txt').unlink()
+    removed = build_site(courses, out, incremental=True)
+    assert removed['deleted'] == 1 and removed['rendered'] >= 1
+    assert not (out / 'minimal' / 'web_resources' / 'sample.txt').exists()
+
+    # a deleted output is restored even though its input did not change
+    (out / 'minimal' / 'pages.html').unlink()
+    assert build_site(courses, out, incremental=True)['rendered'] == 1
+    assert (out / 'minimal' / 'pages.html').exists()
+
+
+def test_incremental_build_removes_deleted_courses(tmp_path):
+    courses = _courses(tmp_path)
+    shutil.copytree(courses / 'minimal', courses / 'other')
+    out = tmp_path / 'public'
+    build_site(courses, out)
+    shutil.rmtree(courses / 'other')
+    build_site(courses, out, incremental=True)
+    assert not (out / 'other').exists()
+    assert './other/index.html' not in (out / 'index.html').read_text()
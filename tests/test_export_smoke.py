@@ -27,3 +27,68 @@ def test_export_includes_viewer_css(tmp_path):
                 break
 
     assert found, "Expected at least one course to contain _static/canvas_viewer.css"
+
+
+def _courses_fixture(tmp_path, names):
+    src = Path(__file__).resolve().parents[1] / 'courses' / 'minimal-course-export'
+    courses = tmp_path / 'courses'
+    for name in names:
+        shutil.copytree(src, courses / name)
+    return courses
+
+
+def test_parallel_build_isolates_failures_and_keeps_order(tmp_path, capsys):
+    courses = _courses_fixture(tmp_path, ['b-course', 'a-course', 'c-broken'])
+    (courses / 'c-broken' / 'imsmanifest.xml').write_text('<manifest')
+    out_dir = tmp_path / 'public'
+
+    build_site(courses, out_dir, jobs=2)
+
+    log = capsys.readouterr().out
+    assert log.index('----- a-course -----') < log.index('----- b-course -----') < log.index('----- c-broken -----')
+    assert (out_dir / 'a-course' / 'index.html').exists()
+    assert (out_dir / 'b-course' / 'index.html').exists()
+    root = (out_dir / 'index.html').read_text()
+    assert root.index('./a-course/index.html') < root.index('./b-course/index.html')
+    assert 'c-broken' not in root
+
+
+def test_export_templates_compile_once_and_escape(tmp_path, monkeypatch):
+    from canvas_viewer.templating import export_environment
+
+    monkeypatch.setenv('CANVAS_CACHE_DIR', str(tmp_path / 'cache'))
+    courses = _courses_fixture(tmp_path, ['a', 'b'])
+    build_site(courses, tmp_path / 'public')
+
+    env = export_environment(str(tmp_path / 'cache'))
+    assert env.get_template('export/course_index.html') is env.get_template('export/course_index.html')
+    assert any((tmp_path / 'cache' / 'jinja').iterdir())
+    html = env.get_template('export/pages.html').render(title='Tom & Jerry <3', pages=[], css_href='x.css')
+    assert 'Tom &amp; Jerry &lt;3' in html
+    # module dicts have an 'items' key, which must not resolve to dict.items
+    modules = [{'title': 'Week 1', 'items': [{'title': 'Intro', 'href': 'wiki_content/intro.html'}]}]
+    html = env.get_template('export/modules.html').render(title='c', modules=modules, css_href='x.css')
+    assert 'href="./wiki_content/intro.html">Intro</a>' in html
+
+
+def test_profile_reports_stages_and_keeps_slowest_cprofile_dumps(tmp_path):
+    import json
+
+    courses = _courses_fixture(tmp_path, ['a', 'b', 'c-broken'])
+    (courses / 'c-broken' / 'imsmanifest.xml').write_text('<manifest')
+    report = tmp_path / 'profile.json'
+    dumps = tmp_path / 'prof'
+
+    totals = build_site(courses, tmp_path / 'public', profile=report, cprofile_dir=dumps, cprofile_top=1)
+
+    assert totals['failed'] == ['c-broken']
+    data = json.loads(report.read_text())
+    assert set(data['stages']) == {'prepare', 'courses', 'index'}
+    assert set(data['course_stages']) == {'scan', 'parse', 'copy', 'inject', 'render', 'search'}
+    seconds = [c['seconds'] for c in data['courses']]
+    assert sorted(c['name'] for c in data['courses']) == ['a', 'b'] and seconds == sorted(seconds, reverse=True)
+    assert data['course_stages']['render']['files'] == 8
+    assert data['course_stages']['inject']['bytes'] > 0
+    assert data['failed'] == ['c-broken']
+    assert [Path(p).name for p in data['cprofile']] == [data['courses'][0]['name'] + '.prof']
+    assert sorted(p.name for p in dumps.iterdir()) == [data['courses'][0]['name'] + '.prof']
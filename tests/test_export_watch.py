@@ -0,0 +1,90 @@
+import json
+import shutil
+import threading
+import time
+import zipfile
+
+from benchmarks.synthetic import make_course
+from scripts.export_courses import SiteWatcher
+
+
+def _site(tmp_path):
+    courses = tmp_path / 'courses'
+    make_course(courses / 'a', pages=3, files=2, words_per_page=20, seed=1)
+    make_course(courses / 'b', pages=2, files=2, words_per_page=20, seed=2)
+    return courses, tmp_path / 'public'
+
+
+def _site_docs(out):
+    return [d[0] for d in json.loads((out / '_search' / 'index.json').read_text())['docs']]
+
+
+def test_rebuilds_only_what_changed(tmp_path):
+    courses, out = _site(tmp_path)
+    watcher = SiteWatcher(courses, out)
+    watcher.build()
+    assert watcher.changes() == set()
+    b_index = (out / 'b' / 'index.html').stat().st_mtime_ns
+
+    page = courses / 'a' / 'wiki_content' / 'page-00001.html'
+    page.write_text(page.read_text().replace('</body>', '<p>wombat</p></body>'))
+    assert watcher.changes() == {'a'}
+    totals = watcher.rebuild({'a'})
+    # the page is copied and injected again; no listing is re-rendered and b is not looked at
+    assert totals['copied'] == 1 and totals['rendered'] == 0
+    assert b'wombat' in (out / 'a' / 'wiki_content' / 'page-00001.html').read_bytes()
+    assert (out / 'b' / 'index.html').stat().st_mtime_ns == b_index
+    assert 'b/wiki_content/page-00000.html' in _site_docs(out)
+    assert 'href="./b/index.html"' in (out / 'index.html').read_text()
+
+    (courses / 'a' / 'web_resources' / 'file-00000.txt').write_text('changed')
+    totals = watcher.rebuild(watcher.changes())
+    assert totals['copied'] == 1 and totals['rendered'] == 1   # files.html
+
+    shutil.rmtree(courses / 'b')
+    assert watcher.changes() == {'b'}
+    watcher.rebuild({'b'})
+    assert not (out / 'b').exists() and 'href="./b/index.html"' not in (out / 'index.html').read_text()
+    assert not [d for d in _site_docs(out) if d.startswith('b/')]
+
+
+def test_picks_up_new_packages(tmp_path):
+    courses, out = _site(tmp_path)
+    watcher = SiteWatcher(courses, out)
+    watcher.build()
+    src = make_course(tmp_path / 'src', pages=2, files=1, words_per_page=20, seed=3)
+    with zipfile.ZipFile(courses / 'c.imscc', 'w') as z:
+        for f in sorted(src.rglob('*')):
+            if f.is_file():
+                z.write(f, f.relative_to(src).as_posix())
+    assert watcher.changes() == {'c'}
+    watcher.rebuild({'c'})
+    assert (out / 'c' / 'wiki_content' / 'page-00000.html').exists()
+    assert 'href="./c/index.html"' in (out / 'index.html').read_text()
+
+
+def test_run_debounces_and_stops(tmp_path, monkeypatch):
+    courses, out = _site(tmp_path)
+    watcher = SiteWatcher(courses, out, debounce=0.1)
+    rebuilds = []
+    rebuild = watcher.rebuild
+    monkeypatch.setattr(watcher, 'rebuild', lambda names: rebuilds.append(set(names)) or rebuild(names))
+    stop = threading.Event()
+    thread = threading.Thread(target=watcher.run, kwargs={'interval': 0.05, 'stop': stop})
+    thread.start()
+    try:
+        deadline = time.monotonic() + 10
+        while not (out / 'index.html').exists() and time.monotonic() < deadline:
+            time.sleep(0.02)
+        for name in ('a', 'b'):
+            page = courses / name / 'wiki_content' / 'page-00000.html'
+            page.write_text(page.read_text().replace('</body>', '<p>numbat</p></body>'))
+        target = out / 'b' / 'wiki_content' / 'page-00000.html'
+        while b'numbat' not in target.read_bytes() and time.monotonic() < deadline:
+            time.sleep(0.02)
+    finally:
+        stop.set()
+        thread.join(10)
+    assert not thread.is_alive()
+    assert rebuilds and set().union(*rebuilds) == {'a', 'b'}
+    assert b'numbat' in (out / 'a' / 'wiki_content' / 'page-00000.html').read_bytes()
@@ -0,0 +1,40 @@
+import os
+import shutil
+
+from canvas_viewer.app import create_app
+from canvas_viewer.cache import GenerationCache
+
+
+def test_generation_cache_drops_old_generations():
+    cache = GenerationCache('test')
+    calls = []
+    assert cache.get_or_compute('a', 1, lambda: calls.append(1) or 'one') == 'one'
+    assert cache.get_or_compute('a', 1, lambda: calls.append(1) or 'again') == 'one'
+    assert cache.get_or_compute('b', 2, lambda: 'two') == 'two'
+    # generation 1 entries are evicted once generation 2 is seen
+    assert len(cache) == 1
+    assert calls == [1] and cache.hits == 1
+
+
+def test_nav_and_sidebar_fragments_are_rendered_once_per_generation(tmp_path):
+    src = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'courses', 'minimal-course-export'))
+    base = tmp_path / 'course'
+    shutil.copytree(src, base)
+    app = create_app(str(base))
+    app.config['EXPORT_RELOAD_INTERVAL'] = 0
+    fragments = app.extensions['canvas_caches']['fragments']
+    client = app.test_client()
+
+    r = client.get('/page/wiki_content/homepage.html')
+    assert b'sidebar-tree' in r.data and b'href="/pages"' in r.data
+    misses = fragments.misses
+    client.get('/page/wiki_content/homepage.html')
+    client.get('/files').data
+    assert fragments.misses == misses
+
+    # a manifest change starts a new generation and the sidebar follows it
+    manifest = base / 'imsmanifest.xml'
+    manifest.write_text(manifest.read_text().replace('<title>Home</title>', '<title>Start Here</title>'))
+    r = client.get('/page/wiki_content/homepage.html')
+    assert fragments.misses > misses
+    assert b'>Start Here</a>' in r.data
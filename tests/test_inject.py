@@ -0,0 +1,44 @@
+import shutil
+from pathlib import Path
+
+from scripts.export_courses import CourseBuild, inject_css_bytes, inject_page_bytes
+
+HREF = '../_static/canvas_viewer.css'
+
+
+def test_fast_path_splices_after_head_tag():
+    raw = b'<!DOCTYPE html>\n<html><HEAD lang="en"><title>T</title></HEAD><body><header>x</header></body></html>'
+    out = inject_css_bytes(raw, HREF)
+    assert out == raw.replace(b'<HEAD lang="en">', b'<HEAD lang="en"><link rel="stylesheet" href="../_static/canvas_viewer.css">')
+    # already linked: left alone
+    assert inject_css_bytes(out, HREF) is None
+
+
+def test_fallback_handles_missing_head_and_commented_head():
+    out = inject_css_bytes(b'<html><body><header>x</header><p>hi</p></body></html>', HREF)
+    assert b'<head><link rel="stylesheet" href="../_static/canvas_viewer.css">' in out
+    assert b'<header>x</header>' in out
+    commented = inject_css_bytes(b'<html><!-- <head> --><head><title>T</title></head><body></body></html>', HREF)
+    assert commented.count(b'canvas_viewer.css') == 1
+    assert b'<!-- <head> -->' in commented
+
+
+def test_inject_page_bytes_rewrites_before_injecting():
+    raw = b'<html><head></head><body><a href="x">x</a></body></html>'
+    out = inject_page_bytes(raw, HREF, rewrite=lambda b: b.replace(b'href="x"', b'href="y"'))
+    assert out == b'<html><head><link rel="stylesheet" href="../_static/canvas_viewer.css"></head><body><a href="y">x</a></body></html>'
+    # already linked: returned as it was
+    assert inject_page_bytes(out, HREF) == out
+
+
+def test_render_pages_lays_out_every_page(tmp_path):
+    src = Path(__file__).resolve().parents[1] / 'courses' / 'minimal-course-export'
+    course = tmp_path / 'minimal'
+    shutil.copytree(src, course, ignore=shutil.ignore_patterns('.canvas_viewer'))
+    build = CourseBuild(course, tmp_path / 'public')
+    build.scan()
+    build.parse()
+    rendered = dict(build.render_pages(['wiki_content/homepage.html']))
+    page = rendered['wiki_content/homepage.html']
+    assert b'href="../_static/canvas_viewer.css"' in page
+    assert b'<nav' in page
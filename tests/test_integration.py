@@ -92,3 +92,17 @@ def test_example_pages_smoke():
         # no wiki pages present in this export - skip page-specific assertions
         import pytest
         pytest.skip('No wiki_content pages in selected export; skipping page assertions')
+
+
+def test_listings_are_streamed():
+    import os
+    from canvas_viewer.app import create_app
+
+    base = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'courses', 'minimal-course-export'))
+    client = create_app(base).test_client()
+    r = client.get('/files')
+    assert r.is_streamed
+    assert b'/file/res-web-file' in r.data
+    r2 = client.get('/quizzes')
+    assert r2.is_streamed
+    assert b'No items found' in r2.data
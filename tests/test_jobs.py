@@ -0,0 +1,106 @@
+import os
+import shutil
+import threading
+import time
+
+from canvas_viewer.jobs import JobRunner
+
+
+def test_inline_runner_versions_results_by_generation():
+    runner = JobRunner(max_workers=0)
+    calls = []
+
+    def work(job):
+        calls.append(job.generation)
+        job.set_progress(0.5, 'halfway')
+        return f'report-{job.generation}'
+
+    j1 = runner.submit('report', 1, work)
+    assert j1.status == 'done' and j1.result == 'report-1'
+    # same generation is not recomputed
+    assert runner.submit('report', 1, work) is j1
+    j2 = runner.submit('report', 2, work)
+    assert calls == [1, 2]
+    assert runner.latest('report') is j2
+    assert runner.get('report', 1).result == 'report-1'
+
+
+def test_failed_job_is_retried_and_keeps_previous_result():
+    runner = JobRunner(max_workers=0)
+    runner.submit('report', 1, lambda job: 'ok')
+    failed = runner.submit('report', 2, lambda job: 1 / 0)
+    assert failed.status == 'failed' and 'ZeroDivisionError' in failed.error
+    assert runner.latest('report').generation == 1
+    retried = runner.submit('report', 2, lambda job: 'ok again')
+    assert retried is not failed and retried.result == 'ok again'
+
+
+def test_failed_jobs_of_old_generations_are_pruned():
+    runner = JobRunner(max_workers=0)
+    runner.submit('report', 1, lambda job: 1 / 0)
+    runner.submit('report', 2, lambda job: 'ok')
+    # superseded by a done generation
+    assert runner.get('report', 1) is None
+    for generation in (3, 4, 5):
+        runner.submit('report', generation, lambda job: 1 / 0)
+    # failures keep coming: only the last KEEP_GENERATIONS of them, plus the last good report
+    assert sorted(runner._jobs['report']) == [2, 4, 5]
+    assert runner.latest('report').generation == 2
+    runner.submit('report', 6, lambda job: 'ok')
+    assert sorted(runner._jobs['report']) == [6]
+
+
+def test_threaded_runner_runs_off_the_calling_thread():
+    runner = JobRunner(max_workers=1)
+    release = threading.Event()
+    seen = {}
+
+    def work(job):
+        seen['thread'] = threading.current_thread().name
+        release.wait(5)
+        return 42
+
+    job = runner.submit('slow', 1, work)
+    assert not job.done
+    assert runner.latest('slow') is None
+    release.set()
+    assert job.wait(5)
+    assert job.result == 42 and seen['thread'].startswith('canvas-job')
+    runner.shutdown()
+
+
+def _wait_for(client, generation, timeout=5):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        data = client.get('/canvas-data/progress').get_json()
+        if data['latest_generation'] == generation:
+            return data
+        time.sleep(0.05)
+    raise AssertionError('report was not refreshed in time')
+
+
+def test_canvas_data_serves_cached_report_and_refreshes(tmp_path):
+    from canvas_viewer.app import create_app
+
+    src = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'courses', 'minimal-course-export'))
+    base = tmp_path / 'course'
+    shutil.copytree(src, base)
+    app = create_app(str(base))
+    app.config['EXPORT_RELOAD_INTERVAL'] = 0
+    client = app.test_client()
+
+    r = client.get('/canvas-data')
+    assert r.status_code == 200
+    data = _wait_for(client, 1)
+    assert data['status'] == 'done' and data['progress'] == 1.0
+    r = client.get('/canvas-data')
+    assert b'Refreshing report' not in r.data
+    assert b'external.example.com' in r.data
+
+    # touching the manifest starts a new export generation; the old report stays available
+    manifest = base / 'imsmanifest.xml'
+    os.utime(manifest, ns=(1, 1))
+    data = _wait_for(client, 2)
+    assert data['current_generation'] == 2
+    r = client.get('/canvas-data')
+    assert b'external.example.com' in r.data
@@ -0,0 +1,27 @@
+from pathlib import Path
+
+import pytest
+
+from benchmarks.loadtest import Workload, parse_mix, percentile, run_load, run_server
+
+FIXTURE = Path(__file__).resolve().parents[1] / 'courses' / 'minimal-course-export'
+
+
+def test_percentile_and_mix():
+    values = sorted(range(1, 101))
+    assert [percentile(values, p) for p in (50, 95, 99, 100)] == [50, 95, 99, 100]
+    assert percentile([7], 99) == 7 and percentile([], 50) is None
+    assert parse_mix('page=3, range') == {'page': 3.0, 'range': 1.0}
+    with pytest.raises(ValueError):
+        parse_mix('pages=1')
+
+
+def test_mixed_load_against_a_local_server(tmp_path, monkeypatch):
+    monkeypatch.setenv('CANVAS_CACHE_DIR', str(tmp_path / 'cache'))
+    workload = Workload(FIXTURE, parse_mix('page=1,listing=1,static=1,range=1,canvas_data=1'))
+    with run_server('werkzeug', FIXTURE) as port:
+        report = run_load(port, workload, concurrency=2, duration=0.5, warmup=0)
+    # range requests must come back as 206 Partial Content to count as successes
+    assert report['total']['requests'] > 0 and report['total']['errors'] == 0
+    assert '/static/<file> (range)' in report['routes']
+    assert report['total']['p50_ms'] <= report['total']['p99_ms']
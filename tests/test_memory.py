@@ -0,0 +1,62 @@
+import os
+
+from canvas_viewer.app import create_app
+from canvas_viewer.cache import GenerationCache
+from canvas_viewer.memory import cache_sizes, deep_sizeof
+
+BASE = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'courses', 'minimal-course-export'))
+
+
+def test_deep_sizeof_counts_shared_objects_once():
+    blob = 'x' * 10000
+    assert deep_sizeof([blob]) > 10000
+    assert deep_sizeof([blob, blob]) < 2 * 10000
+    seen = set()
+    deep_sizeof({'a': blob}, seen)
+    # already charged to the first structure
+    assert deep_sizeof({'b': blob}, seen) < 10000
+
+    cache = GenerationCache('test')
+    cache.get_or_compute(('k', 1), 1, lambda: blob)
+    sizes = cache_sizes({'fragments': cache})['fragments']
+    assert sizes['entries'] == 1 and sizes['bytes'] > 10000 and sizes['misses'] == 1
+
+
+def test_memory_report_and_tracemalloc_endpoints(tmp_path, monkeypatch):
+    monkeypatch.setenv('CANVAS_CACHE_DIR', str(tmp_path / 'cache'))
+    monkeypatch.setenv('CANVAS_ADMIN_TOKEN', 'secret')
+    client = create_app(BASE).test_client()
+    client.environ_base['HTTP_X_ADMIN_TOKEN'] = 'secret'
+    report = client.get('/_admin/memory').get_json()
+    assert report['export']['bytes'] > 0 and 'resources' in report['export']['structures']
+    assert {'fragments', 'refs', 'search.docs', 'templates'} <= set(report['caches'])
+
+    assert client.get('/_admin/memory/tracemalloc').status_code == 409
+    assert client.post('/_admin/memory/tracemalloc', data={'action': 'start'}).status_code == 200
+    try:
+        first = client.get('/_admin/memory/tracemalloc?group=module').get_json()
+        assert first['tracing'] and first['top'] and first['diff'] is None
+        client.get('/page/wiki_content/homepage.html')
+        second = client.get('/_admin/memory/tracemalloc?group=module').get_json()
+        assert isinstance(second['diff'], list)
+        assert client.get('/_admin/memory/tracemalloc?group=nope').status_code == 400
+    finally:
+        client.post('/_admin/memory/tracemalloc', data={'action': 'stop'})
+
+
+def test_admin_endpoints_need_the_token(tmp_path, monkeypatch):
+    monkeypatch.setenv('CANVAS_CACHE_DIR', str(tmp_path / 'cache'))
+    monkeypatch.setenv('CANVAS_ADMIN_TOKEN', 'secret')
+    client = create_app(BASE).test_client()
+    assert client.get('/_admin/memory').status_code == 403
+    assert client.get('/_admin/memory', headers={'X-Admin-Token': 'wrong'}).status_code == 403
+    assert client.get('/_admin/memory', headers={'X-Admin-Token': 'secret'}).status_code == 200
+
+
+def test_admin_endpoints_are_off_without_a_token(tmp_path, monkeypatch):
+    monkeypatch.setenv('CANVAS_CACHE_DIR', str(tmp_path / 'cache'))
+    monkeypatch.delenv('CANVAS_ADMIN_TOKEN', raising=False)
+    client = create_app(BASE).test_client()
+    # even from this machine
+    assert client.get('/_admin/memory', environ_base={'REMOTE_ADDR': '127.0.0.1'}).status_code == 403
+    assert client.post('/_admin/memory/tracemalloc', data={'action': 'start'}).status_code == 403
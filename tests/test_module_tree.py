@@ -0,0 +1,71 @@
+from canvas_viewer.app import create_app
+from canvas_viewer.parser import CanvasExport
+
+NS = 'http://www.imsglobal.org/xsd/imsccv1p1/imscp_v1p1'
+
+
+def _write_export(base, items_xml, resources_xml=''):
+    base.mkdir(parents=True, exist_ok=True)
+    (base / 'imsmanifest.xml').write_text(
+        f'<?xml version="1.0" encoding="UTF-8"?><manifest xmlns="{NS}" identifier="t">'
+        f'<organizations><organization identifier="org">{items_xml}</organization></organizations>'
+        f'<resources>{resources_xml}</resources></manifest>'
+    )
+    return base
+
+
+def _modules_export(tmp_path):
+    resources = ''.join(
+        f'<resource identifier="r{i}" type="webcontent" href="wiki_content/p{i}.html"/>' for i in range(4)
+    )
+    items = (
+        '<item identifier="root"><title>Course</title>'
+        '<item identifier="m1"><title>Week 1</title>'
+        '<item identifier="a" identifierref="r0"><title>Intro</title></item>'
+        '<item identifier="b" identifierref="r1"><title>Reading</title></item></item>'
+        '<item identifier="m2"><title>Week 2</title>'
+        '<item identifier="c" identifierref="r2"><title>Lab</title></item>'
+        '<item identifier="sub"><title>Extras</title><item identifier="d" identifierref="r3"><title>Bonus</title></item></item>'
+        '</item></item>'
+    )
+    return _write_export(tmp_path / 'course', items, resources)
+
+
+def test_tree_is_breadth_first_with_contiguous_children(tmp_path):
+    e = CanvasExport(str(_modules_export(tmp_path)))
+    tree = e.org_tree
+    weeks = list(tree.children(1))
+    assert [tree.title[i] for i in weeks] == ['Week 1', 'Week 2']
+    assert [tree.title[i] for i in tree.children(weeks[1])] == ['Lab', 'Extras']
+    assert all(tree.parent[c] == weeks[0] for c in tree.children(weeks[0]))
+    # nested view keeps the legacy shape
+    assert e.organizations[0]['children'][1]['children'][1]['children'][0]['title'] == 'Bonus'
+
+
+def test_get_modules_from_flat_tree(tmp_path):
+    e = CanvasExport(str(_modules_export(tmp_path)))
+    mods = e.get_modules()
+    assert [m['title'] for m in mods] == ['Week 1', 'Week 2']
+    assert mods[1]['items'] == [{'title': 'Lab', 'href': 'wiki_content/p2.html'}, {'title': 'Extras', 'href': None}]
+    assert all(m['items'] == [] for m in e.get_modules(include_items=False))
+
+
+def test_deeply_nested_manifest_does_not_recurse(tmp_path):
+    # deeper than Python's default recursion limit (libxml2 itself stops at 2048 levels)
+    depth = 1500
+    items = '<item identifier="i"><title>x</title>' * depth + '</item>' * depth
+    e = CanvasExport(str(_write_export(tmp_path / 'deep', items)))
+    assert len(e.org_tree) == depth + 1
+    assert e.get_modules() == []
+
+
+def test_subtree_endpoint(tmp_path):
+    client = create_app(str(_modules_export(tmp_path))).test_client()
+    root = client.get('/modules/tree/0').get_json()
+    assert [c['title'] for c in root['children']] == ['Course']
+    week2 = client.get('/modules/tree/3').get_json()
+    assert week2['title'] == 'Week 2'
+    assert [(c['title'], c['has_children']) for c in week2['children']] == [('Lab', False), ('Extras', True)]
+    assert client.get('/modules/tree/999').status_code == 404
+    page = client.get('/modules')
+    assert b'data-module-node="2"' in page.data and b'Intro' not in page.data
@@ -31,3 +31,34 @@ def test_load_example():
     assert isinstance(cats, dict)
     for key in ('announcements', 'modules', 'quizzes', 'discussions', 'people', 'files'):
         assert key in cats
+
+
+def test_listing_iterators_match_lists():
+    import types
+    base = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'courses', 'minimal-course-export'))
+    exp = CanvasExport(base)
+    assert isinstance(exp.iter_files(), types.GeneratorType)
+    assert list(exp.iter_files()) == exp.get_files()
+    assert [f['href'] for f in exp.get_files()] == ['web_resources/sample.txt']
+    assert [p['href'] for p in exp.iter_pages_by_folder('wiki_content')] == ['wiki_content/homepage.html']
+
+
+def test_reload_keeps_running_listings_on_one_generation(tmp_path):
+    from benchmarks.synthetic import make_course
+    course = make_course(tmp_path / 'course', pages=6, files=0, modules=2)
+    exp = CanvasExport(str(course))
+    before = exp.state
+    pages = exp.iter_pages_by_folder('wiki_content')
+    first = next(pages)
+
+    # the manifest is rewritten with renamed resources while the listing is streaming
+    manifest = course / 'imsmanifest.xml'
+    manifest.write_text(manifest.read_text().replace('res-page-', 'res-renamed-page-'))
+    os.utime(manifest, ns=(1, 1))
+    assert exp.reload_if_changed()
+    assert exp.generation == 2 and before.generation == 1 and exp.state is not before
+
+    rest = list(pages)
+    assert [first] + rest == [{'id': i, 'href': before.resources[i]['href'],
+                               'title': os.path.basename(before.resources[i]['href'])} for i in before.href_order]
+    assert all(p['id'].startswith('res-renamed-page-') for p in exp.iter_pages_by_folder('wiki_content'))
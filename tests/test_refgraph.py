@@ -0,0 +1,114 @@
+import json
+import shutil
+from pathlib import Path
+
+from canvas_viewer.parser import CanvasExport
+from canvas_viewer.refgraph import build_reference_graph, page_links, resolve_link
+from scripts.export_courses import build_site
+
+SRC = Path(__file__).resolve().parents[1] / 'courses' / 'minimal-course-export'
+
+
+def test_resolve_link_placeholders_and_relative_paths():
+    assert resolve_link('$IMS-CC-FILEBASE$/Uploaded%20Media/a.png?canvas_download=1', 'wiki_content') \
+        == 'web_resources/Uploaded Media/a.png'
+    assert resolve_link('$WIKI_REFERENCE$/pages/week-1#top', 'wiki_content') == 'wiki_content/week-1.html'
+    assert resolve_link('../web_resources/x.pdf', 'wiki_content/sub') == 'wiki_content/web_resources/x.pdf'
+    assert resolve_link('../../web_resources/x.pdf', 'wiki_content/sub') == 'web_resources/x.pdf'
+    for external in ('https://example.com/a.png', '//cdn/x.js', 'mailto:a@b', '#top', '$CANVAS_COURSE_REFERENCE$/modules',
+                     '../../../etc/passwd'):
+        assert resolve_link(external, 'wiki_content') is None
+
+
+def test_srcset_candidates_are_links():
+    page = b'<img src="a.png" srcset="a.png 1x, ../web_resources/b%20c.png 2x,https://cdn/x.png 3x">'
+    assert page_links(page, 'wiki_content/p.html') == {'wiki_content/a.png', 'web_resources/b c.png'}
+
+
+def test_css_urls_in_style_attributes_and_elements():
+    page = (b'<div style="background: url(&quot;$IMS-CC-FILEBASE$/bg.png&quot;)"></div>'
+            b"<p style='background:url(../web_resources/p.jpg)'>url(prose.png)</p>"
+            b'<style>.a { background: url("s.png") } .b { background: url(data:image/png;base64,AA) }</style>')
+    assert page_links(page, 'wiki_content/p.html') == {
+        'web_resources/bg.png', 'web_resources/p.jpg', 'wiki_content/s.png'}
+
+
+def _course(tmp_path):
+    course = tmp_path / 'courses' / 'minimal'
+    shutil.copytree(SRC, course, ignore=shutil.ignore_patterns('.canvas_viewer'))
+    web = course / 'web_resources'
+    (web / 'Uploaded Media').mkdir()
+    (web / 'Uploaded Media' / 'photo.png').write_bytes(b'png')
+    (web / 'orphan.pdf').write_bytes(b'%PDF' * 100)
+    (web / 'discussion.png').write_bytes(b'png')
+    page = course / 'wiki_content' / 'homepage.html'
+    page.write_text(page.read_text().replace(
+        '</body>', '<img src="$IMS-CC-FILEBASE$/Uploaded%20Media/photo.png"><a href="../web_resources/gone.pdf">x</a></body>'))
+    # a discussion topic outside the exported folders, with its HTML escaped in XML
+    (course / 'd1').mkdir()
+    (course / 'd1' / 'topic.xml').write_text(
+        '<topic><text>&lt;img src="$IMS-CC-FILEBASE$/discussion.png"&gt;</text></topic>')
+    manifest = course / 'imsmanifest.xml'
+    manifest.write_text(manifest.read_text().replace('</resources>', '''
+    <resource identifier="d1" type="imsdt_xmlv1p1"><file href="d1/topic.xml"/></resource>
+    <resource identifier="f1" type="webcontent" href="web_resources/orphan.pdf"><file href="web_resources/orphan.pdf"/></resource>
+  </resources>'''))
+    return course
+
+
+def test_graph_orphans_missing_and_used_by(tmp_path):
+    graph = build_reference_graph(CanvasExport(str(_course(tmp_path))), workers=2)
+    assert graph.orphans() == ['web_resources/orphan.pdf']
+    assert graph.missing() == {'web_resources/gone.pdf': ['wiki_content/homepage.html']}
+    assert graph.used_by('web_resources/Uploaded Media/photo.png') == ['wiki_content/homepage.html']
+    assert graph.used_by('web_resources/discussion.png') == ['d1/topic.xml']
+
+
+def test_stylesheets_keep_their_fonts_and_images(tmp_path):
+    course = _course(tmp_path)
+    css = course / 'web_resources' / 'css'
+    (css / 'fonts').mkdir(parents=True)
+    (css / 'fonts' / 'f.woff2').write_bytes(b'wOF2')
+    (course / 'web_resources' / 'bg.png').write_bytes(b'png')
+    (css / 'base.css').write_text('body { background: url("../bg.png") }')
+    (css / 'site.css').write_text('@import "base.css";\n'
+                                  "@font-face { src: url('fonts/f.woff2') format('woff2') }\n")
+    page = course / 'wiki_content' / 'homepage.html'
+    page.write_text(page.read_text().replace('</body>', '<link rel="stylesheet" href="../web_resources/css/site.css"></body>'))
+    graph = build_reference_graph(CanvasExport(str(course)))
+    assert graph.orphans() == ['web_resources/orphan.pdf']
+    assert graph.used_by('web_resources/css/fonts/f.woff2') == ['web_resources/css/site.css']
+    assert graph.used_by('web_resources/bg.png') == ['web_resources/css/base.css']
+
+
+def test_only_referenced_export_and_orphan_report(tmp_path):
+    course = _course(tmp_path)
+    out = tmp_path / 'public'
+    report = tmp_path / 'orphans.json'
+    build_site(course.parent, out, only_referenced=True, orphan_report=report)
+
+    web = out / 'minimal' / 'web_resources'
+    assert (web / 'Uploaded Media' / 'photo.png').exists() and (web / 'discussion.png').exists()
+    assert not (web / 'orphan.pdf').exists()
+    assert 'orphan.pdf' not in (out / 'minimal' / 'files.html').read_text()
+    data = json.loads(report.read_text())['minimal']
+    assert data['orphans'] == [{'path': 'web_resources/orphan.pdf', 'bytes': 400}]
+    assert data['used_by']['web_resources/sample.txt'] == ['wiki_content/homepage.html']
+
+    # linking the orphan from a page brings it back on the next incremental build
+    page = course / 'wiki_content' / 'homepage.html'
+    page.write_text(page.read_text().replace('</body>', '<a href="../web_resources/orphan.pdf">pdf</a></body>'))
+    build_site(course.parent, out, incremental=True, only_referenced=True)
+    assert (web / 'orphan.pdf').exists()
+    assert 'orphan.pdf' in (out / 'minimal' / 'files.html').read_text()
+
+
+def test_used_by_route(tmp_path):
+    from canvas_viewer.app import create_app
+
+    client = create_app(str(_course(tmp_path))).test_client()
+    data = client.get('/files/used-by/web_resources/Uploaded Media/photo.png').get_json()
+    assert data['used_by'] == ['wiki_content/homepage.html'] and data['referenced']
+    data = client.get('/files/used-by/web_resources/orphan.pdf').get_json()
+    assert data['used_by'] == [] and not data['referenced']
+    assert client.get('/files/used-by/web_resources/nope.pdf').status_code == 404
@@ -0,0 +1,83 @@
+import shutil
+from pathlib import Path
+
+from canvas_viewer.rendering import StaticLinks, rewrite_page, viewer_link
+from scripts.export_courses import PagePool, PageRenderer, build_site
+
+PAGE = b'''<html><head><title>T</title><style>p {color: red}</style>
+<link rel="stylesheet" href="canvas.css"></head><body>
+<p style="color: blue">Intro</p>
+<a href="$CANVAS_COURSE_REFERENCE$/modules">Modules</a>
+<a href="$CANVAS_COURSE_REFERENCE$/assignments/3">Assignment</a>
+<a href="$WIKI_REFERENCE$/pages/week-2#top">Week 2</a>
+<img src="$IMS-CC-FILEBASE$/images/cat%20photo.png">
+<a href="other.html">Other</a>
+<a href="../web_resources/notes.pdf">Notes</a>
+<a href="https://example.com/x">External</a>
+<a href="#top">Top</a>
+</body></html>'''
+
+
+def _links(out):
+    from lxml import html
+    doc = html.fromstring(out)
+    return [el.get('href') or el.get('src') for el in doc.xpath('//a | //img')]
+
+
+def test_viewer_links_match_the_viewer_routes():
+    out = rewrite_page(PAGE, 'wiki_content/week-1.html', viewer_link)
+    assert 'style' not in out and 'canvas.css' not in out
+    assert _links(out) == [
+        '/modules', '/assignments/3', '/page/wiki_content/week-2.html',
+        '/static/web_resources/images/cat%20photo.png', '/page/wiki_content/other.html',
+        '/static/web_resources/notes.pdf', 'https://example.com/x', '#top',
+    ]
+
+
+def test_static_links_are_relative_to_the_page():
+    out = rewrite_page(PAGE, 'wiki_content/week-1.html', StaticLinks('wiki_content/week-1.html'))
+    assert _links(out) == [
+        '../modules.html', '../index.html', 'week-2.html',
+        '../web_resources/images/cat%20photo.png', 'other.html',
+        '../web_resources/notes.pdf', 'https://example.com/x', '#top',
+    ]
+    link = StaticLinks('index.html', syllabus='course_settings/syllabus.html')
+    assert link('syllabus') == 'course_settings/syllabus.html'
+    assert link('static', 'canvas_viewer.css') == '_static/canvas_viewer.css'
+    assert link('root') == '../index.html'
+    # sections a static site does not have are left out of the templates
+    assert link('search') is None and link('tree') is None and StaticLinks('x.html')('syllabus') is None
+
+
+def test_page_pool_renders_like_the_renderer():
+    renderer = PageRenderer({'home': True, 'pages': True}, [{'node': 1, 'title': 'Week 1', 'href': 'wiki_content/week-1.html',
+                                                             'has_children': True}])
+    items = [(f'wiki_content/p{i}.html', PAGE) for i in range(8)] + [('course_settings/syllabus.html', PAGE)]
+    with PagePool(renderer, 2) as pool:
+        pooled = pool.map(items)
+    assert pooled == [renderer(rel, raw) for rel, raw in items]
+    page = pooled[0].decode('utf-8')
+    assert 'href="../_static/canvas_viewer.css"' in page and 'href="../pages.html"' in page
+    assert '<a href="week-1.html">Week 1</a>' in page
+    # no lazy tree endpoint in a static site
+    assert 'tree-toggle' not in page and 'module_tree.js' not in page
+
+
+def test_exported_pages_follow_the_module_structure(tmp_path):
+    src = Path(__file__).resolve().parents[1] / 'courses' / 'minimal-course-export'
+    course = tmp_path / 'courses' / 'minimal'
+    shutil.copytree(src, course)
+    out = tmp_path / 'public'
+    build_site(tmp_path / 'courses', out)
+    page = out / 'minimal' / 'wiki_content' / 'homepage.html'
+    html = page.read_text()
+    assert 'sidebar-modules' in html and 'src="../web_resources/sample.txt"' in html
+
+    # a renamed module item changes the sidebar of every page, so unchanged pages are rendered again
+    manifest = course / 'imsmanifest.xml'
+    text = manifest.read_text()
+    assert '<title>Home</title>' in text
+    manifest.write_text(text.replace('<title>Home</title>', '<title>Start here</title>'))
+    totals = build_site(tmp_path / 'courses', out, incremental=True)
+    assert totals['copied'] == 1
+    assert '>Start here</a>' in page.read_text()
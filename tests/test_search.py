@@ -0,0 +1,95 @@
+import os
+import shutil
+import threading
+import time
+
+from canvas_viewer import search as search_module
+from canvas_viewer.parser import CanvasExport
+from canvas_viewer.search import SearchIndex
+
+
+def _example_copy(tmp_path):
+    src = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'courses', 'minimal-course-export'))
+    dst = tmp_path / 'course'
+    shutil.copytree(src, dst)
+    return dst
+
+
+def test_search_ranks_and_highlights(tmp_path):
+    base = _example_copy(tmp_path)
+    idx = SearchIndex(CanvasExport(str(base)), cache_dir=str(tmp_path / 'cache'))
+    idx.build()
+    results = idx.search('minimal course')
+    assert results and results[0]['href'] == 'wiki_content/homepage.html'
+    assert '<mark>Minimal</mark>' in str(results[0]['snippet'])
+    assert idx.search('nonexistentword') == []
+    # positions are recorded per term
+    assert idx.postings['welcome']['wiki_content/homepage.html'] == [0]
+
+
+def test_search_index_persists_and_updates_incrementally(tmp_path):
+    base = _example_copy(tmp_path)
+    cache = str(tmp_path / 'cache')
+    idx = SearchIndex(CanvasExport(str(base)), cache_dir=cache)
+    idx.build()
+    assert os.path.exists(idx.index_path)
+
+    # a fresh index loads from disk and has nothing to re-index
+    idx2 = SearchIndex(CanvasExport(str(base)), cache_dir=cache)
+    assert idx2.load()
+    assert idx2.refresh(force=True) == 0
+    assert idx2.search('welcome')
+
+    page = base / 'wiki_content' / 'homepage.html'
+    page.write_text('<html><head><title>Home</title></head><body><p>Photosynthesis lecture notes</p></body></html>')
+    os.utime(page, ns=(1, 1))
+    assert idx2.refresh(force=True) == 1
+    assert idx2.search('photosynthesis')
+    assert idx2.search('welcome') == []
+
+
+def test_search_route(tmp_path, monkeypatch):
+    from canvas_viewer.app import create_app
+
+    base = _example_copy(tmp_path)
+    monkeypatch.setenv('CANVAS_CACHE_DIR', str(tmp_path / 'cache'))
+    client = create_app(str(base)).test_client()
+    r = client.get('/search?q=welcome')
+    assert r.status_code == 200
+    assert b'<mark>Welcome</mark>' in r.data
+    r = client.get('/search?q=welcome&format=json')
+    assert r.get_json()['results'][0]['href'] == 'wiki_content/homepage.html'
+
+
+def test_search_does_not_wait_for_the_index_write(tmp_path, monkeypatch):
+    base = _example_copy(tmp_path)
+    idx = SearchIndex(CanvasExport(str(base)), cache_dir=str(tmp_path / 'cache'))
+    idx.build()
+    writing, release = threading.Event(), threading.Event()
+    dump = search_module.json.dump
+
+    def slow_dump(*args, **kwargs):
+        writing.set()
+        release.wait(10)
+        dump(*args, **kwargs)
+    monkeypatch.setattr(search_module.json, 'dump', slow_dump)
+
+    page = base / 'wiki_content' / 'homepage.html'
+    page.write_text('<html><head><title>Home</title></head><body><p>Photosynthesis lecture notes</p></body></html>')
+    os.utime(page, ns=(1, 1))
+    assert idx.refresh_in_background()
+    try:
+        assert writing.wait(10)
+        # the refresh is stuck writing the file; queries already see the re-indexed page
+        started = time.perf_counter()
+        assert idx.search('photosynthesis')[0]['href'] == 'wiki_content/homepage.html'
+        assert time.perf_counter() - started < 1.0
+        # one refresh at a time
+        assert not idx.refresh_in_background()
+    finally:
+        release.set()
+    with idx._refresh_lock:
+        pass
+    monkeypatch.undo()
+    idx2 = SearchIndex(CanvasExport(str(base)), cache_dir=str(tmp_path / 'cache'))
+    assert idx2.load() and idx2.search('photosynthesis')
@@ -0,0 +1,69 @@
+import json
+import os
+
+from benchmarks.synthetic import make_course
+from canvas_viewer.search_shards import ShardedIndexWriter, shard_key
+from scripts.export_courses import build_site
+
+
+def _postings(index_dir, term):
+    meta = json.loads((index_dir / 'index.json').read_text())
+    key = shard_key(term, meta['prefix'])
+    if key not in meta['shards']:
+        return {}
+    shard = json.loads((index_dir / 't' / (key + '.json')).read_text(encoding='utf-8'))
+    plist = shard.get(term, [])
+    return {meta['docs'][plist[i]][0]: plist[i + 1] for i in range(0, len(plist), 2)}
+
+
+def test_shard_key_is_a_safe_unambiguous_file_name():
+    assert shard_key('lecture') == 'le'
+    assert shard_key('x') == 'x'
+    assert shard_key('_a') == '_5f_a'
+    assert shard_key('éa') == '_e9_a' != shard_key('ບ')
+
+
+def test_spooling_does_not_change_the_index(tmp_path):
+    pages = [(f'p{i}.html', f'Page {i}', f'alpha beta{i % 3} gamma alpha über {i}') for i in range(50)]
+    for name, spool in (('small', 64), ('large', 1 << 20)):
+        writer = ShardedIndexWriter(tmp_path / name, spool_bytes=spool)
+        for page in pages:
+            writer.add(*page)
+        stats = writer.finish()
+        assert stats['docs'] == 50
+    for sub in ('index.json', 't/al.json', 't/be.json', 't/_fc_b.json'):
+        assert (tmp_path / 'small' / sub).read_bytes() == (tmp_path / 'large' / sub).read_bytes()
+    assert _postings(tmp_path / 'small', 'alpha')['p7.html'] == 2
+    assert set(_postings(tmp_path / 'small', 'beta1')) == {f'p{i}.html' for i in range(1, 50, 3)}
+    assert not [p for p in os.listdir(tmp_path) if p.startswith('.search-')]
+
+
+def test_site_and_course_indexes(tmp_path):
+    courses = tmp_path / 'courses'
+    make_course(courses / 'a', pages=5, files=1, words_per_page=40, seed=1)
+    b = make_course(courses / 'b', pages=3, files=1, words_per_page=40, seed=2)
+    page = b / 'wiki_content' / 'page-00001.html'
+    page.write_text(page.read_text().replace('</body>', '<p>zygote zygote</p></body>'))
+    out = tmp_path / 'public'
+    totals = build_site(courses, out)
+    assert totals['search']['docs'] == 8
+
+    assert _postings(out / 'b' / '_search', 'zygote') == {'wiki_content/page-00001.html': 2}
+    assert _postings(out / '_search', 'zygote') == {'b/wiki_content/page-00001.html': 2}
+    site_docs = json.loads((out / '_search' / 'index.json').read_text())['docs']
+    assert [d[0] for d in site_docs][:6] == [f'a/wiki_content/page-{i:05d}.html' for i in range(5)] + \
+        ['b/wiki_content/page-00000.html']
+    assert 'search.js' in (out / 'index.html').read_text() and (out / 'b' / '_static' / 'search.js').exists()
+
+    # unchanged pages keep the course index; an edited page rebuilds it
+    index = out / 'a' / '_search' / 'index.json'
+    before = index.stat().st_mtime_ns
+    page.write_text(page.read_text().replace('zygote zygote', 'quokka'))
+    build_site(courses, out, incremental=True)
+    assert index.stat().st_mtime_ns == before
+    assert _postings(out / 'b' / '_search', 'zygote') == {}
+    assert _postings(out / '_search', 'quokka') == {'b/wiki_content/page-00001.html': 1}
+
+    build_site(courses, out, incremental=True, search=False)
+    assert not (out / '_search').exists() and not (out / 'a' / '_search').exists()
+    assert 'search.js' not in (out / 'index.html').read_text()
@@ -0,0 +1,92 @@
+import io
+import shutil
+import subprocess
+import tarfile
+import zipfile
+
+import pytest
+
+from benchmarks.synthetic import make_course
+from canvas_viewer import site_archive
+from canvas_viewer.site_archive import DEFAULT_MTIME, SiteArchive
+from scripts.export_courses import BUILD_MANIFEST, build_site, build_site_archive
+
+
+def _courses(tmp_path):
+    courses = tmp_path / 'courses'
+    make_course(courses / 'a', pages=4, files=3, words_per_page=30, seed=1)
+    make_course(courses / 'b', pages=2, files=2, words_per_page=30, seed=2)
+    return courses
+
+
+def _tree(out):
+    return {p.relative_to(out).as_posix(): p.read_bytes() for p in sorted(out.rglob('*'))
+            if p.is_file() and p.name != BUILD_MANIFEST}
+
+
+def _tar_members(path):
+    fileobj = None
+    if path.name.endswith('.zst'):
+        # tarfile cannot read zstd before Python 3.14
+        if site_archive.zstandard is not None:
+            data = site_archive.zstandard.ZstdDecompressor().decompressobj().decompress(path.read_bytes())
+        else:
+            data = subprocess.run(['zstd', '-dc', str(path)], check=True, capture_output=True).stdout
+        fileobj = io.BytesIO(data)
+    with tarfile.open(path if fileobj is None else None, fileobj=fileobj) as tar:
+        return {m.name: tar.extractfile(m).read() for m in tar.getmembers()}, tar.getmembers()
+
+
+HAVE_ZSTD = site_archive.zstandard is not None or shutil.which('zstd')
+
+
+@pytest.mark.parametrize('suffix', [
+    '.tar.gz', '.tar', '.zip',
+    pytest.param('.tar.zst', marks=pytest.mark.skipif(not HAVE_ZSTD, reason='needs zstandard or zstd')),
+])
+def test_archive_matches_tree_output_and_is_reproducible(tmp_path, suffix):
+    courses = _courses(tmp_path)
+    build_site(courses, tmp_path / 'public')
+    tree = _tree(tmp_path / 'public')
+
+    first, second = tmp_path / ('one' + suffix), tmp_path / ('two' + suffix)
+    totals = build_site_archive(courses, first)
+    build_site_archive(courses, second)
+    assert first.read_bytes() == second.read_bytes()
+    assert totals['archive']['files'] == len(tree) and not totals['failed']
+
+    if suffix == '.zip':
+        with zipfile.ZipFile(first) as z:
+            members = {i.filename: z.read(i) for i in z.infolist()}
+            names = [i.filename for i in z.infolist()]
+            assert {i.date_time for i in z.infolist()} == {(1980, 1, 1, 0, 0, 0)}
+    else:
+        members, infos = _tar_members(first)
+        names = [m.name for m in infos]
+        assert {(m.mtime, m.uid, m.mode) for m in infos} == {(DEFAULT_MTIME, 0, 0o644)}
+    assert members == tree
+    # courses first, each in path order, then the site-level files
+    assert names == sorted(n for n in names if n.startswith('a/')) + sorted(n for n in names if n.startswith('b/')) \
+        + sorted(n for n in names if '/' not in n or n.split('/', 1)[0] in ('_search', '_static'))
+
+
+def test_failed_course_writes_no_archive(tmp_path):
+    courses = _courses(tmp_path)
+    (courses / 'b' / 'imsmanifest.xml').write_text('<manifest')
+    archive = tmp_path / 'site.tar.gz'
+    totals = build_site_archive(courses, archive)
+    assert totals['failed'] == ['b']
+    assert not archive.exists() and not (tmp_path / 'site.tar.gz.tmp').exists()
+
+
+def test_site_archive_rejects_unknown_suffix(tmp_path):
+    with pytest.raises(ValueError):
+        SiteArchive(tmp_path / 'site.rar')
+
+
+def test_zip_stream_members(tmp_path):
+    with SiteArchive(tmp_path / 'x.zip') as sink:
+        sink.add_stream('big.bin', io.BytesIO(b'x' * 5000), 5000)
+        sink.add_bytes('small.txt', b'hi')
+    with zipfile.ZipFile(tmp_path / 'x.zip') as z:
+        assert z.read('big.bin') == b'x' * 5000 and z.read('small.txt') == b'hi'
@@ -0,0 +1,19 @@
+from benchmarks.synthetic import make_course
+from canvas_viewer.parser import CanvasExport
+from canvas_viewer.refgraph import page_links
+
+
+def test_synthetic_course_options(tmp_path):
+    course = make_course(tmp_path / 'course', pages=12, files=6, modules=3, module_depth=3, links_per_page=7,
+                         file_kb=2, files_meta=4)
+    exp = CanvasExport(str(course))
+    # modules sit under two levels of headings
+    assert [m['title'] for m in exp.get_modules()] == ['Unit 0.2', 'Unit 1.2', 'Unit 2.2']
+    files = exp.get_files()
+    assert sum(f['date_source'] == 'meta' for f in files) == 4 and files[0]['title'].endswith('handout 0.txt')
+    assert (course / 'web_resources' / 'file-00000.txt').stat().st_size == 2048
+    page = (course / 'wiki_content' / 'page-00000.html').read_bytes()
+    for placeholder in (b'$WIKI_REFERENCE$/pages/', b'$IMS-CC-FILEBASE$/', b'$CANVAS_COURSE_REFERENCE$/'):
+        assert placeholder in page
+    # placeholder links resolve to files of the course
+    assert any(target.startswith('web_resources/file-') for target in page_links(page, 'wiki_content/page-00000.html'))
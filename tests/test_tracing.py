@@ -0,0 +1,91 @@
+import json
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+from canvas_viewer.app import create_app
+from canvas_viewer.tracing import OTLPExporter, Trace, activate, deactivate, span, traced
+
+BASE = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'courses', 'minimal-course-export'))
+
+
+def test_spans_nest_under_the_current_trace():
+    @traced('work')
+    def work():
+        with span('inner', n=1):
+            pass
+
+    # no current trace: nothing is recorded
+    work()
+    trace = Trace('job')
+    token = activate(trace)
+    try:
+        work()
+    finally:
+        deactivate(token)
+    work()
+    trace.finish()
+    spans = {s['name']: s for s in trace.to_dict()['spans']}
+    assert set(spans) == {'work', 'inner'}
+    assert spans['work']['parent'] == trace.span_id and spans['inner']['parent'] == spans['work']['id']
+    assert spans['inner']['attrs'] == {'n': 1}
+
+
+def test_page_request_is_traced_to_a_log(tmp_path, monkeypatch):
+    log = tmp_path / 'traces.jsonl'
+    monkeypatch.setenv('CANVAS_CACHE_DIR', str(tmp_path / 'cache'))
+    monkeypatch.setenv('CANVAS_TRACE', 'log')
+    monkeypatch.setenv('CANVAS_TRACE_TARGET', str(log))
+    monkeypatch.setenv('CANVAS_TRACE_SAMPLE_RATE', '0')
+    client = create_app(BASE).test_client()
+    r = client.get('/page/wiki_content/homepage.html', headers={'X-Canvas-Trace': '1'})
+    assert 'X-Trace-Id' not in client.get('/page/wiki_content/homepage.html').headers
+    record = json.loads(log.read_text())
+    assert record['trace_id'] == r.headers['X-Trace-Id']
+    assert record['name'] == 'GET /page/<path:href>' and record['attrs']['http.status_code'] == 200
+    names = [s['name'] for s in record['spans']]
+    for stage in ('page.read', 'page.parse', 'page.strip_styles', 'page.rewrite', 'page.serialize',
+                  'page.render_template', 'parser.resolve_path'):
+        assert stage in names
+
+
+def test_otlp_exporter_posts_batches(tmp_path):
+    received = []
+
+    class Collector(BaseHTTPRequestHandler):
+        def do_POST(self):
+            received.append(json.loads(self.rfile.read(int(self.headers['Content-Length']))))
+            self.send_response(200)
+            self.end_headers()
+
+        def log_message(self, *args):
+            pass
+
+    server = HTTPServer(('127.0.0.1', 0), Collector)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        exporter = OTLPExporter(f'http://127.0.0.1:{server.server_port}/v1/traces', interval=0.05)
+        trace = Trace('GET /x', **{'http.status_code': 200})
+        with trace.span('stage'):
+            pass
+        trace.finish()
+        exporter.export(trace)
+        exporter.close()
+    finally:
+        server.shutdown()
+    spans = [s for r in received for rs in r['resourceSpans'] for ss in rs['scopeSpans'] for s in ss['spans']]
+    assert [s['name'] for s in spans] == ['GET /x', 'stage']
+    assert spans[1]['parentSpanId'] == spans[0]['spanId'] and spans[0]['traceId'] == trace.trace_id
+    assert {'key': 'http.status_code', 'value': {'intValue': '200'}} in spans[0]['attributes']
+
+
+def test_profile_header_keeps_slow_request_profiles(tmp_path, monkeypatch):
+    monkeypatch.setenv('CANVAS_CACHE_DIR', str(tmp_path / 'cache'))
+    monkeypatch.setenv('CANVAS_PROFILE_THRESHOLD_MS', '0')
+    monkeypatch.setenv('CANVAS_ADMIN_TOKEN', 'secret')
+    app = create_app(BASE)
+    client = app.test_client()
+    client.get('/page/wiki_content/homepage.html', headers={'X-Canvas-Profile': '1'})
+    assert not os.path.exists(app.config['PROFILE_DIR'])
+    client.get('/page/wiki_content/homepage.html', headers={'X-Canvas-Profile': '1', 'X-Admin-Token': 'secret'})
+    assert [p.endswith('.prof') for p in os.listdir(app.config['PROFILE_DIR'])] == [True]
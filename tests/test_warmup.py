@@ -0,0 +1,50 @@
+import os
+
+import pytest
+
+from canvas_viewer.app import create_app
+from canvas_viewer.parser import CanvasExport
+
+BASE = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'courses', 'minimal-course-export'))
+
+
+def test_warm_up_fills_the_caches_before_ready(tmp_path, monkeypatch):
+    monkeypatch.setenv('CANVAS_CACHE_DIR', str(tmp_path / 'cache'))
+    app = create_app(BASE, warm='key')
+    client = app.test_client()
+    assert app.extensions['canvas_warmup'].wait(30)
+    r = client.get('/ready')
+    assert r.status_code == 200
+    data = r.get_json()
+    assert data['ready'] and data['warm'] == 'key' and data['result']['failed'] == []
+
+    caches = app.extensions['canvas_caches']
+    assert len(caches['views']) and len(caches['refs'])
+    # the home page (a module item) was rendered by the warm-up, so this request is a cache hit
+    hits = caches['pages'].hits
+    assert client.get('/page/wiki_content/homepage.html').status_code == 200
+    assert caches['pages'].hits == hits + 1
+
+
+def test_failed_warm_up_is_not_ready(tmp_path, monkeypatch):
+    monkeypatch.setenv('CANVAS_CACHE_DIR', str(tmp_path / 'cache'))
+
+    def broken(self):
+        raise RuntimeError('broken manifest')
+    monkeypatch.setattr(CanvasExport, 'detect_external_tools', broken)
+    app = create_app(BASE, warm='key')
+    job = app.extensions['canvas_warmup']
+    job.wait(30)
+    assert job.status == 'failed'
+    r = app.test_client().get('/ready')
+    assert r.status_code == 503
+    data = r.get_json()
+    assert data['ready'] is False and data['error'] == 'RuntimeError: broken manifest'
+
+
+def test_ready_without_warm_up(tmp_path, monkeypatch):
+    monkeypatch.setenv('CANVAS_CACHE_DIR', str(tmp_path / 'cache'))
+    client = create_app(BASE).test_client()
+    assert client.get('/ready').get_json() == {'ready': True, 'warm': None}
+    with pytest.raises(ValueError):
+        create_app(BASE, warm='everything')